@@ -0,0 +1,119 @@
+#include "alias_cpu.h"
+#include <vector>
+#include "../cuda/utils.cuh"
+
+namespace triples {
+
+  template <typename scalar_t>
+  void build_alias_table(const torch::Tensor *relation_tail_index,
+                         const torch::Tensor *weights,
+                         const torch::Tensor *alias_prob,
+                         const torch::Tensor *alias_index) {
+
+      int64_t num_nodes = relation_tail_index->size(0);
+
+      // get the step size
+      int grain_size = torch::internal::GRAIN_SIZE / 64;
+
+      // create accessors
+      auto relation_tail_index_accessor = relation_tail_index->accessor<scalar_t,2>();
+      auto weights_accessor = weights->accessor<double,1>();
+      auto alias_prob_accessor = alias_prob->accessor<float,1>();
+      auto alias_index_accessor = alias_index->accessor<scalar_t,1>();
+
+      torch::parallel_for(0,num_nodes,grain_size,[&](int64_t node_start,int64_t node_end){
+
+          // work lists reused by the nodes of this thread
+          std::vector<double> scaled;
+          std::vector<int64_t> small;
+          std::vector<int64_t> large;
+
+          for(int64_t node = node_start; node < node_end; node++){
+            int64_t start_index = relation_tail_index_accessor[node][0];
+            int64_t end_index = relation_tail_index_accessor[node][1];
+            if(start_index == -1 || end_index == -1){
+              continue;
+            }
+
+            int64_t degree = end_index - start_index + 1;
+            double total = 0;
+            for(int64_t i = start_index; i <= end_index; i++){
+              total = total + weights_accessor[i];
+            }
+
+            // a node whose triples all have weight 0 is walked uniformly
+            scaled.resize(degree);
+            for(int64_t i = 0; i < degree; i++){
+              scaled[i] = total > 0 ? (weights_accessor[start_index + i] * degree) / total : 1.0;
+            }
+
+            small.clear();
+            large.clear();
+            for(int64_t i = 0; i < degree; i++){
+              if(scaled[i] < 1.0){
+                small.push_back(i);
+              }else{
+                large.push_back(i);
+              }
+            }
+
+            // pair every column below 1 with a column above 1 that fills it up
+            while(!small.empty() && !large.empty()){
+              int64_t less = small.back();
+              small.pop_back();
+              int64_t more = large.back();
+
+              alias_prob_accessor[start_index + less] = scaled[less];
+              alias_index_accessor[start_index + less] = start_index + more;
+
+              scaled[more] = (scaled[more] + scaled[less]) - 1.0;
+              if(scaled[more] < 1.0){
+                large.pop_back();
+                small.push_back(more);
+              }
+            }
+
+            // what is left is 1 up to rounding
+            for(auto column : large){
+              alias_prob_accessor[start_index + column] = 1.0;
+              alias_index_accessor[start_index + column] = start_index + column;
+            }
+            for(auto column : small){
+              alias_prob_accessor[start_index + column] = 1.0;
+              alias_index_accessor[start_index + column] = start_index + column;
+            }
+          }
+      });
+  }
+
+  std::tuple<at::Tensor, at::Tensor> build_alias_table_cpu(const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *weights,
+                  const int64_t num_triples
+                ) {
+
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*weights));
+    TORCH_CHECK(weights->scalar_type() == torch::kFloat64, "weights must be a float64 tensor");
+    TORCH_CHECK(weights->dim() == 1 && weights->size(0) == num_triples, "weights must have one weight per triple");
+
+    // the ranges index the weights and the tables without bounds checks
+    TORCH_CHECK(relation_tail_index->dim() == 2 && relation_tail_index->size(1) == 2, "relation_tail_index must have a [start, end] range per node");
+    if(relation_tail_index->numel() > 0){
+      auto starts = relation_tail_index->select(1,0);
+      auto ends = relation_tail_index->select(1,1);
+      TORCH_CHECK(relation_tail_index->min().item<int64_t>() >= -1 && relation_tail_index->max().item<int64_t>() < num_triples,
+                  "relation_tail_index must hold ranges of the ", num_triples, " weights, one weight per triple");
+      TORCH_CHECK((ends - starts).min().item<int64_t>() >= 0, "relation_tail_index must hold [start, end] ranges with start <= end");
+    }
+
+    // triples outside of every range keep themselves
+    auto alias_prob = torch::ones({num_triples},torch::kFloat32);
+    auto alias_index = torch::arange(num_triples,relation_tail_index->options());
+
+    AT_DISPATCH_INDEX_TYPES(relation_tail_index->scalar_type(),"build_alias_table_cpu",[&] {
+      build_alias_table<index_t>(relation_tail_index,weights,&alias_prob,&alias_index);
+    });
+
+    return std::make_tuple(alias_prob,alias_index);
+  }
+}
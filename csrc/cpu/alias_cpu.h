@@ -0,0 +1,13 @@
+#pragma once
+#include <torch/extension.h>
+
+namespace triples {
+  // alias tables of the outgoing triples of every node, weighted by weights (one per triple).
+  // Returns (alias_prob, alias_index) aligned with the sorted triples: drawing a triple j
+  // uniformly from the range of a node keeps it with probability alias_prob[j] and
+  // takes alias_index[j] otherwise.
+  std::tuple<at::Tensor, at::Tensor> build_alias_table_cpu(const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *weights,
+                  const int64_t num_triples
+                );
+}
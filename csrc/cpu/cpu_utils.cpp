@@ -1,10 +0,0 @@
-#include <random>
-
-int64_t sample_int(int64_t start, int64_t end){
-   if(start == end){
-       return start;
-   }else{
-       auto sampled_int = start + ( std::rand() % ((end +1) - start));
-       return sampled_int; 
-   }
-}
\ No newline at end of file
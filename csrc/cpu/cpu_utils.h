@@ -1,3 +0,0 @@
-#pragma once
-#include <stdint.h>
-int64_t sample_int(int64_t start, int64_t end);
\ No newline at end of file
@@ -3,100 +3,186 @@
 #include <thread>
 #include <random>
 #include "../cuda/utils.cuh"
-#include "cpu_utils.h"
-#include "../utils.h"
+#include "../rng.h"
+#include "../triples.h"
 
 namespace triples {
 
-  RelationTail sample_neighbor(int64_t target_node,
-                        const torch::TensorAccessor<int64_t,2> relation_tail_index,
-                        const torch::TensorAccessor<int64_t,2> triples_indexed,
-                        int64_t padding_index
-                      ) {
-    
-    RelationTail rt;
+  template <typename scalar_t>
+  void uniform_walk_triples(const torch::Tensor *walks,
+                    const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *target_nodes,
+                    const int64_t padding_idx,
+                    const bool restart,
+                    const int64_t walks_per_node,
+                    const int seed
+                  ) {
+      // get the walk length
+      int64_t walk_length = (*walks).size(1);
+      
+      // get the number of walks, walks_per_node consecutive walks start at every target node
+      int64_t num_walks = (*walks).size(0);
 
-    // if target node is padding index, then jump node becomes target node
-    if(target_node != padding_index){
 
-      // get the edge range for the target node
-      auto start_index = relation_tail_index[target_node][0];
-      auto end_index = relation_tail_index[target_node][1];
-      // randomly select an index in this range
-      if(start_index == -1 || end_index == -1){
-        rt.relation = padding_index;
-        rt.tail = padding_index;
-      }else{
-        auto nbr_edge_index = sample_int(start_index,end_index);
+      // walks per chunk, so that every chunk writes about GRAIN_SIZE elements
+      int64_t grain_size = std::max<int64_t>(torch::internal::GRAIN_SIZE / walk_length,1);
 
-        // get the edge at this index
-        rt.relation = triples_indexed[nbr_edge_index][1];
-        rt.tail = triples_indexed[nbr_edge_index][2];
+      // create accessors
+      auto walks_accessor = walks->accessor<scalar_t,2>();
+      auto target_nodes_accessor = target_nodes->accessor<scalar_t,1>();
+      auto triples_indexed_accessor = triples_indexed->accessor<scalar_t,2>();
+      auto relation_tail_index_accessor = relation_tail_index->accessor<scalar_t,2>();
 
-      }
+      // loop in parallel
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_start,int64_t walk_end){
 
-    }else{
-      
-      rt.relation = padding_index;
-      rt.tail = padding_index;
-    }
-    
-    return rt;
+          for (int64_t walk_index = walk_start; walk_index < walk_end;walk_index++) {
+            
+            // every walk draws from its own stream so the result does not depend on the threads
+            rng::Philox generator(seed,walk_index,rng::WALK);
 
+            // get the walk array for this node
+            auto walks_for_node = walks_accessor[walk_index];
+            
+            // get the target node
+            int64_t target_node = target_nodes_accessor[walk_index / walks_per_node];
+            
+            // walk from the target node, padding the walk after it ended
+            uniform_walk(walks_for_node,walk_length,target_node,restart,true,relation_tail_index_accessor,triples_indexed_accessor,padding_idx,generator);
+        }
+      });
   }
 
-  void uniform_walk_triples(const torch::Tensor *walks,
+  template <typename scalar_t>
+  void weighted_walk_triples(const torch::Tensor *walks,
                     const torch::Tensor *triples_indexed,
                     const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *alias_prob,
+                    const torch::Tensor *alias_index,
                     const torch::Tensor *target_nodes,
                     const int64_t padding_idx,
-                    const bool restart,
+                    const int64_t walks_per_node,
                     const int seed
                   ) {
-      // seed
-      srand(seed);
-
       // get the walk length
       int64_t walk_length = (*walks).size(1);
-      
-      // get the number of nodes
-      int64_t num_nodes = (*target_nodes).size(0);
 
+      // get the number of walks, walks_per_node consecutive walks start at every target node
+      int64_t num_walks = (*walks).size(0);
 
       // get the step size
-      int grain_size = torch::internal::GRAIN_SIZE;
+      int64_t grain_size = std::max<int64_t>(torch::internal::GRAIN_SIZE / walk_length,1);
 
       // create accessors
-      auto walks_accessor = walks->accessor<int64_t,2>();
-      auto target_nodes_accessor = target_nodes->accessor<int64_t,1>();
-      auto triples_indexed_accessor = triples_indexed->accessor<int64_t,2>();
-      auto relation_tail_index_accessor = relation_tail_index->accessor<int64_t,2>();
+      auto walks_accessor = walks->accessor<scalar_t,2>();
+      auto target_nodes_accessor = target_nodes->accessor<scalar_t,1>();
+      auto triples_indexed_accessor = triples_indexed->accessor<scalar_t,2>();
+      auto relation_tail_index_accessor = relation_tail_index->accessor<scalar_t,2>();
+      auto alias_prob_accessor = alias_prob->accessor<float,1>();
+      auto alias_index_accessor = alias_index->accessor<scalar_t,1>();
 
       // loop in parallel
-      torch::parallel_for(0,num_nodes,grain_size,[&](int64_t node_start,int64_t node_end){
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_start,int64_t walk_end){
+
+          for (int64_t walk_index = walk_start; walk_index < walk_end;walk_index++) {
+
+            // every walk draws from its own stream so the result does not depend on the threads
+            rng::Philox generator(seed,walk_index,rng::WALK);
 
-          for (int64_t node_index = node_start; node_index < node_end;node_index++) {
-            
             // get the walk array for this node
-            auto walks_for_node = walks_accessor[node_index];
-            
+            auto walks_for_node = walks_accessor[walk_index];
+
             // get the target node
-            int64_t target_node = target_nodes_accessor[node_index];
-            
+            int64_t target_node = target_nodes_accessor[walk_index / walks_per_node];
+
             // add target node as the first node in walk
             walks_for_node[0] = target_node;
 
             // start walk
             int64_t previous_node = target_node;
             for (int64_t walk_step=1;walk_step < walk_length;walk_step=walk_step+2){
-              // sample a neighor
-              auto next_rt = sample_neighbor(previous_node,relation_tail_index_accessor,triples_indexed_accessor,padding_idx);
+              auto next_rt = sample_weighted_neighbor(previous_node,
+                                                      relation_tail_index_accessor,
+                                                      triples_indexed_accessor,
+                                                      alias_prob_accessor,
+                                                      alias_index_accessor,
+                                                      padding_idx,
+                                                      generator);
               walks_for_node[walk_step] = next_rt.relation;
               walks_for_node[walk_step+1] = next_rt.tail;
-              
+
               // update previous node
               previous_node = next_rt.tail;
+            }
+        }
+      });
+  }
+
+  template <typename scalar_t>
+  void biased_walk_triples(const torch::Tensor *walks,
+                    const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *sorted_tails,
+                    const torch::Tensor *target_nodes,
+                    const int64_t padding_idx,
+                    const TripleBias &bias,
+                    const int64_t walks_per_node,
+                    const int seed
+                  ) {
+      // get the walk length
+      int64_t walk_length = (*walks).size(1);
+
+      // get the number of walks, walks_per_node consecutive walks start at every target node
+      int64_t num_walks = (*walks).size(0);
+
+      // get the step size
+      int64_t grain_size = std::max<int64_t>(torch::internal::GRAIN_SIZE / walk_length,1);
 
+      // create accessors
+      auto walks_accessor = walks->accessor<scalar_t,2>();
+      auto target_nodes_accessor = target_nodes->accessor<scalar_t,1>();
+      auto triples_indexed_accessor = triples_indexed->accessor<scalar_t,2>();
+      auto relation_tail_index_accessor = relation_tail_index->accessor<scalar_t,2>();
+      auto sorted_tails_accessor = sorted_tails->accessor<scalar_t,1>();
+
+      // loop in parallel
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_start,int64_t walk_end){
+
+          for (int64_t walk_index = walk_start; walk_index < walk_end;walk_index++) {
+
+            // every walk draws from its own stream so the result does not depend on the threads
+            rng::Philox generator(seed,walk_index,rng::WALK);
+
+            // get the walk array for this node
+            auto walks_for_node = walks_accessor[walk_index];
+
+            // get the target node
+            int64_t target_node = target_nodes_accessor[walk_index / walks_per_node];
+
+            // add target node as the first node in walk
+            walks_for_node[0] = target_node;
+
+            // the first step has no previous node, which makes it uniform
+            int64_t previous_node = padding_idx;
+            int64_t previous_relation = padding_idx;
+            int64_t current_node = target_node;
+            for (int64_t walk_step=1;walk_step < walk_length;walk_step=walk_step+2){
+              auto next_rt = sample_biased_neighbor(current_node,
+                                                    previous_node,
+                                                    previous_relation,
+                                                    relation_tail_index_accessor,
+                                                    triples_indexed_accessor,
+                                                    sorted_tails_accessor,
+                                                    padding_idx,
+                                                    bias,
+                                                    generator);
+              walks_for_node[walk_step] = next_rt.relation;
+              walks_for_node[walk_step+1] = next_rt.tail;
+
+              previous_node = current_node;
+              previous_relation = next_rt.relation;
+              current_node = next_rt.tail;
             }
         }
       });
@@ -108,22 +194,180 @@ namespace triples {
                     const int walk_length,
                     const int64_t padding_idx,
                     const bool restart,
-                    const int seed                  
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
                   ) {
 
     CHECK_CPU((*triples_indexed));
     CHECK_CPU((*relation_tail_index));
     CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
 
-    // construct a tensor to hold the walks
-    auto walk_size = (walk_length * 2) + 1;  
-    auto walks = torch::empty({(*target_nodes).size(0),walk_size},torch::kInt64); 
+    // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+    check_out(out,1);
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+    auto walk_size = (walk_length * 2) + 1;
+    auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
     
     // perform walks
-    uniform_walk_triples(&walks,triples_indexed,relation_tail_index,target_nodes,padding_idx,restart,seed);
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_cpu",[&] {
+      uniform_walk_triples<index_t>(&walks,triples_indexed,relation_tail_index,target_nodes,padding_idx,restart,walks_per_node,seed);
+    });
     
     return walks;
 
   }
-}
 
+  std::tuple<torch::Tensor, torch::Tensor> walk_triples_packed_cpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const bool restart,
+                    const int walks_per_node,
+                    const int seed
+                  ) {
+
+    CHECK_CPU((*triples_indexed));
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+
+    int64_t walk_size = (walk_length * 2) + 1;
+    int64_t num_walks = (*target_nodes).size(0) * walks_per_node;
+
+    // the walks are split in fixed blocks, so that every block collects its walks without
+    // knowing where the walks before it end, and copied out once all lengths are known
+    int64_t block_size = std::max<int64_t>(torch::internal::GRAIN_SIZE / walk_size,1);
+    int64_t num_blocks = (num_walks + block_size - 1) / block_size;
+    auto lengths = torch::empty({num_walks},torch::kInt64);
+    torch::Tensor values, offsets;
+
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_packed_cpu",[&] {
+
+      // create accessors
+      auto target_nodes_accessor = target_nodes->accessor<index_t,1>();
+      auto triples_indexed_accessor = triples_indexed->accessor<index_t,2>();
+      auto relation_tail_index_accessor = relation_tail_index->accessor<index_t,2>();
+      auto lengths_accessor = lengths.accessor<int64_t,1>();
+      std::vector<std::vector<index_t>> block_values(num_blocks);
+
+      torch::parallel_for(0,num_blocks,1,[&](int64_t block_start,int64_t block_end){
+
+          // one walk at full length, of which only the positions up to its end are kept
+          std::vector<index_t> walk(walk_size);
+
+          for (int64_t block = block_start; block < block_end; block++) {
+            int64_t walk_end = std::min((block + 1) * block_size,num_walks);
+            for (int64_t walk_index = block * block_size; walk_index < walk_end; walk_index++) {
+
+              // the same stream as walk_triples_cpu, so the walks are the unpadded ones of it
+              rng::Philox generator(seed,walk_index,rng::WALK);
+              int64_t target_node = target_nodes_accessor[walk_index / walks_per_node];
+              int64_t length = uniform_walk(walk,walk_size,target_node,restart,false,relation_tail_index_accessor,triples_indexed_accessor,padding_idx,generator);
+
+              lengths_accessor[walk_index] = length;
+              block_values[block].insert(block_values[block].end(),walk.begin(),walk.begin() + length);
+            }
+          }
+      });
+
+      offsets = torch::cat({torch::zeros({1},torch::kInt64),lengths.cumsum(0)});
+      values = torch::empty({offsets[num_walks].item<int64_t>()},triples_indexed->options());
+      auto offsets_accessor = offsets.accessor<int64_t,1>();
+      auto values_data = values.data_ptr<index_t>();
+
+      torch::parallel_for(0,num_blocks,1,[&](int64_t block_start,int64_t block_end){
+          for (int64_t block = block_start; block < block_end; block++) {
+            std::copy(block_values[block].begin(),block_values[block].end(),values_data + offsets_accessor[block * block_size]);
+            std::vector<index_t>().swap(block_values[block]);
+          }
+      });
+    });
+
+    return std::make_tuple(values,offsets);
+
+  }
+
+  torch::Tensor walk_triples_biased_cpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *sorted_tails,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const double p,
+                    const double q,
+                    const double relation_bias,
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
+                  ) {
+
+    CHECK_CPU((*triples_indexed));
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*sorted_tails));
+    CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*sorted_tails));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+    TORCH_CHECK(sorted_tails->size(0) == triples_indexed->size(0), "sorted_tails must have one tail per triple");
+    TORCH_CHECK(p > 0 && q > 0 && relation_bias > 0, "p, q and relation_bias must be positive");
+
+    // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+    check_out(out,1);
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+    auto walk_size = (walk_length * 2) + 1;
+    auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
+    const TripleBias bias(p,q,relation_bias);
+
+    // perform walks
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_biased_cpu",[&] {
+      biased_walk_triples<index_t>(&walks,triples_indexed,relation_tail_index,sorted_tails,target_nodes,padding_idx,bias,walks_per_node,seed);
+    });
+
+    return walks;
+
+  }
+
+  torch::Tensor walk_triples_weighted_cpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *alias_prob,
+                    const torch::Tensor *alias_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
+                  ) {
+
+    CHECK_CPU((*triples_indexed));
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*alias_prob));
+    CHECK_CPU((*alias_index));
+    CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*alias_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+    TORCH_CHECK(alias_prob->scalar_type() == torch::kFloat32, "alias_prob must be a float32 tensor");
+    TORCH_CHECK(alias_prob->size(0) == triples_indexed->size(0) && alias_index->size(0) == triples_indexed->size(0), "the alias table must have one entry per triple");
+
+    // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+    check_out(out,1);
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+    auto walk_size = (walk_length * 2) + 1;
+    auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
+
+    // perform walks
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_weighted_cpu",[&] {
+      weighted_walk_triples<index_t>(&walks,triples_indexed,relation_tail_index,alias_prob,alias_index,target_nodes,padding_idx,walks_per_node,seed);
+    });
+
+    return walks;
+
+  }
+}
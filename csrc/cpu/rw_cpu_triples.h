@@ -2,12 +2,59 @@
 #include <torch/extension.h>
 
 namespace triples {
+  // walks_per_node walks from every target node, in the order of target_nodes.repeat_interleave(walks_per_node).
+  // A dead end ends a walk, or with restart leads back to its target node (see uniform_step)
+  // The walkers fill out[0] in place when out is not empty (see output_tensor)
   torch::Tensor walk_triples_cpu(const torch::Tensor *triples_indexed,
                   const torch::Tensor *relation_tail_index,
                   const torch::Tensor *target_nodes,
                   const int walk_length,
                   const int64_t padding_idx,
                   const bool restart,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                );
+
+  // the walks of walk_triples_cpu packed without the padding after their end, as
+  // (values, offsets) with walk i in values[offsets[i] .. offsets[i + 1] - 1]
+  std::tuple<torch::Tensor, torch::Tensor> walk_triples_packed_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
                   const int seed
                 );
-}
\ No newline at end of file
+
+  // walk_triples_cpu with the second order bias of TripleBias,
+  // sorted_tails holds the tails of triples_indexed sorted within every head
+  torch::Tensor walk_triples_biased_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *sorted_tails,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const double p,
+                  const double q,
+                  const double relation_bias,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                );
+
+  // walk_triples_cpu with steps drawn in proportion to triple weights,
+  // given as the alias table of build_alias_table_cpu
+  torch::Tensor walk_triples_weighted_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *alias_prob,
+                  const torch::Tensor *alias_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                );
+}
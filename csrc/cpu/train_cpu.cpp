@@ -0,0 +1,414 @@
+#include "train_cpu.h"
+#include <cmath>
+#include <vector>
+#include "../cuda/utils.cuh"
+#include "../windows.h"
+
+namespace {
+
+  // rows of the ids of a walk or a triple in the tables of component 0 (heads), 1 (relations) or 2 (tails)
+  struct TableRows {
+    int64_t padding_idx;
+    int64_t relation_offset;
+    int64_t entity_padding;
+    int64_t relation_padding;
+
+    int64_t operator()(int64_t component, int64_t id) const {
+      if(component == 1){
+        return id == padding_idx ? relation_padding : id - relation_offset;
+      }
+      return id == padding_idx ? entity_padding : id;
+    }
+
+    int64_t padding(int64_t component) const {
+      return component == 1 ? relation_padding : entity_padding;
+    }
+  };
+
+  // log sigmoid of x and sigmoid of x from a single exp
+  template <typename scalar_t>
+  scalar_t log_sigmoid(scalar_t x, scalar_t &sigmoid) {
+    scalar_t e = std::exp(-std::abs(x));
+    sigmoid = x >= 0 ? 1 / (1 + e) : e / (1 + e);
+    return std::min<scalar_t>(x,0) - std::log1p(e);
+  }
+
+  void check_tables(const std::vector<torch::Tensor> &tables) {
+    TORCH_CHECK(tables.size() == 6, "expected the six embedding tables of the model");
+    for(const auto &table : tables){
+      CHECK_CPU(table);
+      CHECK_CONTIGUOUS((&table));
+      TORCH_CHECK(table.dim() == 2 && table.size(1) == tables[0].size(1), "the tables must have the same embedding dim");
+      TORCH_CHECK(table.scalar_type() == tables[0].scalar_type(), "the tables must have the same dtype");
+    }
+    // the ids are checked against the head and relation tables, the others must have their rows
+    for(int64_t component = 0; component < 3; component++){
+      TORCH_CHECK(tables[component].size(0) == tables[component % 2].size(0) && tables[component + 3].size(0) == tables[component % 2].size(0),
+                  "the entity tables and the relation tables must have the same number of rows");
+    }
+  }
+
+  int64_t train_grain_size(int64_t window_size, int64_t embedding_dim) {
+    return std::max<int64_t>(torch::internal::GRAIN_SIZE / (window_size * 2 * embedding_dim), 1);
+  }
+
+  // skip-gram loss of one component of a window, per dimension k and with C and N the
+  // sums of the context and negative rows: -log sigmoid(t*C) - log sigmoid(1 - t*N)
+  template <typename scalar_t>
+  double sg_step(scalar_t *target_table,
+                 scalar_t *context_table,
+                 int64_t target_row,
+                 const std::vector<int64_t> &context_rows,
+                 const std::vector<int64_t> &neg_rows,
+                 int64_t padding_row,
+                 int64_t dim,
+                 scalar_t lr,
+                 std::vector<scalar_t> &context_sum,
+                 std::vector<scalar_t> &neg_sum) {
+
+      scalar_t *target = target_table + (target_row * dim);
+
+      std::fill(context_sum.begin(),context_sum.end(),0);
+      std::fill(neg_sum.begin(),neg_sum.end(),0);
+      for(auto row : context_rows){
+        const scalar_t *context = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          context_sum[k] += context[k];
+        }
+      }
+      for(auto row : neg_rows){
+        const scalar_t *neg = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          neg_sum[k] += neg[k];
+        }
+      }
+
+      // the loss is the mean over the dimensions, every gradient is scaled by lr / dim
+      double loss = 0;
+      scalar_t scale = lr / dim;
+      for(int64_t k = 0; k < dim; k++){
+        scalar_t pos_score = target[k] * context_sum[k];
+        scalar_t neg_score = target[k] * neg_sum[k];
+        scalar_t pos_sigmoid, neg_sigmoid;
+        loss -= log_sigmoid(pos_score,pos_sigmoid) + log_sigmoid(1 - neg_score,neg_sigmoid);
+
+        // reuse the sums for the scaled derivatives of the two scores, sigmoid(n - 1) = 1 - sigmoid(1 - n)
+        scalar_t pos_grad = (pos_sigmoid - 1) * scale;
+        scalar_t neg_grad = (1 - neg_sigmoid) * scale;
+        scalar_t target_grad = (pos_grad * context_sum[k]) + (neg_grad * neg_sum[k]);
+        context_sum[k] = pos_grad * target[k];
+        neg_sum[k] = neg_grad * target[k];
+        if(target_row != padding_row){
+          target[k] -= target_grad;
+        }
+      }
+
+      // the padding rows get no gradient, as with the padding_idx of nn.Embedding
+      for(auto row : context_rows){
+        if(row == padding_row){
+          continue;
+        }
+        scalar_t *context = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          context[k] -= context_sum[k];
+        }
+      }
+      for(auto row : neg_rows){
+        if(row == padding_row){
+          continue;
+        }
+        scalar_t *neg = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          neg[k] -= neg_sum[k];
+        }
+      }
+
+      return loss / dim;
+  }
+
+  // cbow loss of one component of a window, with x the mean of the context rows:
+  // -log sigmoid(pos.x) - log sigmoid(1 - neg.x)
+  template <typename scalar_t>
+  double cbow_step(scalar_t *target_table,
+                   scalar_t *context_table,
+                   int64_t pos_row,
+                   int64_t neg_row,
+                   const std::vector<int64_t> &context_rows,
+                   int64_t padding_row,
+                   int64_t dim,
+                   scalar_t lr,
+                   std::vector<scalar_t> &context_mean,
+                   std::vector<scalar_t> &context_grad) {
+
+      scalar_t *pos = target_table + (pos_row * dim);
+      scalar_t *neg = target_table + (neg_row * dim);
+
+      std::fill(context_mean.begin(),context_mean.end(),0);
+      for(auto row : context_rows){
+        const scalar_t *context = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          context_mean[k] += context[k];
+        }
+      }
+
+      scalar_t pos_score = 0;
+      scalar_t neg_score = 0;
+      scalar_t num_context = context_rows.size();
+      for(int64_t k = 0; k < dim; k++){
+        context_mean[k] /= num_context;
+        pos_score += pos[k] * context_mean[k];
+        neg_score += neg[k] * context_mean[k];
+      }
+      scalar_t pos_sigmoid, neg_sigmoid;
+      double loss = -(log_sigmoid(pos_score,pos_sigmoid) + log_sigmoid(1 - neg_score,neg_sigmoid));
+
+      // gradients of the mean from the rows before their update, pos and neg can be the same row
+      scalar_t pos_grad = (pos_sigmoid - 1) * lr;
+      scalar_t neg_grad = (1 - neg_sigmoid) * lr;
+      for(int64_t k = 0; k < dim; k++){
+        context_grad[k] = ((pos_grad * pos[k]) + (neg_grad * neg[k])) / num_context;
+      }
+      for(int64_t k = 0; k < dim; k++){
+        if(pos_row != padding_row){
+          pos[k] -= pos_grad * context_mean[k];
+        }
+        if(neg_row != padding_row){
+          neg[k] -= neg_grad * context_mean[k];
+        }
+      }
+
+      for(auto row : context_rows){
+        if(row == padding_row){
+          continue;
+        }
+        scalar_t *context = context_table + (row * dim);
+        for(int64_t k = 0; k < dim; k++){
+          context[k] -= context_grad[k];
+        }
+      }
+
+      return loss;
+  }
+
+  template <typename index_t, typename scalar_t>
+  double train_sg(const torch::Tensor *walks,
+                  const torch::Tensor *window_offsets,
+                  const torch::Tensor *neg_index,
+                  const torch::Tensor *triples,
+                  const std::vector<torch::Tensor> &tables,
+                  const int window_size,
+                  const TableRows &rows,
+                  const double lr) {
+
+      int64_t num_windows = window_offsets->size(0);
+      int64_t walk_length = walks->size(1);
+      int64_t num_windows_in_walk = windows::num_windows_in_walk(walk_length);
+      int64_t dim = tables[0].size(1);
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto window_offsets_accessor = window_offsets->accessor<int32_t,1>();
+      auto neg_index_accessor = neg_index->accessor<int32_t,2>();
+      auto triples_accessor = triples->accessor<index_t,2>();
+      std::vector<scalar_t*> table_data;
+      for(const auto &table : tables){
+        table_data.push_back(table.data_ptr<scalar_t>());
+      }
+
+      return at::parallel_reduce(0,num_windows,train_grain_size(window_size,dim),0.0,[&](int64_t window_start,int64_t window_end,double loss){
+
+          // buffers reused by the windows of this thread
+          std::vector<int64_t> context_rows(window_size*2);
+          std::vector<int64_t> neg_rows(window_size*2);
+          std::vector<scalar_t> context_sum(dim);
+          std::vector<scalar_t> neg_sum(dim);
+
+          for(int64_t window = window_start; window < window_end; window++){
+            int64_t offset = window_offsets_accessor[window];
+            int64_t target_idx = offset % num_windows_in_walk;
+            auto walk = walks_accessor[offset / num_windows_in_walk];
+            auto negs = neg_index_accessor[offset];
+
+            for(int64_t component = 0; component < 3; component++){
+              int64_t target_row = rows(component,windows::walk_value(walk,(target_idx*2) + component,walk_length,rows.padding_idx));
+              for(int64_t hop = 0; hop < window_size; hop++){
+                context_rows[hop] = rows(component,windows::walk_value(walk,((target_idx - (hop + 1))*2) + component,walk_length,rows.padding_idx));
+                context_rows[hop + window_size] = rows(component,windows::walk_value(walk,((target_idx + (hop + 1))*2) + component,walk_length,rows.padding_idx));
+              }
+              for(int64_t hop = 0; hop < (window_size*2); hop++){
+                neg_rows[hop] = rows(component,triples_accessor[negs[hop]][component]);
+              }
+
+              loss += sg_step<scalar_t>(table_data[component],table_data[component + 3],target_row,context_rows,neg_rows,
+                                        rows.padding(component),dim,lr,context_sum,neg_sum);
+            }
+          }
+          return loss;
+      },std::plus<double>());
+  }
+
+  template <typename index_t, typename scalar_t>
+  double train_cbow(const torch::Tensor *walks,
+                    const torch::Tensor *window_offsets,
+                    const torch::Tensor *neg_index,
+                    const torch::Tensor *triples,
+                    const std::vector<torch::Tensor> &tables,
+                    const int window_size,
+                    const TableRows &rows,
+                    const double lr) {
+
+      int64_t num_windows = window_offsets->size(0);
+      int64_t walk_length = walks->size(1);
+      int64_t num_windows_in_walk = windows::num_windows_in_walk(walk_length);
+      int64_t dim = tables[0].size(1);
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto window_offsets_accessor = window_offsets->accessor<int32_t,1>();
+      auto neg_index_accessor = neg_index->accessor<int32_t,1>();
+      auto triples_accessor = triples->accessor<index_t,2>();
+      std::vector<scalar_t*> table_data;
+      for(const auto &table : tables){
+        table_data.push_back(table.data_ptr<scalar_t>());
+      }
+
+      return at::parallel_reduce(0,num_windows,train_grain_size(window_size,dim),0.0,[&](int64_t window_start,int64_t window_end,double loss){
+
+          // buffers reused by the windows of this thread
+          std::vector<int64_t> context_rows(window_size*2);
+          std::vector<scalar_t> context_mean(dim);
+          std::vector<scalar_t> context_grad(dim);
+
+          for(int64_t window = window_start; window < window_end; window++){
+            int64_t offset = window_offsets_accessor[window];
+            int64_t target_idx = offset % num_windows_in_walk;
+            auto walk = walks_accessor[offset / num_windows_in_walk];
+            auto neg_triple = triples_accessor[neg_index_accessor[offset]];
+
+            for(int64_t component = 0; component < 3; component++){
+              int64_t pos_row = rows(component,windows::walk_value(walk,(target_idx*2) + component,walk_length,rows.padding_idx));
+              int64_t neg_row = rows(component,neg_triple[component]);
+              for(int64_t hop = 0; hop < window_size; hop++){
+                context_rows[hop] = rows(component,windows::walk_value(walk,((target_idx - (hop + 1))*2) + component,walk_length,rows.padding_idx));
+                context_rows[hop + window_size] = rows(component,windows::walk_value(walk,((target_idx + (hop + 1))*2) + component,walk_length,rows.padding_idx));
+              }
+
+              loss += cbow_step<scalar_t>(table_data[component],table_data[component + 3],pos_row,neg_row,context_rows,
+                                          rows.padding(component),dim,lr,context_mean,context_grad);
+            }
+          }
+          return loss;
+      },std::plus<double>());
+  }
+
+  // the ids of one component that are not the padding index must be rows of its table
+  void check_rows(const torch::Tensor &ids, const torch::Tensor &table, int64_t offset, int64_t padding_idx, const char *name) {
+    auto values = ids.masked_select(ids != padding_idx);
+    if(values.numel() == 0){
+      return;
+    }
+    int64_t min_row = values.min().item<int64_t>() - offset;
+    int64_t max_row = values.max().item<int64_t>() - offset;
+    TORCH_CHECK(min_row >= 0 && max_row < table.size(0), "the ", name, " ids must have rows in the embedding tables, in [",
+                offset, ", ", offset + table.size(0), ") but got ids in [", min_row + offset, ", ", max_row + offset, "]");
+  }
+
+  // The training loop indexes the walks, neg_index, triples and tables without bounds checks, so
+  // window_offsets, neg_index and ids that do not belong to the walks, triples and tables are rejected here.
+  // Only the walks and negatives of the windows in window_offsets are checked, a batch costs its own size.
+  void check_windows(const torch::Tensor *walks,
+                     const torch::Tensor *window_offsets,
+                     const torch::Tensor *neg_index,
+                     const torch::Tensor *triples,
+                     const std::vector<torch::Tensor> &tables,
+                     const TableRows &rows) {
+    CHECK_CPU((*walks));
+    CHECK_CONTIGUOUS(walks);
+    CHECK_SAME_TYPE((*walks),(*triples));
+    TORCH_CHECK(window_offsets->scalar_type() == torch::kInt32 && neg_index->scalar_type() == torch::kInt32,
+                "window_offsets and neg_index must be int32 tensors");
+    TORCH_CHECK(window_offsets->dim() == 1, "window_offsets must be a 1d tensor");
+
+    int64_t num_windows_in_walk = windows::num_windows_in_walk(walks->size(1));
+    int64_t num_windows = walks->size(0) * num_windows_in_walk;
+    TORCH_CHECK(neg_index->size(0) == num_windows, "neg_index must hold the negatives of the ", num_windows,
+                " windows of the walks, got ", neg_index->size(0));
+    if(window_offsets->numel() == 0){
+      return;
+    }
+
+    TORCH_CHECK(window_offsets->min().item<int64_t>() >= 0 && window_offsets->max().item<int64_t>() < num_windows,
+                "window_offsets must be windows of the walks, in [0, ", num_windows, ")");
+
+    auto negatives = neg_index->index_select(0,*window_offsets).flatten();
+    if(negatives.numel() > 0){
+      TORCH_CHECK(negatives.min().item<int64_t>() >= 0 && negatives.max().item<int64_t>() < triples->size(0),
+                  "neg_index must hold indices of the triples, in [0, ", triples->size(0), ")");
+    }
+
+    // entities are at the even positions of a walk and relations at the odd ones
+    auto window_walks = walks->index_select(0,torch::div(window_offsets->to(torch::kLong),num_windows_in_walk,"floor"));
+    auto neg_triples = triples->index_select(0,negatives.to(torch::kLong));
+    int64_t walk_length = walks->size(1);
+    check_rows(window_walks.slice(1,0,walk_length,2),tables[0],0,rows.padding_idx,"entity");
+    check_rows(window_walks.slice(1,1,walk_length,2),tables[1],rows.relation_offset,rows.padding_idx,"relation");
+    check_rows(neg_triples.slice(1,0,3,2),tables[0],0,rows.padding_idx,"entity");
+    check_rows(neg_triples.select(1,1),tables[1],rows.relation_offset,rows.padding_idx,"relation");
+  }
+}
+
+double train_sg_cpu(const torch::Tensor *walks,
+                    const torch::Tensor *window_offsets,
+                    const torch::Tensor *neg_index,
+                    const torch::Tensor *triples,
+                    const std::vector<torch::Tensor> &tables,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const int64_t relation_offset,
+                    const int64_t entity_padding,
+                    const int64_t relation_padding,
+                    const double lr
+                  ) {
+
+  check_tables(tables);
+  TableRows rows{padding_idx,relation_offset,entity_padding,relation_padding};
+  check_windows(walks,window_offsets,neg_index,triples,tables,rows);
+  TORCH_CHECK(neg_index->dim() == 2 && neg_index->size(1) == window_size*2, "neg_index must hold window_size*2 negatives per window, one set of negatives (num_negatives=1)");
+
+  double loss = 0;
+  AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"train_sg_cpu",[&] {
+    AT_DISPATCH_FLOATING_TYPES(tables[0].scalar_type(),"train_sg_cpu",[&] {
+      loss = train_sg<index_t,scalar_t>(walks,window_offsets,neg_index,triples,tables,window_size,rows,lr);
+    });
+  });
+
+  return loss / std::max<int64_t>(window_offsets->size(0),1);
+}
+
+double train_cbow_cpu(const torch::Tensor *walks,
+                      const torch::Tensor *window_offsets,
+                      const torch::Tensor *neg_index,
+                      const torch::Tensor *triples,
+                      const std::vector<torch::Tensor> &tables,
+                      const int window_size,
+                      const int64_t padding_idx,
+                      const int64_t relation_offset,
+                      const int64_t entity_padding,
+                      const int64_t relation_padding,
+                      const double lr
+                    ) {
+
+  check_tables(tables);
+  TableRows rows{padding_idx,relation_offset,entity_padding,relation_padding};
+  check_windows(walks,window_offsets,neg_index,triples,tables,rows);
+  TORCH_CHECK(neg_index->dim() == 1, "neg_index must hold one negative per window (num_negatives=1)");
+
+  double loss = 0;
+  AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"train_cbow_cpu",[&] {
+    AT_DISPATCH_FLOATING_TYPES(tables[0].scalar_type(),"train_cbow_cpu",[&] {
+      loss = train_cbow<index_t,scalar_t>(walks,window_offsets,neg_index,triples,tables,window_size,rows,lr);
+    });
+  });
+
+  return loss / std::max<int64_t>(window_offsets->size(0),1);
+}
@@ -0,0 +1,37 @@
+#pragma once
+#include <torch/extension.h>
+
+// One SGD step of SkipGramTriple.forward on every window of window_offsets,
+// with the gradients written out by hand and applied to the tables in place.
+// tables are the (target head, target relation, target tail, context head,
+// context relation, context tail) weights of the model. Entity ids are rows of
+// the head and tail tables, relation ids minus relation_offset are rows of the
+// relation tables and padding_idx is entity_padding or relation_padding. The
+// windows are split over the threads, which update the tables without locks.
+// Returns the mean loss of the windows before their step.
+double train_sg_cpu(const torch::Tensor *walks,
+                    const torch::Tensor *window_offsets,
+                    const torch::Tensor *neg_index,
+                    const torch::Tensor *triples,
+                    const std::vector<torch::Tensor> &tables,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const int64_t relation_offset,
+                    const int64_t entity_padding,
+                    const int64_t relation_padding,
+                    const double lr
+                  );
+
+// train_sg_cpu for CBOWTriple.forward, neg_index holds one triple per window
+double train_cbow_cpu(const torch::Tensor *walks,
+                      const torch::Tensor *window_offsets,
+                      const torch::Tensor *neg_index,
+                      const torch::Tensor *triples,
+                      const std::vector<torch::Tensor> &tables,
+                      const int window_size,
+                      const int64_t padding_idx,
+                      const int64_t relation_offset,
+                      const int64_t entity_padding,
+                      const int64_t relation_padding,
+                      const double lr
+                    );
@@ -0,0 +1,200 @@
+#include "walk_windows_cpu.h"
+#include "windows_cpu.h"
+#include "../cuda/utils.cuh"
+#include "../rng.h"
+#include "../triples.h"
+#include "../windows.h"
+
+namespace triples {
+
+  // Walk from every target node and hand each target triple to make_window as soon as
+  // its right context has been walked. Only the last ring_size(window_size) positions
+  // of a walk are kept, so the [num_walks, walk_size] walk tensor is never allocated.
+  // The random streams are the ones used by walk_triples and to_windows_triples, so the
+  // windows are identical to the ones built from a materialized walk tensor, also with
+  // walks_per_node consecutive walks from every target node.
+  template <typename scalar_t, typename window_fn_t>
+  void walk_windows(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const bool restart,
+                    const int walks_per_node,
+                    const int num_negatives,
+                    const int walk_seed,
+                    const int window_seed,
+                    window_fn_t make_window
+                  ) {
+
+      // calculate sizes
+      int64_t num_walks = target_nodes->size(0) * walks_per_node;
+      int64_t walk_size = (walk_length * 2) + 1;
+      int64_t num_windows_in_one_walk = windows::num_windows_in_walk(walk_size);
+
+      // grain size
+      int64_t grain_size = windows_grain_size(num_windows_in_one_walk,window_size*num_negatives);
+
+      // create accessors
+      auto target_nodes_accessor = target_nodes->accessor<scalar_t,1>();
+      auto triples_indexed_accessor = triples_indexed->accessor<scalar_t,2>();
+      auto relation_tail_index_accessor = relation_tail_index->accessor<scalar_t,2>();
+
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+
+          // one ring per thread, reused for all walks of this chunk
+          std::vector<int64_t> ring_values(ring_size(window_size));
+          WalkRing ring = {ring_values.data(),int64_t(ring_values.size())};
+
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+
+              // the same streams as the separate walk and window kernels
+              rng::Philox walk_generator(walk_seed,walk_idx,rng::WALK);
+              rng::Philox window_generator(window_seed,walk_idx,rng::WINDOW);
+
+              // add target node as the first node in walk
+              int64_t source_node = target_nodes_accessor[walk_idx / walks_per_node];
+              int64_t previous_node = source_node;
+              ring[0] = previous_node;
+              int64_t next_pos = 1;
+
+              for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+
+                  // walk until the tail of the last right context triple
+                  auto needed = std::min<int64_t>((target_idx + window_size)*2 + 2,walk_size - 1);
+                  extend_walk(ring,needed,next_pos,previous_node,source_node,restart,relation_tail_index_accessor,triples_indexed_accessor,padding_idx,walk_generator);
+
+                  auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+                  make_window(ring,target_idx,target_pos,walk_size,window_generator);
+              }
+          }
+      });
+  }
+
+  std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int window_size,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
+                  const int num_negatives,
+                  const int walk_seed,
+                  const int window_seed
+                ) {
+
+    CHECK_CPU((*triples_indexed));
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    int64_t num_windows_for_all_walks = target_nodes->size(0) * walks_per_node * walk_length;
+    int64_t num_triples = triples_indexed->size(0);
+
+    // create arrays to hold results, with the index type of the triples
+    auto target_triples = torch::empty({num_windows_for_all_walks,3},triples_indexed->options());
+    auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},triples_indexed->options());
+    auto neg_sets = torch::empty(negatives_sizes(num_windows_for_all_walks,num_negatives,{window_size*2,3}),triples_indexed->options());
+    auto neg_windows = neg_sets.view({num_windows_for_all_walks,window_size*2*num_negatives,3});
+
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_windows_triples_cpu",[&] {
+
+      // create accessors
+      auto target_triples_accessor = target_triples.accessor<index_t,2>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto neg_windows_accesor = neg_windows.accessor<index_t,3>();
+      auto triples_accesor = triples_indexed->accessor<index_t,2>();
+
+      walk_windows<index_t>(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed,
+        [&](const WalkRing &ring,int64_t target_idx,int64_t target_pos,int64_t walk_size,rng::Philox &generator){
+          windows::triples_sg_window(ring,
+                                     target_idx,
+                                     walk_size,
+                                     window_size,
+                                     padding_idx,
+                                     triples_accesor,
+                                     num_triples,
+                                     num_negatives,
+                                     generator,
+                                     target_triples_accessor[target_pos],
+                                     pos_windows_accesor[target_pos],
+                                     neg_windows_accesor[target_pos]);
+        });
+    });
+
+    return std::make_tuple(target_triples,pos_windows,neg_sets);
+  }
+
+  std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cbow_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int window_size,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
+                  const int num_negatives,
+                  const int walk_seed,
+                  const int window_seed
+                ) {
+
+    CHECK_CPU((*triples_indexed));
+    CHECK_CPU((*relation_tail_index));
+    CHECK_CPU((*target_nodes));
+    CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+    CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+    TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    int64_t num_windows_for_all_walks = target_nodes->size(0) * walks_per_node * walk_length;
+    int64_t num_triples = triples_indexed->size(0);
+
+    // create arrays to hold results, with the index type of the triples
+    auto pos_triples = torch::empty({num_windows_for_all_walks,3},triples_indexed->options());
+    auto neg_sets = torch::empty(negatives_sizes(num_windows_for_all_walks,num_negatives,{3}),triples_indexed->options());
+    auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},triples_indexed->options());
+    auto neg_triples = neg_sets.view({num_windows_for_all_walks,num_negatives,3});
+
+    AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_windows_triples_cbow_cpu",[&] {
+
+      // create accessors
+      auto pos_triples_accessor = pos_triples.accessor<index_t,2>();
+      auto neg_triples_accesor = neg_triples.accessor<index_t,3>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto triples_accesor = triples_indexed->accessor<index_t,2>();
+
+      walk_windows<index_t>(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed,
+        [&](const WalkRing &ring,int64_t target_idx,int64_t target_pos,int64_t walk_size,rng::Philox &generator){
+          windows::triples_cbow_window(ring,
+                                       target_idx,
+                                       walk_size,
+                                       window_size,
+                                       padding_idx,
+                                       triples_accesor,
+                                       num_triples,
+                                       generator,
+                                       pos_triples_accessor[target_pos],
+                                       neg_triples_accesor[target_pos][0],
+                                       pos_windows_accesor[target_pos]);
+          windows::triples_cbow_negatives(ring,
+                                          target_idx,
+                                          walk_size,
+                                          padding_idx,
+                                          triples_accesor,
+                                          num_triples,
+                                          num_negatives,
+                                          generator,
+                                          neg_triples_accesor[target_pos]);
+        });
+    });
+
+    return std::make_tuple(pos_triples,neg_sets,pos_windows);
+  }
+}
@@ -0,0 +1,30 @@
+#pragma once
+#include <torch/extension.h>
+
+namespace triples {
+  std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int window_size,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
+                  const int num_negatives,
+                  const int walk_seed,
+                  const int window_seed
+                );
+
+  std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cbow_cpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int window_size,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
+                  const int num_negatives,
+                  const int walk_seed,
+                  const int window_seed
+                );
+}
@@ -1,78 +1,73 @@
 #include "windows_cpu.h"
 #include "../cuda/utils.cuh"
-#include "cpu_utils.h"
+#include "../rng.h"
+#include "../windows.h"
+
+// number of walks handed to a thread at once, so that every chunk writes about GRAIN_SIZE elements
+int64_t windows_grain_size(int64_t num_windows_in_walk, int64_t window_size){
+    int64_t work_per_walk = std::max<int64_t>(num_windows_in_walk * window_size,1);
+    return std::max<int64_t>(torch::internal::GRAIN_SIZE / work_per_walk,1);
+}
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         ){
 
-    // seed
-    srand(seed);
-
     // check walks is contiguous
     CHECK_CONTIGUOUS(walks);
 
     // calculate sizes
     int64_t num_walks = walks->size(0);
     int64_t walk_length = walks->size(1);
-    int64_t num_windows = ((walk_length - window_size)+1)*num_walks;
-    int64_t mid_pos = int64_t(window_size/2);
+    int64_t step_end = (walk_length - window_size) + 1;
+    int64_t num_windows = step_end*num_walks;
 
-    // create arrays to hold results
-    auto target_nodes = torch::empty({num_windows},torch::kInt64);
-    auto pos_windows = torch::empty({num_windows,window_size-1},torch::kInt64);
-    auto neg_windows = torch::empty({num_windows,window_size-1},torch::kInt64);
+    // create arrays to hold results, or fill the ones in out
+    check_out(out,3);
+    auto target_nodes = output_tensor(out,0,{num_windows},walks->options());
+    auto pos_windows = output_tensor(out,1,{num_windows,window_size-1},walks->options());
+    auto neg_windows = output_tensor(out,2,{num_windows,window_size-1},walks->options());
 
     // grain size
-    int grain_size = torch::internal::GRAIN_SIZE / num_walks;
-
-    // create accessors
-    auto walks_accessor = walks->accessor<int64_t,2>();
-    auto target_nodes_accessor = target_nodes.accessor<int64_t,1>();
-    auto pos_windows_accesor = pos_windows.accessor<int64_t,2>();
-    auto neg_windows_accesor = neg_windows.accessor<int64_t,2>();
-
-    // do work
-    torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
-        for (int64_t walk_idx = 0;walk_idx < num_walks;walk_idx++){
-            // get the walk for this index
-            auto walk = walks_accessor[walk_idx];
-
-            // loop over this walk
-            auto step_end = (walk_length - window_size) + 1;
-            for(int64_t step_idx=0;step_idx<step_end;step_idx++){
-                auto window_start = step_idx;
-                             
-                // calculate position in target nodes
-                int64_t target_node_pos = (walk_idx * step_end) + step_idx;
-                int64_t target_node_idx = window_start+mid_pos;
-                target_nodes_accessor[target_node_pos] = walk[target_node_idx];
-                
-                // create pos window
-                auto pos_window = pos_windows_accesor[target_node_pos];
-                int64_t pos_index = 0;
-                for(int i = 0;i<window_size;i++){
-                    auto walk_pos = window_start+i;
-                    if(i != mid_pos){
-                        pos_window[pos_index] = walk[walk_pos];
-                        pos_index = pos_index + 1;
-                    }else{
-                        pos_index = pos_index;
-                    }    
-                }
-                                
-                // create negative window
-                auto neg_windows = neg_windows_accesor[target_node_pos]; 
-                for(int i = 0;i<window_size-1;i++){
-                    auto nbr_node = 0 + ( std::rand() % ( (num_nodes) - 0));
-                    neg_windows[i] = nbr_node;
-                }
-            }
-        }
+    int64_t grain_size = windows_grain_size(step_end,window_size);
+
+    AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"to_windows_cpu",[&] {
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto target_nodes_accessor = target_nodes.accessor<index_t,1>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,2>();
+      auto neg_windows_accesor = neg_windows.accessor<index_t,2>();
+
+      // do work
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+              // negatives of every walk are drawn from their own stream
+              rng::Philox generator(seed,walk_idx,rng::WINDOW);
+
+              // get the walk for this index
+              auto walk = walks_accessor[walk_idx];
+
+              // loop over this walk
+              for(int64_t step_idx=0;step_idx<step_end;step_idx++){
+                  int64_t target_node_pos = (walk_idx * step_end) + step_idx;
+
+                  // create pos window
+                  target_nodes_accessor[target_node_pos] = windows::copy_node_window(walk,step_idx,window_size,pos_windows_accesor[target_node_pos]);
+
+                  // create negative window
+                  auto neg_window = neg_windows_accesor[target_node_pos];
+                  for(int i = 0;i<window_size-1;i++){
+                      neg_window[i] = generator.sample_int(0,(num_nodes-1));
+                  }
+              }
+          }
+      });
     });
-        
+
     return std::make_tuple(target_nodes,pos_windows,neg_windows);
 }
 
@@ -80,396 +75,486 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cpu(const torch::Tenso
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cbow_cpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         ){
 
-    // seed
-    srand(seed);
-
     // check walks is contiguous
     CHECK_CONTIGUOUS(walks);
 
     // calculate sizes
     int64_t num_walks = walks->size(0);
     int64_t walk_length = walks->size(1);
-    int64_t num_windows = ((walk_length - window_size)+1)*num_walks;
-    int64_t mid_pos = int64_t(window_size/2);
+    int64_t step_end = (walk_length - window_size) + 1;
+    int64_t num_windows = step_end*num_walks;
 
-    // create arrays to hold results
-    auto pos_nodes = torch::empty({num_windows},torch::kInt64);
-    auto neg_nodes = torch::empty({num_windows},torch::kInt64);
-    auto windows = torch::empty({num_windows,window_size-1},torch::kInt64);
+    // create arrays to hold results, or fill the ones in out
+    check_out(out,3);
+    auto pos_nodes = output_tensor(out,0,{num_windows},walks->options());
+    auto neg_nodes = output_tensor(out,1,{num_windows},walks->options());
+    auto context_windows = output_tensor(out,2,{num_windows,window_size-1},walks->options());
 
     // grain size
-    int grain_size = torch::internal::GRAIN_SIZE / num_walks;
+    int64_t grain_size = windows_grain_size(step_end,window_size);
+
+    AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"to_windows_cbow_cpu",[&] {
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto pos_nodes_accessor = pos_nodes.accessor<index_t,1>();
+      auto neg_nodes_accesor = neg_nodes.accessor<index_t,1>();
+      auto windows_accesor = context_windows.accessor<index_t,2>();
+
+      // do work
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+              // negatives of every walk are drawn from their own stream
+              rng::Philox generator(seed,walk_idx,rng::WINDOW);
+
+              // get the walk for this index
+              auto walk = walks_accessor[walk_idx];
+
+              // loop over this walk
+              for(int64_t step_idx=0;step_idx<step_end;step_idx++){
+                  int64_t target_node_pos = (walk_idx * step_end) + step_idx;
+
+                  // create pos window
+                  auto pos_node = windows::copy_node_window(walk,step_idx,window_size,windows_accesor[target_node_pos]);
+                  pos_nodes_accessor[target_node_pos] = pos_node;
+
+                  // sample negative node
+                  auto neg_node = generator.sample_int(0,(num_nodes-1));
+                  auto max_checks = 0;
+                  while(neg_node == pos_node && max_checks <= 100){
+                      neg_node = generator.sample_int(0,(num_nodes-1));
+                      max_checks = max_checks + 1;
+                  }
+
+                  neg_nodes_accesor[target_node_pos] = neg_node;
+              }
+          }
+      });
+    });
 
-    // create accessors
-    auto walks_accessor = walks->accessor<int64_t,2>();
-    auto pos_nodes_accessor = pos_nodes.accessor<int64_t,1>();
-    auto neg_nodes_accesor = neg_nodes.accessor<int64_t,1>();
-    auto windows_accesor = windows.accessor<int64_t,2>();
+    return std::make_tuple(pos_nodes,neg_nodes,context_windows);
+}
 
-    // do work
-    torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
-        for (int64_t walk_idx = 0;walk_idx < num_walks;walk_idx++){
-            // get the walk for this index
-            auto walk = walks_accessor[walk_idx];
-
-            // loop over this walk
-            auto step_end = (walk_length - window_size) + 1;
-            for(int64_t step_idx=0;step_idx<step_end;step_idx++){
-                auto window_start = step_idx;
-                             
-                // calculate position in target nodes
-                int64_t target_node_pos = (walk_idx * step_end) + step_idx;
-                int64_t target_node_idx = window_start+mid_pos;
-                auto pos_node = walk[target_node_idx];
-                pos_nodes_accessor[target_node_pos] = pos_node;
-                
-                // sample negative node
-                auto neg_node = sample_int(0,(num_nodes-1));
-                auto max_checks = 0;
-                while(neg_node == pos_node && max_checks <= 100){
-                    neg_node = sample_int(0,(num_nodes-1));
-                    max_checks = max_checks + 1;
-                }
-                
-                neg_nodes_accesor[target_node_pos] = neg_node;
-
-                // create pos window
-                auto pos_window = windows_accesor[target_node_pos];
-                int64_t pos_index = 0;
-                for(int i = 0;i<window_size;i++){
-                    auto walk_pos = window_start+i;
-                    if(i != mid_pos){
-                        pos_window[pos_index] = walk[walk_pos];
-                        pos_index = pos_index + 1;
-                    }else{
-                        pos_index = pos_index;
-                    }    
-                }
-                                
-                
-                
-            }
-        }
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const int64_t num_nodes,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
+                    ){
+
+    // check walks is contiguous
+    CHECK_CONTIGUOUS(walks);
+    CHECK_SAME_TYPE((*walks),(*triples));
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    int64_t num_walks = walks->size(0);
+    int64_t walk_length = walks->size(1);
+    int64_t num_windows_in_one_walk = windows::num_windows_in_walk(walk_length);
+    int64_t num_windows_for_all_walks = num_windows_in_one_walk*num_walks;
+    int64_t num_triples = triples->size(0);
+
+    // create arrays to hold results, or fill the ones in out
+    check_out(out,3);
+    auto target_triples = output_tensor(out,0,{num_windows_for_all_walks,3},walks->options());
+    auto pos_windows = output_tensor(out,1,{num_windows_for_all_walks,window_size*2,3},walks->options());
+    auto neg_sets = output_tensor(out,2,negatives_sizes(num_windows_for_all_walks,num_negatives,{window_size*2,3}),walks->options());
+    auto neg_windows = neg_sets.view({num_windows_for_all_walks,window_size*2*num_negatives,3});
+
+    // grain size
+    int64_t grain_size = windows_grain_size(num_windows_in_one_walk,window_size*num_negatives);
+
+    AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"to_windows_triples_cpu",[&] {
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto target_triples_accessor = target_triples.accessor<index_t,2>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto neg_windows_accesor = neg_windows.accessor<index_t,3>();
+      auto triples_accesor = triples->accessor<index_t,2>();
+
+      // do work
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+
+          // loop over the walks of this chunk
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+
+              // negatives of every walk are drawn from their own stream
+              rng::Philox generator(seed,walk_idx,rng::WINDOW);
+
+              // get the walk at this index
+              auto walk = walks_accessor[walk_idx];
+
+              // one window per triple in the walk
+              for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+
+                  // calculate the position in target triples tensor
+                  auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+
+                  windows::triples_sg_window(walk,
+                                             target_idx,
+                                             walk_length,
+                                             window_size,
+                                             padding_idx,
+                                             triples_accesor,
+                                             num_triples,
+                                             num_negatives,
+                                             generator,
+                                             target_triples_accessor[target_pos],
+                                             pos_windows_accesor[target_pos],
+                                             neg_windows_accesor[target_pos]);
+              }
+          }
+      });
     });
-        
-    return std::make_tuple(pos_nodes,neg_nodes,windows);
+
+    return std::make_tuple(target_triples,pos_windows,neg_sets);
 }
 
-std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cpu(const torch::Tensor *walks,
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_cpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
-                        const int seed
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                     ){
 
-    // seed
-    srand(seed);
+    // check walks is contiguous
+    CHECK_CONTIGUOUS(walks);
+    CHECK_SAME_TYPE((*walks),(*triples));
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    int64_t num_walks = walks->size(0);
+    int64_t walk_length = walks->size(1);
+    int64_t num_windows_in_one_walk = windows::num_windows_in_walk(walk_length);
+    int64_t num_windows_for_all_walks = num_windows_in_one_walk*num_walks;
+    int64_t num_triples = triples->size(0);
+
+    // create arrays to hold results, or fill the ones in out
+    check_out(out,3);
+    auto pos_triples = output_tensor(out,0,{num_windows_for_all_walks,3},walks->options());
+    auto neg_sets = output_tensor(out,1,negatives_sizes(num_windows_for_all_walks,num_negatives,{3}),walks->options());
+    auto pos_windows = output_tensor(out,2,{num_windows_for_all_walks,window_size*2,3},walks->options());
+    auto neg_triples = neg_sets.view({num_windows_for_all_walks,num_negatives,3});
+
+    // grain size
+    int64_t grain_size = windows_grain_size(num_windows_in_one_walk,window_size);
+
+    AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"to_windows_triples_cbow_cpu",[&] {
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto pos_triples_accessor = pos_triples.accessor<index_t,2>();
+      auto neg_triples_accesor = neg_triples.accessor<index_t,3>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto triples_accesor = triples->accessor<index_t,2>();
+
+      // do work
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+
+          // loop over the walks of this chunk
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+
+              // negatives of every walk are drawn from their own stream
+              rng::Philox generator(seed,walk_idx,rng::WINDOW);
+
+              // get the walk at this index
+              auto walk = walks_accessor[walk_idx];
+
+              // one window per triple in the walk
+              for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+
+                  // calculate the position in target triples tensor
+                  auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+
+                  windows::triples_cbow_window(walk,
+                                               target_idx,
+                                               walk_length,
+                                               window_size,
+                                               padding_idx,
+                                               triples_accesor,
+                                               num_triples,
+                                               generator,
+                                               pos_triples_accessor[target_pos],
+                                               neg_triples_accesor[target_pos][0],
+                                               pos_windows_accesor[target_pos]);
+                  windows::triples_cbow_negatives(walk,
+                                                  target_idx,
+                                                  walk_length,
+                                                  padding_idx,
+                                                  triples_accesor,
+                                                  num_triples,
+                                                  num_negatives,
+                                                  generator,
+                                                  neg_triples_accesor[target_pos]);
+              }
+          }
+      });
+    });
+
+    return std::make_tuple(pos_triples,neg_sets,pos_windows);
+}
+
+at::Tensor to_windows_triples_index_cpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    ){
 
     // check walks is contiguous
     CHECK_CONTIGUOUS(walks);
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
 
     // calculate sizes
     int64_t num_walks = walks->size(0);
     int64_t walk_length = walks->size(1);
-    int64_t num_windows_in_one_walk = (walk_length - 1)/2; 
+    int64_t num_windows_in_one_walk = windows::num_windows_in_walk(walk_length);
     int64_t num_windows_for_all_walks = num_windows_in_one_walk*num_walks;
     int64_t num_triples = triples->size(0);
+    TORCH_CHECK(num_windows_for_all_walks <= INT32_MAX && num_triples <= INT32_MAX,"too many windows or triples for int32 indices");
 
-    // create arrays to hold results
-    auto target_triples = torch::empty({num_windows_for_all_walks,3},torch::kInt64);
-    auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},torch::kInt64);
-    auto neg_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},torch::kInt64);
+    // the context of a window is read from the walks, only the negatives are stored with a row per window
+    auto neg_index = torch::empty({num_windows_for_all_walks,window_size*2*num_negatives},torch::kInt32);
 
     // grain size
-    int grain_size = torch::internal::GRAIN_SIZE / num_walks;
+    int64_t grain_size = windows_grain_size(num_windows_in_one_walk,window_size*num_negatives);
 
     // create accessors
-    auto walks_accessor = walks->accessor<int64_t,2>();
-    auto target_triples_accessor = target_triples.accessor<int64_t,2>();
-    auto pos_windows_accesor = pos_windows.accessor<int64_t,3>();
-    auto neg_windows_accesor = neg_windows.accessor<int64_t,3>();
-    auto triples_accesor = triples->accessor<int64_t,2>();
+    auto neg_index_accessor = neg_index.accessor<int32_t,2>();
 
     // do work
     torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
-        
-        // loop over walks
-        for (int64_t walk_idx = 0;walk_idx < num_walks;walk_idx++){
-            
-            // get the walk at this index
-            auto walk = walks_accessor[walk_idx];
-
-            
-            // hop by two steps
-            int64_t target_index = 0;
-            for(int64_t target_rel_index=1;target_rel_index<walk_length-1;target_rel_index+=2){
-                                
-                // calculate the position in target triples tensor
-                auto target_pos = (num_windows_in_one_walk * walk_idx) + target_index;
-
-
-                // get the target triple
-                target_triples_accessor[target_pos][0] = walk[target_rel_index -1];     // Head
-                target_triples_accessor[target_pos][1] = walk[target_rel_index];         // Relation
-                target_triples_accessor[target_pos][2] = walk[target_rel_index + 1];     // Tail
-
-                // get left positive windows
-                for(int64_t hop=0;hop<=window_size;hop++){
-                                
-                    // get head
-                    auto rel_idx = target_rel_index - ((hop + 1)*2);
-                    auto head_idx = rel_idx - 1;
-                    auto tail_idx = rel_idx + 1;
-                                         
-                    // head node
-                    if(head_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][0] = walk[rel_idx];;
-                    }else{
-                        pos_windows_accesor[target_pos][hop][0] = padding_idx;
-                    }
-
-                    // rel node
-                    if(rel_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][1] = walk[rel_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][hop][1] = padding_idx;
-                    }
-
-                    // tail node
-                    if(tail_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][2] = walk[tail_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][hop][2] = padding_idx;
-                    }
-
-                }
-
-                // get right positive windows
-                for(int64_t hop=0;hop<window_size;hop++){
-                                
-                    // window item position
-                    auto window_item_pos = hop+window_size;
-
-                    // get head
-                    auto rel_idx = target_rel_index + ((hop + 1)*2);
-                    auto head_idx = rel_idx - 1;
-                    auto tail_idx = rel_idx + 1;
-
-                    //printf("Hop index: %d / Target rel index: %d / Rel index: %d \n",hop,target_rel_index, rel_idx);                    
-                                         
-                    // head node
-                    if(head_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][0] = walk[head_idx];;
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][0] = padding_idx;
-                    }
-
-                    // rel node
-                    if(rel_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][1] = walk[rel_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][1] = padding_idx;
-                    }
-
-                    // tail node
-                    if(tail_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][2] = walk[tail_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][2] = padding_idx;
-                    }
-
-                }
-                
-
-                // create negatives
-                for(int64_t hop=0;hop<(window_size*2);hop++){
-                    
-                    auto triple_idx = sample_int(0,(num_triples-1));
-
-                    auto triple = triples_accesor[triple_idx];
-
-                    // decide what to corrupt
-                    neg_windows_accesor[target_pos][hop][0] = triple[0];
-                    neg_windows_accesor[target_pos][hop][1] = triple[1];
-                    neg_windows_accesor[target_pos][hop][2] = triple[2];
-                
-                }
-
-                // update target index
-                target_index = target_index + 1;
+        for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
 
+            // same stream as to_windows_triples_cpu
+            rng::Philox generator(seed,walk_idx,rng::WINDOW);
+
+            for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+                auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+                windows::triples_sg_negatives(window_size,num_triples,num_negatives,generator,neg_index_accessor[target_pos]);
             }
         }
     });
-        
-    return std::make_tuple(target_triples,pos_windows,neg_windows);
+
+    auto neg_sets = neg_index.view({num_windows_for_all_walks,num_negatives,window_size*2});
+    return squeeze_negatives(neg_sets,num_negatives);
 }
 
-std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_cpu(const torch::Tensor *walks,
+at::Tensor to_windows_triples_cbow_index_cpu(const torch::Tensor *walks,
                         const int window_size,
-                        const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
+                        const int num_negatives,
                         const int seed
                     ){
 
-    // seed
-    srand(seed);
-
     // check walks is contiguous
     CHECK_CONTIGUOUS(walks);
+    CHECK_SAME_TYPE((*walks),(*triples));
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
 
     // calculate sizes
     int64_t num_walks = walks->size(0);
     int64_t walk_length = walks->size(1);
-    int64_t num_windows_in_one_walk = (walk_length - 1)/2; 
+    int64_t num_windows_in_one_walk = windows::num_windows_in_walk(walk_length);
     int64_t num_windows_for_all_walks = num_windows_in_one_walk*num_walks;
     int64_t num_triples = triples->size(0);
+    TORCH_CHECK(num_windows_for_all_walks <= INT32_MAX && num_triples <= INT32_MAX,"too many windows or triples for int32 indices");
 
-    // create arrays to hold results
-    auto pos_triples = torch::empty({num_windows_for_all_walks,3},torch::kInt64);
-    auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},torch::kInt64);
-    auto neg_triples = torch::empty({num_windows_for_all_walks,3},torch::kInt64);
+    // the context of a window is read from the walks, only the negatives are stored with a row per window
+    auto neg_index = torch::empty({num_windows_for_all_walks,num_negatives},torch::kInt32);
 
     // grain size
-    int grain_size = torch::internal::GRAIN_SIZE / num_walks;
+    int64_t grain_size = windows_grain_size(num_windows_in_one_walk,window_size);
+
+    AT_DISPATCH_INDEX_TYPES(walks->scalar_type(),"to_windows_triples_cbow_index_cpu",[&] {
+
+      // create accessors
+      auto walks_accessor = walks->accessor<index_t,2>();
+      auto neg_index_accessor = neg_index.accessor<int32_t,2>();
+      auto triples_accesor = triples->accessor<index_t,2>();
+
+      // do work
+      torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
+          for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+
+              // same stream as to_windows_triples_cbow_cpu
+              rng::Philox generator(seed,walk_idx,rng::WINDOW);
+              auto walk = walks_accessor[walk_idx];
+
+              for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+                  auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+                  for(int64_t negative=0;negative<num_negatives;negative++){
+                      neg_index_accessor[target_pos][negative] = windows::sample_cbow_negative(walk,target_idx,walk_length,padding_idx,triples_accesor,num_triples,generator);
+                  }
+              }
+          }
+      });
+    });
 
-    // create accessors
-    auto walks_accessor = walks->accessor<int64_t,2>();
-    auto pos_triples_accessor = pos_triples.accessor<int64_t,2>();
-    auto neg_triples_accesor = neg_triples.accessor<int64_t,2>();
-    auto pos_windows_accesor = pos_windows.accessor<int64_t,3>();
-    auto triples_accesor = triples->accessor<int64_t,2>();
+    return squeeze_negatives(neg_index,num_negatives);
+}
+
+// Hand every window of the packed walks (values, offsets) to make_window, with the stream of
+// its walk. The windows of walk i start at window_starts[i], see packed_window_starts.
+template <typename index_t, typename window_fn_t>
+void packed_windows(const torch::Tensor *values,
+                    const torch::Tensor *offsets,
+                    const torch::Tensor &window_starts,
+                    const int window_size,
+                    const int seed,
+                    window_fn_t make_window){
+
+    int64_t num_walks = offsets->size(0) - 1;
+    auto values_data = values->data_ptr<index_t>();
+    auto offsets_accessor = offsets->accessor<int64_t,1>();
+    auto window_starts_accessor = window_starts.accessor<int64_t,1>();
+
+    // grain size from the mean number of windows of a walk
+    int64_t mean_windows = num_walks > 0 ? window_starts_accessor[num_walks] / num_walks : 0;
+    int64_t grain_size = windows_grain_size(mean_windows,window_size);
 
-    // do work
     torch::parallel_for(0,num_walks,grain_size,[&](int64_t walk_idx_start,int64_t walk_idx_end){
-        
-        // loop over walks
-        for (int64_t walk_idx = 0;walk_idx < num_walks;walk_idx++){
-            
-            // get the walk at this index
-            auto walk = walks_accessor[walk_idx];
-
-            
-            // hop by two steps
-            int64_t target_index = 0;
-            for(int64_t target_rel_index=1;target_rel_index<walk_length-1;target_rel_index+=2){
-                                
-                // calculate the position in target triples tensor
-                auto target_pos = (num_windows_in_one_walk * walk_idx) + target_index;
-
-
-                // get the target triple
-                auto pos_head = walk[target_rel_index -1];
-                auto pos_rel = walk[target_rel_index]; 
-                auto pos_tail = walk[target_rel_index + 1];
-                
-                pos_triples_accessor[target_pos][0] = pos_head;     // Head
-                pos_triples_accessor[target_pos][1] = pos_rel;       // Relation
-                pos_triples_accessor[target_pos][2] = pos_tail;     // Tail
-
-                // sample negative triple
-                auto neg_triple_idx = sample_int(0,(num_triples-1));
-                auto neg_head = triples_accesor[neg_triple_idx][0];
-                auto neg_rel = triples_accesor[neg_triple_idx][1];
-                auto neg_tail = triples_accesor[neg_triple_idx][2];
-
-                // loop until we find a negative triple that is not equal to positive triple
-                auto max_checks = 0;
-                while(neg_head == pos_head && neg_rel == pos_rel && neg_tail == pos_tail && max_checks<=100){
-                    // sample negative triple
-                    neg_triple_idx = sample_int(0,(num_triples-1));
-                    neg_head = triples_accesor[neg_triple_idx][0];
-                    neg_rel = triples_accesor[neg_triple_idx][1];
-                    neg_tail = triples_accesor[neg_triple_idx][2];
-
-                    max_checks = max_checks + 1;
-                }
-
-                neg_triples_accesor[target_pos][0] = neg_head;
-                neg_triples_accesor[target_pos][1] = neg_rel;
-                neg_triples_accesor[target_pos][2] = neg_tail;
-
-                // get left positive windows
-                for(int64_t hop=0;hop<=window_size;hop++){
-                                
-                    // get head
-                    auto rel_idx = target_rel_index - ((hop + 1)*2);
-                    auto head_idx = rel_idx - 1;
-                    auto tail_idx = rel_idx + 1;
-                                         
-                    // head node
-                    if(head_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][0] = walk[rel_idx];;
-                    }else{
-                        pos_windows_accesor[target_pos][hop][0] = padding_idx;
-                    }
-
-                    // rel node
-                    if(rel_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][1] = walk[rel_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][hop][1] = padding_idx;
-                    }
-
-                    // tail node
-                    if(tail_idx >= 0){
-                        pos_windows_accesor[target_pos][hop][2] = walk[tail_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][hop][2] = padding_idx;
-                    }
-
-                }
-
-                
-
-                // get right positive windows
-                for(int64_t hop=0;hop<window_size;hop++){
-                                
-                    // window item position
-                    auto window_item_pos = hop+window_size;
-
-                    // get head
-                    auto rel_idx = target_rel_index + ((hop + 1)*2);
-                    auto head_idx = rel_idx - 1;
-                    auto tail_idx = rel_idx + 1;
-
-                    //printf("Hop index: %d / Target rel index: %d / Rel index: %d \n",hop,target_rel_index, rel_idx);                    
-                                         
-                    // head node
-                    if(head_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][0] = walk[head_idx];;
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][0] = padding_idx;
-                    }
-
-                    // rel node
-                    if(rel_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][1] = walk[rel_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][1] = padding_idx;
-                    }
-
-                    // tail node
-                    if(tail_idx < walk_length){
-                        pos_windows_accesor[target_pos][window_item_pos][2] = walk[tail_idx];
-                    }else{
-                        pos_windows_accesor[target_pos][window_item_pos][2] = padding_idx;
-                    }
-
-                }
-                
-
-                // update target index
-                target_index = target_index + 1;
+        for (int64_t walk_idx = walk_idx_start;walk_idx < walk_idx_end;walk_idx++){
+
+            // the stream of the walk as in the unpacked window functions
+            rng::Philox generator(seed,walk_idx,rng::WINDOW);
 
+            const index_t *walk = values_data + offsets_accessor[walk_idx];
+            int64_t walk_length = offsets_accessor[walk_idx + 1] - offsets_accessor[walk_idx];
+            int64_t window_start = window_starts_accessor[walk_idx];
+            int64_t num_windows = window_starts_accessor[walk_idx + 1] - window_start;
+
+            for(int64_t target_idx=0;target_idx<num_windows;target_idx++){
+                make_window(walk,walk_length,target_idx,window_start + target_idx,generator);
             }
         }
     });
-        
-    return std::make_tuple(pos_triples,neg_triples,pos_windows);
-}
\ No newline at end of file
+}
+
+void check_packed(const torch::Tensor *values, const torch::Tensor *offsets, const torch::Tensor *triples){
+    CHECK_CONTIGUOUS(values);
+    CHECK_SAME_TYPE((*values),(*triples));
+    TORCH_CHECK(offsets->scalar_type() == torch::kInt64 && offsets->dim() == 1 && offsets->size(0) >= 1,
+                "offsets must be an int64 tensor of num_walks + 1 positions");
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_packed_cpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    ){
+
+    check_packed(values,offsets,triples);
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    auto window_starts = packed_window_starts(*offsets);
+    int64_t num_windows = window_starts[-1].item<int64_t>();
+    int64_t num_triples = triples->size(0);
+
+    // create arrays to hold results
+    auto target_triples = torch::empty({num_windows,3},values->options());
+    auto pos_windows = torch::empty({num_windows,window_size*2,3},values->options());
+    auto neg_windows = torch::empty({num_windows,window_size*2*num_negatives,3},values->options());
+
+    AT_DISPATCH_INDEX_TYPES(values->scalar_type(),"to_windows_triples_packed_cpu",[&] {
+
+      // create accessors
+      auto target_triples_accessor = target_triples.accessor<index_t,2>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto neg_windows_accesor = neg_windows.accessor<index_t,3>();
+      auto triples_accesor = triples->accessor<index_t,2>();
+
+      packed_windows<index_t>(values,offsets,window_starts,window_size*num_negatives,seed,
+        [&](const index_t *walk,int64_t walk_length,int64_t target_idx,int64_t target_pos,rng::Philox &generator){
+          windows::triples_sg_window(walk,
+                                     target_idx,
+                                     walk_length,
+                                     window_size,
+                                     padding_idx,
+                                     triples_accesor,
+                                     num_triples,
+                                     num_negatives,
+                                     generator,
+                                     target_triples_accessor[target_pos],
+                                     pos_windows_accesor[target_pos],
+                                     neg_windows_accesor[target_pos]);
+        });
+    });
+
+    auto neg_sets = neg_windows.view({num_windows,num_negatives,window_size*2,3});
+    return std::make_tuple(target_triples,pos_windows,squeeze_negatives(neg_sets,num_negatives));
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_packed_cpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    ){
+
+    check_packed(values,offsets,triples);
+    TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+    // calculate sizes
+    auto window_starts = packed_window_starts(*offsets);
+    int64_t num_windows = window_starts[-1].item<int64_t>();
+    int64_t num_triples = triples->size(0);
+
+    // create arrays to hold results
+    auto pos_triples = torch::empty({num_windows,3},values->options());
+    auto pos_windows = torch::empty({num_windows,window_size*2,3},values->options());
+    auto neg_triples = torch::empty({num_windows,num_negatives,3},values->options());
+
+    AT_DISPATCH_INDEX_TYPES(values->scalar_type(),"to_windows_triples_cbow_packed_cpu",[&] {
+
+      // create accessors
+      auto pos_triples_accessor = pos_triples.accessor<index_t,2>();
+      auto neg_triples_accesor = neg_triples.accessor<index_t,3>();
+      auto pos_windows_accesor = pos_windows.accessor<index_t,3>();
+      auto triples_accesor = triples->accessor<index_t,2>();
+
+      packed_windows<index_t>(values,offsets,window_starts,window_size,seed,
+        [&](const index_t *walk,int64_t walk_length,int64_t target_idx,int64_t target_pos,rng::Philox &generator){
+          windows::triples_cbow_window(walk,
+                                       target_idx,
+                                       walk_length,
+                                       window_size,
+                                       padding_idx,
+                                       triples_accesor,
+                                       num_triples,
+                                       generator,
+                                       pos_triples_accessor[target_pos],
+                                       neg_triples_accesor[target_pos][0],
+                                       pos_windows_accesor[target_pos]);
+          windows::triples_cbow_negatives(walk,
+                                          target_idx,
+                                          walk_length,
+                                          padding_idx,
+                                          triples_accesor,
+                                          num_triples,
+                                          num_negatives,
+                                          generator,
+                                          neg_triples_accesor[target_pos]);
+        });
+    });
+
+    return std::make_tuple(pos_triples,squeeze_negatives(neg_triples,num_negatives),pos_windows);
+}
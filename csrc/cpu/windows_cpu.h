@@ -1,15 +1,21 @@
+#pragma once
 #include <torch/extension.h>
 
+// number of walks handed to a thread at once when building windows
+int64_t windows_grain_size(int64_t num_windows_in_walk, int64_t window_size);
+
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cbow_cpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cpu(const torch::Tensor *walks,
@@ -17,7 +23,9 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cpu(const torc
                         const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
-                        const int seed
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_cpu(const torch::Tensor *walks,
@@ -25,5 +33,48 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_cpu(const
                         const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
+                    );
+// the to_windows_triples* functions draw num_negatives sets of negatives per window, given
+// as an extra dim after the windows when there is more than one set.
+// The padded window functions fill the tensors in out in place when it is not empty (see output_tensor)
+
+// negatives of to_windows_triples_cpu as int32 indices into triples, one row per window of the walks
+at::Tensor to_windows_triples_index_cpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    );
+
+// negatives of to_windows_triples_cbow_cpu as int32 indices into triples, one row per window of the walks
+at::Tensor to_windows_triples_cbow_index_cpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    );
+
+// to_windows_triples_cpu for the packed walks (values, offsets) of walk_triples_packed_cpu,
+// with only the windows of the triples in every walk
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_packed_cpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                    );
+
+// to_windows_triples_cbow_cpu for the packed walks (values, offsets) of walk_triples_packed_cpu
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_packed_cpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
                         const int seed
-                    );
\ No newline at end of file
+                    );
@@ -2,58 +2,24 @@
 #include <iostream>
 #include <thread>
 #include <ATen/cuda/CUDAContext.h>
-#include <curand.h>
-#include <curand_kernel.h>
-#include "../utils.h"
+#include "../rng.h"
+#include "../triples.h"
 #include "utils.cuh"
 
 
 namespace triples {
   
-    __device__ RelationTail sample_neighbor_gpu(int64_t target_node,
-                        int64_t padding_index,
-                        const torch::PackedTensorAccessor64<int64_t,2> relation_tail_index,
-                        const torch::PackedTensorAccessor64<int64_t,2> triples_indexed,
-                        curandState_t* rand_state
-                        ) {
-    
-        RelationTail rt;
-    
-        // if target node is padding index, then jump node becomes target node
-        if(target_node != padding_index){
-    
-        // get the edge range for the target node
-        auto start_index = relation_tail_index[target_node][0];
-        auto end_index = relation_tail_index[target_node][1];
-        // randomly select an index in this range
-        if(start_index == -1 || end_index == -1){
-            rt.relation = padding_index;
-            rt.tail = padding_index;
-        }else{
-            auto nbr_edge_index = sample_int_gpu(start_index,end_index,rand_state);
-    
-            // get the edge at this index
-            rt.relation = triples_indexed[nbr_edge_index][1];
-            rt.tail = triples_indexed[nbr_edge_index][2];
-        }
-    
-        }else{
-            rt.relation = padding_index;
-            rt.tail = padding_index;
-        }
-        
-        return rt;
-    
-    }
-    
-    __global__ void uniform_walk_triples_gpu(const torch::PackedTensorAccessor64<int64_t,2> walks,
-                    const torch::PackedTensorAccessor64<int64_t,2> triples_indexed_accessor,
-                    const torch::PackedTensorAccessor64<int64_t,2> relation_tail_index_accessor,
-                    const torch::PackedTensorAccessor64<int64_t,1> target_nodes_accesor,
+    template <typename scalar_t>
+    __global__ void uniform_walk_triples_gpu(torch::PackedTensorAccessor64<scalar_t,2> walks,
+                    const torch::PackedTensorAccessor64<scalar_t,2> triples_indexed_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,2> relation_tail_index_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> target_nodes_accesor,
                     const int walk_length,
                     const int64_t padding_idx,
-                    const int64_t num_nodes,
-                    curandState* rand_states
+                    const bool restart,
+                    const int64_t num_walks,
+                    const int64_t walks_per_node,
+                    const int seed
                     ) {
     
         // get the thread
@@ -61,113 +27,323 @@ namespace triples {
     
    
         // bound check
-        if(thread_index < num_nodes) {
-            // rng
-            auto rand_state = rand_states[thread_index];
+        if(thread_index < num_walks) {
+            // every walk draws from its own stream, the same one used on the cpu
+            rng::Philox generator(seed,thread_index,rng::WALK);
      
             // get the walk array for this node
             auto walks_for_node = walks[thread_index];
                     
             // get the target node
-            int64_t target_node = target_nodes_accesor[thread_index];
+            int64_t target_node = target_nodes_accesor[thread_index / walks_per_node];
     
+            // walk from the target node, padding the walk after it ended
+            uniform_walk(walks_for_node,
+                         walk_length,
+                         target_node,
+                         restart,
+                         true,
+                         relation_tail_index_accessor,
+                         triples_indexed_accessor,
+                         padding_idx,
+                         generator);
+        }
+    
+    }
+
+    template <typename scalar_t>
+    __global__ void weighted_walk_triples_gpu(torch::PackedTensorAccessor64<scalar_t,2> walks,
+                    const torch::PackedTensorAccessor64<scalar_t,2> triples_indexed_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,2> relation_tail_index_accessor,
+                    const torch::PackedTensorAccessor64<float,1> alias_prob_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> alias_index_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> target_nodes_accesor,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const int64_t num_walks,
+                    const int64_t walks_per_node,
+                    const int seed
+                    ) {
+
+        // get the thread
+        const auto thread_index = blockIdx.x * blockDim.x + threadIdx.x;
+
+        // bound check
+        if(thread_index < num_walks) {
+            // every walk draws from its own stream, the same one used on the cpu
+            rng::Philox generator(seed,thread_index,rng::WALK);
+
+            // get the walk array for this node
+            auto walks_for_node = walks[thread_index];
+
+            // get the target node
+            int64_t target_node = target_nodes_accesor[thread_index / walks_per_node];
+
             // add target node as the first node in walk
             walks_for_node[0] = target_node;
-    
+
             // start walk
             int64_t previous_node = target_node;
             for (int64_t walk_step=1;walk_step < walk_length;walk_step=walk_step+2){
-                // sample a neighor
-                auto next_rt = sample_neighbor_gpu(previous_node,
-                                                        padding_idx,
+                auto next_rt = sample_weighted_neighbor(previous_node,
                                                         relation_tail_index_accessor,
                                                         triples_indexed_accessor,
-                                                        &rand_state);
+                                                        alias_prob_accessor,
+                                                        alias_index_accessor,
+                                                        padding_idx,
+                                                        generator);
 
                 walks_for_node[walk_step] = next_rt.relation;
                 walks_for_node[walk_step+1] = next_rt.tail;
-              
+
                 // update previous node
                 previous_node = next_rt.tail;
-    
             }
         }
-    
+
+    }
+
+    template <typename scalar_t>
+    __global__ void biased_walk_triples_gpu(torch::PackedTensorAccessor64<scalar_t,2> walks,
+                    const torch::PackedTensorAccessor64<scalar_t,2> triples_indexed_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,2> relation_tail_index_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> sorted_tails_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> target_nodes_accesor,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const int64_t num_walks,
+                    const int64_t walks_per_node,
+                    const TripleBias bias,
+                    const int seed
+                    ) {
+
+        // get the thread
+        const auto thread_index = blockIdx.x * blockDim.x + threadIdx.x;
+
+        // bound check
+        if(thread_index < num_walks) {
+            // every walk draws from its own stream, the same one used on the cpu
+            rng::Philox generator(seed,thread_index,rng::WALK);
+
+            // get the walk array for this node
+            auto walks_for_node = walks[thread_index];
+
+            // get the target node
+            int64_t target_node = target_nodes_accesor[thread_index / walks_per_node];
+
+            // add target node as the first node in walk
+            walks_for_node[0] = target_node;
+
+            // the first step has no previous node, which makes it uniform
+            int64_t previous_node = padding_idx;
+            int64_t previous_relation = padding_idx;
+            int64_t current_node = target_node;
+            for (int64_t walk_step=1;walk_step < walk_length;walk_step=walk_step+2){
+                auto next_rt = sample_biased_neighbor(current_node,
+                                                      previous_node,
+                                                      previous_relation,
+                                                      relation_tail_index_accessor,
+                                                      triples_indexed_accessor,
+                                                      sorted_tails_accessor,
+                                                      padding_idx,
+                                                      bias,
+                                                      generator);
+
+                walks_for_node[walk_step] = next_rt.relation;
+                walks_for_node[walk_step+1] = next_rt.tail;
+
+                previous_node = current_node;
+                previous_relation = next_rt.relation;
+                current_node = next_rt.tail;
+            }
+        }
+
     }
 
-    __global__ void init_rand_states(const int64_t seed, curandState *states) {
-        int idx = blockIdx.x * blockDim.x + threadIdx.x;
-        curand_init(seed, idx, 0, &states[idx]);
-     }
-    
     torch::Tensor walk_triples_gpu(const torch::Tensor *triples_indexed,
                     const torch::Tensor *relation_tail_index,
                     const torch::Tensor *target_nodes,
                     const int walk_length,
                     const int64_t padding_idx,
                     const bool restart,
-                    const int seed                  
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
                     ) {
     
         CHECK_CUDA((*triples_indexed));
         CHECK_CUDA((*relation_tail_index));
         CHECK_CUDA((*target_nodes));
+        CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
     
-        // construct a tensor to hold the walks
-        auto walk_size = (walk_length * 2) + 1;  
-        auto options = torch::TensorOptions().dtype(torch::kInt64).device(torch::kCUDA,target_nodes->device().index());  
-        auto walks = torch::empty({(*target_nodes).size(0),walk_size},options); 
-        
-        // create accessors
-        auto walks_accessor = walks.packed_accessor64<int64_t,2>();
-        auto triples_indexed_accessor = triples_indexed->packed_accessor64<int64_t,2>();
-        auto relation_tail_index_accessor = relation_tail_index->packed_accessor64<int64_t,2>();
-        auto target_nodes_accesor = target_nodes->packed_accessor64<int64_t,1>();
-
-        // get the number of nodes
-        int64_t num_nodes = (*target_nodes).size(0);
+        // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+        check_out(out,1);
+        TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+        auto walk_size = (walk_length * 2) + 1;
+        auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
+
+        // get the number of walks
+        int64_t num_walks = walks.size(0);
+        if(num_walks == 0){
+            return walks;
+        }
 
         // Thread block size
         int NUM_THREADS = 128;
 
         // Grid size
-        int NUM_BLOCKS = int((num_nodes + NUM_THREADS - 1)/NUM_THREADS);
+        int NUM_BLOCKS = int((num_walks + NUM_THREADS - 1)/NUM_THREADS);
 
         // active stream
         auto stream = at::cuda::getCurrentCUDAStream();
 
-        // random states
-        curandState *rand_states;
-        cudaMalloc(&rand_states, NUM_THREADS * NUM_BLOCKS);
+        // perform walks
+        AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_gpu",[&] {
+            uniform_walk_triples_gpu<index_t><<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(walks.packed_accessor64<index_t,2>(),
+                                                                            triples_indexed->packed_accessor64<index_t,2>(),
+                                                                            relation_tail_index->packed_accessor64<index_t,2>(),
+                                                                            target_nodes->packed_accessor64<index_t,1>(),
+                                                                            walk_size,
+                                                                            padding_idx,
+                                                                            restart,
+                                                                            num_walks,
+                                                                            walks_per_node,
+                                                                            seed
+                                                                        );
+        });
+
+        return walks;
+    
+    }
+
+    torch::Tensor walk_triples_biased_gpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *sorted_tails,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const double p,
+                    const double q,
+                    const double relation_bias,
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
+                    ) {
+
+        CHECK_CUDA((*triples_indexed));
+        CHECK_CUDA((*relation_tail_index));
+        CHECK_CUDA((*sorted_tails));
+        CHECK_CUDA((*target_nodes));
+        CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*sorted_tails));
+        CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+        TORCH_CHECK(sorted_tails->size(0) == triples_indexed->size(0), "sorted_tails must have one tail per triple");
+        TORCH_CHECK(p > 0 && q > 0 && relation_bias > 0, "p, q and relation_bias must be positive");
+
+        // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+        check_out(out,1);
+        TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+        auto walk_size = (walk_length * 2) + 1;
+        auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
+        const TripleBias bias(p,q,relation_bias);
 
-        int64_t actual_seed = 0;
-        if(seed==0){
-            actual_seed = time(NULL);
-        }else{
-            actual_seed = actual_seed;
+        // get the number of walks
+        int64_t num_walks = walks.size(0);
+        if(num_walks == 0){
+            return walks;
         }
 
-        // init states
-        init_rand_states<<<NUM_BLOCKS, NUM_THREADS,0,stream>>>(actual_seed,rand_states);
-                                
+        // Thread block size
+        int NUM_THREADS = 128;
+
+        // Grid size
+        int NUM_BLOCKS = int((num_walks + NUM_THREADS - 1)/NUM_THREADS);
+
+        // active stream
+        auto stream = at::cuda::getCurrentCUDAStream();
+
         // perform walks
-        uniform_walk_triples_gpu<<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(walks_accessor,
-                                                                        triples_indexed_accessor,
-                                                                        relation_tail_index_accessor,
-                                                                        target_nodes_accesor,
-                                                                        walk_size,
-                                                                        padding_idx,
-                                                                        num_nodes,
-                                                                        rand_states
-                                                                    );
-
-        // delete rand states
-        cudaFree(rand_states);
-        
+        AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_biased_gpu",[&] {
+            biased_walk_triples_gpu<index_t><<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(walks.packed_accessor64<index_t,2>(),
+                                                                            triples_indexed->packed_accessor64<index_t,2>(),
+                                                                            relation_tail_index->packed_accessor64<index_t,2>(),
+                                                                            sorted_tails->packed_accessor64<index_t,1>(),
+                                                                            target_nodes->packed_accessor64<index_t,1>(),
+                                                                            walk_size,
+                                                                            padding_idx,
+                                                                            num_walks,
+                                                                            walks_per_node,
+                                                                            bias,
+                                                                            seed
+                                                                        );
+        });
+
         return walks;
-    
+
     }
-}
 
+    torch::Tensor walk_triples_weighted_gpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *alias_prob,
+                    const torch::Tensor *alias_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int64_t padding_idx,
+                    const int walks_per_node,
+                    const int seed,
+                    const std::vector<torch::Tensor> &out
+                    ) {
+
+        CHECK_CUDA((*triples_indexed));
+        CHECK_CUDA((*relation_tail_index));
+        CHECK_CUDA((*alias_prob));
+        CHECK_CUDA((*alias_index));
+        CHECK_CUDA((*target_nodes));
+        CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*alias_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+        TORCH_CHECK(alias_prob->scalar_type() == torch::kFloat32, "alias_prob must be a float32 tensor");
+        TORCH_CHECK(alias_prob->size(0) == triples_indexed->size(0) && alias_index->size(0) == triples_indexed->size(0), "the alias table must have one entry per triple");
+
+        // construct a tensor to hold the walks, with the index type of the triples, or fill out[0]
+        check_out(out,1);
+        TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+        auto walk_size = (walk_length * 2) + 1;
+        auto walks = output_tensor(out,0,{(*target_nodes).size(0) * walks_per_node,walk_size},triples_indexed->options());
 
+        // get the number of walks
+        int64_t num_walks = walks.size(0);
+        if(num_walks == 0){
+            return walks;
+        }
+
+        // Thread block size
+        int NUM_THREADS = 128;
 
+        // Grid size
+        int NUM_BLOCKS = int((num_walks + NUM_THREADS - 1)/NUM_THREADS);
+
+        // active stream
+        auto stream = at::cuda::getCurrentCUDAStream();
+
+        // perform walks
+        AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_triples_weighted_gpu",[&] {
+            weighted_walk_triples_gpu<index_t><<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(walks.packed_accessor64<index_t,2>(),
+                                                                            triples_indexed->packed_accessor64<index_t,2>(),
+                                                                            relation_tail_index->packed_accessor64<index_t,2>(),
+                                                                            alias_prob->packed_accessor64<float,1>(),
+                                                                            alias_index->packed_accessor64<index_t,1>(),
+                                                                            target_nodes->packed_accessor64<index_t,1>(),
+                                                                            walk_size,
+                                                                            padding_idx,
+                                                                            num_walks,
+                                                                            walks_per_node,
+                                                                            seed
+                                                                        );
+        });
+
+        return walks;
+
+    }
+}
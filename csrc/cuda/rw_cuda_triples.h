@@ -2,12 +2,45 @@
 #include <torch/extension.h>
 
 namespace triples {
+  // walks_per_node walks from every target node, in the order of target_nodes.repeat_interleave(walks_per_node)
   torch::Tensor walk_triples_gpu(const torch::Tensor *triples_indexed,
                   const torch::Tensor *relation_tail_index,
                   const torch::Tensor *target_nodes,
                   const int walk_length,
                   const int64_t padding_idx,
                   const bool restart,
-                  const int seed
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
                 );
-}
\ No newline at end of file
+
+  // walk_triples_gpu with the second order bias of TripleBias,
+  // sorted_tails holds the tails of triples_indexed sorted within every head
+  torch::Tensor walk_triples_biased_gpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *sorted_tails,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const double p,
+                  const double q,
+                  const double relation_bias,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                );
+
+  // walk_triples_gpu with steps drawn in proportion to triple weights,
+  // given as the alias table of build_alias_table_cpu
+  torch::Tensor walk_triples_weighted_gpu(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *alias_prob,
+                  const torch::Tensor *alias_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                );
+}
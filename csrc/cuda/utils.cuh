@@ -1,14 +1,64 @@
 #pragma once
 
 #include <torch/extension.h>
-#include <curand.h>
-#include <curand_kernel.h>
 
 #define CHECK_CUDA(x) TORCH_CHECK(x.is_cuda(), #x " must be a CUDA tensor")
 #define CHECK_CPU(x) TORCH_CHECK(x.is_cpu(), #x " must be a CPU tensor")
 #define CHECK_CONTIGUOUS(x) TORCH_CHECK(x->is_contiguous(), #x " must be a contigous tensor")
+#define CHECK_SAME_TYPE(x, y) TORCH_CHECK(x.scalar_type() == y.scalar_type(), #x " and " #y " must have the same index type")
 
-__device__ inline int64_t sample_int_gpu(int64_t start, int64_t end,curandState_t* rand_state){
-    auto sampled_int = start + (curand(rand_state) % (((end + 1) - start)));
-    return sampled_int;
-}
\ No newline at end of file
+// the window kernels give a dim of num_negatives negative sets after the windows,
+// which is left out with a single set to keep the layout of one negative per slot
+inline torch::Tensor squeeze_negatives(const torch::Tensor &negatives, int64_t num_negatives) {
+    return num_negatives == 1 ? negatives.squeeze(1) : negatives;
+}
+
+// out holds no tensors, so that a kernel allocates its outputs, or one buffer for each
+// output that the kernel fills in place, letting a training loop reuse them every epoch
+inline void check_out(const std::vector<torch::Tensor> &out, size_t num_outputs) {
+    TORCH_CHECK(out.empty() || out.size() == num_outputs, "out must hold ", num_outputs, " tensors, got ", out.size());
+}
+
+// output i of a kernel, a new tensor or out[i] after checking it can hold the output
+inline torch::Tensor output_tensor(const std::vector<torch::Tensor> &out, size_t i, torch::IntArrayRef sizes, const torch::TensorOptions &options) {
+    if(out.empty()) {
+        return torch::empty(sizes,options);
+    }
+    const auto &buffer = out[i];
+    TORCH_CHECK(buffer.sizes() == sizes, "out[", i, "] must have shape ", sizes, ", got ", buffer.sizes());
+    TORCH_CHECK(buffer.scalar_type() == c10::typeMetaToScalarType(options.dtype()), "out[", i, "] must have dtype ", options.dtype(), ", got ", buffer.dtype());
+    TORCH_CHECK(buffer.device() == options.device(), "out[", i, "] must be on ", options.device(), ", got ", buffer.device());
+    TORCH_CHECK(buffer.is_contiguous(), "out[", i, "] must be a contigous tensor");
+    return buffer;
+}
+
+// shape of the negatives given by squeeze_negatives, sets of negatives with the given
+// shape for each window
+inline std::vector<int64_t> negatives_sizes(int64_t num_windows, int64_t num_negatives, torch::IntArrayRef set_sizes) {
+    std::vector<int64_t> sizes = {num_windows};
+    if(num_negatives != 1) {
+        sizes.push_back(num_negatives);
+    }
+    sizes.insert(sizes.end(),set_sizes.begin(),set_sizes.end());
+    return sizes;
+}
+
+// packed walks are the values of all walks one after the other and num_walks + 1 offsets,
+// walk i being values[offsets[i] .. offsets[i + 1] - 1]. A walk ends before its first
+// padding tail, so it keeps 2h + 1 positions for h triples.
+inline std::tuple<torch::Tensor, torch::Tensor> pack_walks(const torch::Tensor &walks, int64_t padding_idx) {
+    auto live = walks.slice(1,2,c10::nullopt,2).ne(padding_idx).to(torch::kInt64);
+    auto lengths = (live.cumprod(1).sum(1) * 2) + 1;
+    auto positions = torch::arange(walks.size(1),lengths.options());
+    auto values = walks.masked_select(positions.unsqueeze(0) < lengths.unsqueeze(1));
+    auto offsets = torch::cat({torch::zeros({1},lengths.options()),lengths.cumsum(0)});
+    return std::make_tuple(values,offsets);
+}
+
+// position of the first window of every packed walk in the windows of all walks, the
+// last entry is the number of windows
+inline torch::Tensor packed_window_starts(const torch::Tensor &offsets) {
+    auto lengths = offsets.slice(0,1) - offsets.slice(0,0,-1);
+    auto num_windows = torch::div(lengths - 1,2,"floor").clamp_min(0);
+    return torch::cat({torch::zeros({1},offsets.options()),num_windows.cumsum(0)});
+}
@@ -0,0 +1,289 @@
+#include "walk_windows_cuda.h"
+#include <ATen/cuda/CUDAContext.h>
+#include "../rng.h"
+#include "../triples.h"
+#include "../windows.h"
+#include "utils.cuh"
+
+namespace triples {
+
+    // grid size of the fused kernels. Every thread owns a ring in global memory and
+    // strides over the walks, so the scratch memory depends on the grid and not on the number of walks.
+    int fused_num_blocks(int64_t num_walks, int num_threads) {
+        int max_blocks = at::cuda::getCurrentDeviceProperties()->multiProcessorCount * 4;
+        int needed_blocks = int((num_walks + num_threads - 1)/num_threads);
+        return std::max(std::min(needed_blocks,max_blocks),1);
+    }
+
+    template <typename scalar_t>
+    __global__ void walk_windows_triples_kernel(const torch::PackedTensorAccessor64<scalar_t,2> triples_indexed_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,2> relation_tail_index_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> target_nodes_accesor,
+                    torch::PackedTensorAccessor64<int64_t,2> ring_accessor,
+                    torch::PackedTensorAccessor64<scalar_t,2> target_triples_accessor,
+                    torch::PackedTensorAccessor64<scalar_t,3> pos_windows_accesor,
+                    torch::PackedTensorAccessor64<scalar_t,3> neg_windows_accesor,
+                    const int64_t num_walks,
+                    const int walk_size,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const int64_t num_triples,
+                    const bool restart,
+                    const int64_t walks_per_node,
+                    const int64_t num_negatives,
+                    const int walk_seed,
+                    const int window_seed
+                    ) {
+
+        // get the thread
+        const int64_t thread_index = blockIdx.x * blockDim.x + threadIdx.x;
+        const int64_t num_threads = gridDim.x * blockDim.x;
+
+        // the ring of this thread
+        WalkRing ring = {ring_accessor[thread_index].data(),ring_accessor.size(1)};
+        auto num_windows_in_one_walk = windows::num_windows_in_walk(walk_size);
+
+        for(int64_t walk_idx = thread_index;walk_idx < num_walks;walk_idx += num_threads){
+
+            // the same streams as the separate walk and window kernels
+            rng::Philox walk_generator(walk_seed,walk_idx,rng::WALK);
+            rng::Philox window_generator(window_seed,walk_idx,rng::WINDOW);
+
+            // add target node as the first node in walk
+            int64_t source_node = target_nodes_accesor[walk_idx / walks_per_node];
+            int64_t previous_node = source_node;
+            ring[0] = previous_node;
+            int64_t next_pos = 1;
+
+            for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+
+                // walk until the tail of the last right context triple
+                auto needed = min((target_idx + window_size)*2 + 2,int64_t(walk_size - 1));
+                extend_walk(ring,needed,next_pos,previous_node,source_node,restart,relation_tail_index_accessor,triples_indexed_accessor,padding_idx,walk_generator);
+
+                auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+                windows::triples_sg_window(ring,
+                                           target_idx,
+                                           walk_size,
+                                           window_size,
+                                           padding_idx,
+                                           triples_indexed_accessor,
+                                           num_triples,
+                                           num_negatives,
+                                           window_generator,
+                                           target_triples_accessor[target_pos],
+                                           pos_windows_accesor[target_pos],
+                                           neg_windows_accesor[target_pos]);
+            }
+        }
+    }
+
+    template <typename scalar_t>
+    __global__ void walk_windows_triples_cbow_kernel(const torch::PackedTensorAccessor64<scalar_t,2> triples_indexed_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,2> relation_tail_index_accessor,
+                    const torch::PackedTensorAccessor64<scalar_t,1> target_nodes_accesor,
+                    torch::PackedTensorAccessor64<int64_t,2> ring_accessor,
+                    torch::PackedTensorAccessor64<scalar_t,2> pos_triples_accessor,
+                    torch::PackedTensorAccessor64<scalar_t,3> neg_triples_accessor,
+                    torch::PackedTensorAccessor64<scalar_t,3> pos_windows_accesor,
+                    const int64_t num_walks,
+                    const int walk_size,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const int64_t num_triples,
+                    const bool restart,
+                    const int64_t walks_per_node,
+                    const int64_t num_negatives,
+                    const int walk_seed,
+                    const int window_seed
+                    ) {
+
+        // get the thread
+        const int64_t thread_index = blockIdx.x * blockDim.x + threadIdx.x;
+        const int64_t num_threads = gridDim.x * blockDim.x;
+
+        // the ring of this thread
+        WalkRing ring = {ring_accessor[thread_index].data(),ring_accessor.size(1)};
+        auto num_windows_in_one_walk = windows::num_windows_in_walk(walk_size);
+
+        for(int64_t walk_idx = thread_index;walk_idx < num_walks;walk_idx += num_threads){
+
+            // the same streams as the separate walk and window kernels
+            rng::Philox walk_generator(walk_seed,walk_idx,rng::WALK);
+            rng::Philox window_generator(window_seed,walk_idx,rng::WINDOW);
+
+            // add target node as the first node in walk
+            int64_t source_node = target_nodes_accesor[walk_idx / walks_per_node];
+            int64_t previous_node = source_node;
+            ring[0] = previous_node;
+            int64_t next_pos = 1;
+
+            for(int64_t target_idx=0;target_idx<num_windows_in_one_walk;target_idx++){
+
+                // walk until the tail of the last right context triple
+                auto needed = min((target_idx + window_size)*2 + 2,int64_t(walk_size - 1));
+                extend_walk(ring,needed,next_pos,previous_node,source_node,restart,relation_tail_index_accessor,triples_indexed_accessor,padding_idx,walk_generator);
+
+                auto target_pos = (num_windows_in_one_walk * walk_idx) + target_idx;
+                windows::triples_cbow_window(ring,
+                                             target_idx,
+                                             walk_size,
+                                             window_size,
+                                             padding_idx,
+                                             triples_indexed_accessor,
+                                             num_triples,
+                                             window_generator,
+                                             pos_triples_accessor[target_pos],
+                                             neg_triples_accessor[target_pos][0],
+                                             pos_windows_accesor[target_pos]);
+                windows::triples_cbow_negatives(ring,
+                                                target_idx,
+                                                walk_size,
+                                                padding_idx,
+                                                triples_indexed_accessor,
+                                                num_triples,
+                                                num_negatives,
+                                                window_generator,
+                                                neg_triples_accessor[target_pos]);
+            }
+        }
+    }
+
+    std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_gpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const bool restart,
+                    const int walks_per_node,
+                    const int num_negatives,
+                    const int walk_seed,
+                    const int window_seed
+                    ) {
+
+        CHECK_CUDA((*triples_indexed));
+        CHECK_CUDA((*relation_tail_index));
+        CHECK_CUDA((*target_nodes));
+        CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+        TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+        TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+        cudaSetDevice(target_nodes->device().index());
+
+        // calculate sizes, walks_per_node consecutive walks start at every target node
+        int64_t num_walks = target_nodes->size(0) * walks_per_node;
+        int64_t walk_size = (walk_length * 2) + 1;
+        int64_t num_windows_for_all_walks = num_walks * walk_length;
+        int64_t num_triples = triples_indexed->size(0);
+
+        // Thread block size
+        int NUM_THREADS = 128;
+
+        // Grid size
+        int NUM_BLOCKS = fused_num_blocks(num_walks,NUM_THREADS);
+
+        // create arrays to hold results, with the index type of the triples
+        auto options = triples_indexed->options();
+        auto rings = torch::empty({NUM_BLOCKS * NUM_THREADS,ring_size(window_size)},options.dtype(torch::kInt64));
+        auto target_triples = torch::empty({num_windows_for_all_walks,3},options);
+        auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},options);
+        auto neg_sets = torch::empty(negatives_sizes(num_windows_for_all_walks,num_negatives,{window_size*2,3}),options);
+        auto neg_windows = neg_sets.view({num_windows_for_all_walks,window_size*2*num_negatives,3});
+
+        auto stream = at::cuda::getCurrentCUDAStream();
+
+        AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_windows_triples_gpu",[&] {
+            walk_windows_triples_kernel<index_t><<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(triples_indexed->packed_accessor64<index_t,2>(),
+                                                                            relation_tail_index->packed_accessor64<index_t,2>(),
+                                                                            target_nodes->packed_accessor64<index_t,1>(),
+                                                                            rings.packed_accessor64<int64_t,2>(),
+                                                                            target_triples.packed_accessor64<index_t,2>(),
+                                                                            pos_windows.packed_accessor64<index_t,3>(),
+                                                                            neg_windows.packed_accessor64<index_t,3>(),
+                                                                            num_walks,
+                                                                            walk_size,
+                                                                            window_size,
+                                                                            padding_idx,
+                                                                            num_triples,
+                                                                            restart,
+                                                                            walks_per_node,
+                                                                            num_negatives,
+                                                                            walk_seed,
+                                                                            window_seed
+                                                                        );
+        });
+
+        return std::make_tuple(target_triples,pos_windows,neg_sets);
+    }
+
+    std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cbow_gpu(const torch::Tensor *triples_indexed,
+                    const torch::Tensor *relation_tail_index,
+                    const torch::Tensor *target_nodes,
+                    const int walk_length,
+                    const int window_size,
+                    const int64_t padding_idx,
+                    const bool restart,
+                    const int walks_per_node,
+                    const int num_negatives,
+                    const int walk_seed,
+                    const int window_seed
+                    ) {
+
+        CHECK_CUDA((*triples_indexed));
+        CHECK_CUDA((*relation_tail_index));
+        CHECK_CUDA((*target_nodes));
+        CHECK_SAME_TYPE((*triples_indexed),(*relation_tail_index));
+        CHECK_SAME_TYPE((*triples_indexed),(*target_nodes));
+        TORCH_CHECK(walks_per_node >= 1, "walks_per_node must be at least 1");
+        TORCH_CHECK(num_negatives >= 1, "num_negatives must be at least 1");
+
+        cudaSetDevice(target_nodes->device().index());
+
+        // calculate sizes, walks_per_node consecutive walks start at every target node
+        int64_t num_walks = target_nodes->size(0) * walks_per_node;
+        int64_t walk_size = (walk_length * 2) + 1;
+        int64_t num_windows_for_all_walks = num_walks * walk_length;
+        int64_t num_triples = triples_indexed->size(0);
+
+        // Thread block size
+        int NUM_THREADS = 128;
+
+        // Grid size
+        int NUM_BLOCKS = fused_num_blocks(num_walks,NUM_THREADS);
+
+        // create arrays to hold results, with the index type of the triples
+        auto options = triples_indexed->options();
+        auto rings = torch::empty({NUM_BLOCKS * NUM_THREADS,ring_size(window_size)},options.dtype(torch::kInt64));
+        auto pos_triples = torch::empty({num_windows_for_all_walks,3},options);
+        auto neg_sets = torch::empty(negatives_sizes(num_windows_for_all_walks,num_negatives,{3}),options);
+        auto pos_windows = torch::empty({num_windows_for_all_walks,window_size*2,3},options);
+        auto neg_triples = neg_sets.view({num_windows_for_all_walks,num_negatives,3});
+
+        auto stream = at::cuda::getCurrentCUDAStream();
+
+        AT_DISPATCH_INDEX_TYPES(triples_indexed->scalar_type(),"walk_windows_triples_cbow_gpu",[&] {
+            walk_windows_triples_cbow_kernel<index_t><<<NUM_BLOCKS,NUM_THREADS,0,stream>>>(triples_indexed->packed_accessor64<index_t,2>(),
+                                                                                relation_tail_index->packed_accessor64<index_t,2>(),
+                                                                                target_nodes->packed_accessor64<index_t,1>(),
+                                                                                rings.packed_accessor64<int64_t,2>(),
+                                                                                pos_triples.packed_accessor64<index_t,2>(),
+                                                                                neg_triples.packed_accessor64<index_t,3>(),
+                                                                                pos_windows.packed_accessor64<index_t,3>(),
+                                                                                num_walks,
+                                                                                walk_size,
+                                                                                window_size,
+                                                                                padding_idx,
+                                                                                num_triples,
+                                                                                restart,
+                                                                                walks_per_node,
+                                                                                num_negatives,
+                                                                                walk_seed,
+                                                                                window_seed
+                                                                            );
+        });
+
+        return std::make_tuple(pos_triples,neg_sets,pos_windows);
+    }
+}
@@ -5,13 +5,15 @@
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_gpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cbow_gpu(const torch::Tensor *walks,
                         const int window_size,
                         const int64_t num_nodes,
-                        const int seed
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_gpu(const torch::Tensor *walks,
@@ -19,7 +21,9 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_gpu(const torc
                         const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
-                        const int seed
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
                         );
 
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_gpu(const torch::Tensor *walks,
@@ -27,5 +31,42 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_gpu(const
                         const int64_t num_nodes,
                         const int64_t padding_idx,
                         const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed,
+                        const std::vector<torch::Tensor> &out
+                        );
+
+at::Tensor to_windows_triples_index_gpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                        );
+
+at::Tensor to_windows_triples_cbow_index_gpu(const torch::Tensor *walks,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
                         const int seed
-                        );
\ No newline at end of file
+                        );
+
+// to_windows_triples_gpu for packed walks (values, offsets), see pack_walks
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_packed_gpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                        );
+
+// to_windows_triples_cbow_gpu for packed walks (values, offsets), see pack_walks
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_packed_gpu(const torch::Tensor *values,
+                        const torch::Tensor *offsets,
+                        const int window_size,
+                        const int64_t padding_idx,
+                        const torch::Tensor *triples,
+                        const int num_negatives,
+                        const int seed
+                        );
@@ -0,0 +1,110 @@
+#pragma once
+#include <stdint.h>
+
+#ifdef __CUDACC__
+#define HOST_DEVICE __host__ __device__ __forceinline__
+#else
+#define HOST_DEVICE inline
+#endif
+
+namespace rng {
+
+  // domains keep the streams of different kernels apart so that walks and
+  // windows generated with the same seed do not reuse the same random numbers
+  enum Domain : uint32_t {
+    WALK = 0,
+    WINDOW = 1
+  };
+
+  // proposals of a rejection sampled step before it takes the last one, so that acceptance
+  // probabilities close to 0 (a tiny p, q or relation_bias) bias the step less instead of
+  // never ending it
+  constexpr int MAX_PROPOSALS = 100;
+
+  // Philox4x32-10 counter based generator (Salmon et al., "Parallel Random Numbers: As Easy as 1, 2, 3").
+  // Every walk gets its own generator keyed by (seed, walk index, domain), and the
+  // counter advances with every draw, so a draw only depends on the seed, the walk
+  // and the step at which it is made. The output is therefore identical for any
+  // number of threads and on both the CPU and the GPU.
+  class Philox {
+    public:
+      HOST_DEVICE Philox(uint64_t seed, uint64_t stream, uint32_t domain) {
+        key_[0] = uint32_t(seed);
+        key_[1] = uint32_t(seed >> 32);
+        counter_[0] = 0;
+        counter_[1] = domain;
+        counter_[2] = uint32_t(stream);
+        counter_[3] = uint32_t(stream >> 32);
+        position_ = 4;
+      }
+
+      // next 32 random bits
+      HOST_DEVICE uint32_t next() {
+        if(position_ == 4){
+          generate_block();
+          position_ = 0;
+        }
+        return output_[position_++];
+      }
+
+      // next 64 random bits
+      HOST_DEVICE uint64_t next64() {
+        uint64_t hi = next();
+        uint64_t lo = next();
+        return (hi << 32) | lo;
+      }
+
+      // random integer in the closed range [start, end]
+      HOST_DEVICE int64_t sample_int(int64_t start, int64_t end) {
+        if(start >= end){
+          return start;
+        }
+        uint64_t range = uint64_t(end - start) + 1;
+        uint64_t bits = range <= 0xFFFFFFFFull ? uint64_t(next()) : next64();
+        return start + int64_t(bits % range);
+      }
+
+      // random double in [0, 1)
+      HOST_DEVICE double uniform() {
+        return double(next()) * (1.0 / 4294967296.0);
+      }
+
+    private:
+      uint32_t key_[2];
+      uint32_t counter_[4];
+      uint32_t output_[4];
+      int position_;
+
+      HOST_DEVICE static void mulhilo(uint32_t a, uint32_t b, uint32_t &hi, uint32_t &lo) {
+        uint64_t product = uint64_t(a) * uint64_t(b);
+        hi = uint32_t(product >> 32);
+        lo = uint32_t(product);
+      }
+
+      HOST_DEVICE void generate_block() {
+        uint32_t c0 = counter_[0], c1 = counter_[1], c2 = counter_[2], c3 = counter_[3];
+        uint32_t k0 = key_[0], k1 = key_[1];
+
+        for(int round = 0; round < 10; round++){
+          uint32_t hi0, lo0, hi1, lo1;
+          mulhilo(0xD2511F53u, c0, hi0, lo0);
+          mulhilo(0xCD9E8D57u, c2, hi1, lo1);
+          c0 = hi1 ^ c1 ^ k0;
+          c1 = lo1;
+          c2 = hi0 ^ c3 ^ k1;
+          c3 = lo0;
+          k0 += 0x9E3779B9u;
+          k1 += 0xBB67AE85u;
+        }
+
+        output_[0] = c0;
+        output_[1] = c1;
+        output_[2] = c2;
+        output_[3] = c3;
+
+        // only the first word is used as the step counter, the rest identify the stream
+        counter_[0] = counter_[0] + 1;
+      }
+  };
+
+}
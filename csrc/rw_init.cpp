@@ -1,12 +1,88 @@
 #include <torch/extension.h>
 #include "cpu/rw_cpu.h"
 #include "cpu/rw_cpu_edge_list.h"
+#include "cpu/windows_cpu.h"
+#include "cpu/rw_cpu_triples.h"
+#include "cpu/walk_windows_cpu.h"
+#include "cpu/alias_cpu.h"
+#include "cpu/train_cpu.h"
+#include "cuda/utils.cuh"
+
+#ifdef WITH_CUDA
 #include "cuda/rw_cuda_edge_list.h"
 #include "cuda/rw_cuda.h"
-#include "cpu/windows_cpu.h"
 #include "cuda/windows_cuda.h"
-#include "cpu/rw_cpu_triples.h"
 #include "cuda/rw_cuda_triples.h"
+#include "cuda/walk_windows_cuda.h"
+
+// the gpu branch of a dispatch, which is an error in a build without cuda
+#define CUDA_ONLY(...) __VA_ARGS__
+#else
+#define CUDA_ONLY(...) TORCH_CHECK(false, "triple_walk_native was built without CUDA support, reinstall it with CUDA available or FORCE_CUDA=1")
+#endif
+
+
+torch::Tensor walk(const torch::Tensor *row_ptr,
+                  const torch::Tensor *column_idx,
+                  const torch::Tensor *target_nodes,
+                  const double p,
+                  const double q,
+                  const int walk_length,
+                  const int seed
+                )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return walk_gpu(row_ptr,column_idx,target_nodes,p,q,walk_length,seed));
+  }else{
+    return walk_cpu(row_ptr,column_idx,target_nodes,p,q,walk_length,seed);
+  }
+}
+
+torch::Tensor walk_edge_list(const torch::Tensor *edge_list_indexed,
+                  const torch::Tensor *node_edges_idx,
+                  const torch::Tensor *target_nodes,
+                  const double p,
+                  const double q,
+                  const int walk_length,
+                  const int seed,
+                  const int64_t padding_idx,
+                  const bool restart
+                )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return walk_edge_list_gpu(edge_list_indexed,node_edges_idx,target_nodes,p,q,walk_length,seed,padding_idx,restart));
+  }else{
+    return walk_edge_list_cpu(edge_list_indexed,node_edges_idx,target_nodes,p,q,walk_length,seed,padding_idx,restart);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows(const torch::Tensor *walks,
+                                      const int window_size,
+                                      const int64_t num_nodes,
+                                      const int seed,
+                                      const std::vector<torch::Tensor> &out
+                                    )
+{
+  if(walks->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_gpu(walks,window_size,num_nodes,seed,out));
+  }else{
+    return to_windows_cpu(walks,window_size,num_nodes,seed,out);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_cbow(const torch::Tensor *walks,
+                                      const int window_size,
+                                      const int64_t num_nodes,
+                                      const int seed,
+                                      const std::vector<torch::Tensor> &out
+                                    )
+{
+  if(walks->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_cbow_gpu(walks,window_size,num_nodes,seed,out));
+  }else{
+    return to_windows_cbow_cpu(walks,window_size,num_nodes,seed,out);
+  }
+}
 
 
 torch::Tensor walk_triples(const torch::Tensor *triples_indexed,
@@ -15,18 +91,22 @@ torch::Tensor walk_triples(const torch::Tensor *triples_indexed,
                   const int walk_length,
                   const int64_t padding_idx,
                   const bool restart,
-                  const int seed
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
                 )
 {
 
   if(target_nodes->device().is_cuda()) {
-    return triples::walk_triples_gpu(triples_indexed,
+    CUDA_ONLY(return triples::walk_triples_gpu(triples_indexed,
                                     relation_tail_index,
                                     target_nodes,
                                     walk_length,
                                     padding_idx,
                                     restart,
-                                    seed);
+                                    walks_per_node,
+                                    seed,
+                                    out));
   }else{
     return triples::walk_triples_cpu(triples_indexed,
                                      relation_tail_index,
@@ -34,23 +114,93 @@ torch::Tensor walk_triples(const torch::Tensor *triples_indexed,
                                      walk_length,
                                      padding_idx,
                                      restart,
-                                     seed);
+                                     walks_per_node,
+                                     seed,
+                                     out);
   }
   
 }
 
+std::tuple<torch::Tensor, torch::Tensor> walk_triples_packed(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const bool restart,
+                  const int walks_per_node,
+                  const int seed
+                )
+{
+  if(target_nodes->device().is_cuda()) {
+    // the gpu packs the padded walks, all walks are generated at once
+    CUDA_ONLY(return pack_walks(triples::walk_triples_gpu(triples_indexed,relation_tail_index,target_nodes,walk_length,padding_idx,restart,walks_per_node,seed,{}),padding_idx));
+  }else{
+    return triples::walk_triples_packed_cpu(triples_indexed,relation_tail_index,target_nodes,walk_length,padding_idx,restart,walks_per_node,seed);
+  }
+}
+
+torch::Tensor walk_triples_biased(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *sorted_tails,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const double p,
+                  const double q,
+                  const double relation_bias,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return triples::walk_triples_biased_gpu(triples_indexed,relation_tail_index,sorted_tails,target_nodes,walk_length,padding_idx,p,q,relation_bias,walks_per_node,seed,out));
+  }else{
+    return triples::walk_triples_biased_cpu(triples_indexed,relation_tail_index,sorted_tails,target_nodes,walk_length,padding_idx,p,q,relation_bias,walks_per_node,seed,out);
+  }
+}
+
+torch::Tensor walk_triples_weighted(const torch::Tensor *triples_indexed,
+                  const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *alias_prob,
+                  const torch::Tensor *alias_index,
+                  const torch::Tensor *target_nodes,
+                  const int walk_length,
+                  const int64_t padding_idx,
+                  const int walks_per_node,
+                  const int seed,
+                  const std::vector<torch::Tensor> &out
+                )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return triples::walk_triples_weighted_gpu(triples_indexed,relation_tail_index,alias_prob,alias_index,target_nodes,walk_length,padding_idx,walks_per_node,seed,out));
+  }else{
+    return triples::walk_triples_weighted_cpu(triples_indexed,relation_tail_index,alias_prob,alias_index,target_nodes,walk_length,padding_idx,walks_per_node,seed,out);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor> build_alias_table(const torch::Tensor *relation_tail_index,
+                  const torch::Tensor *weights,
+                  const int64_t num_triples
+                )
+{
+  return triples::build_alias_table_cpu(relation_tail_index,weights,num_triples);
+}
+
 std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples(const torch::Tensor *walks,
                                       const int window_size,
                                       const int64_t num_nodes,
                                       const int64_t padding_idx,
                                       const torch::Tensor *triples,
-                                      const int seed
+                                      const int num_negatives,
+                                      const int seed,
+                                      const std::vector<torch::Tensor> &out
                                     )
 {
   if(walks->device().is_cuda()) {
-    return to_windows_triples_gpu(walks,window_size,num_nodes,padding_idx,triples,seed);
+    CUDA_ONLY(return to_windows_triples_gpu(walks,window_size,num_nodes,padding_idx,triples,num_negatives,seed,out));
   }else{
-    return to_windows_triples_cpu(walks,window_size,num_nodes,padding_idx,triples,seed);
+    return to_windows_triples_cpu(walks,window_size,num_nodes,padding_idx,triples,num_negatives,seed,out);
   }
 }
 
@@ -59,18 +209,173 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow(const tor
                                       const int64_t num_nodes,
                                       const int64_t padding_idx,
                                       const torch::Tensor *triples,
+                                      const int num_negatives,
+                                      const int seed,
+                                      const std::vector<torch::Tensor> &out
+                                    )
+{
+  if(walks->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_triples_cbow_gpu(walks,window_size,num_nodes,padding_idx,triples,num_negatives,seed,out));
+  }else{
+    return to_windows_triples_cbow_cpu(walks,window_size,num_nodes,padding_idx,triples,num_negatives,seed,out);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_packed(const torch::Tensor *values,
+                                      const torch::Tensor *offsets,
+                                      const int window_size,
+                                      const int64_t padding_idx,
+                                      const torch::Tensor *triples,
+                                      const int num_negatives,
+                                      const int seed
+                                    )
+{
+  if(values->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_triples_packed_gpu(values,offsets,window_size,padding_idx,triples,num_negatives,seed));
+  }else{
+    return to_windows_triples_packed_cpu(values,offsets,window_size,padding_idx,triples,num_negatives,seed);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> to_windows_triples_cbow_packed(const torch::Tensor *values,
+                                      const torch::Tensor *offsets,
+                                      const int window_size,
+                                      const int64_t padding_idx,
+                                      const torch::Tensor *triples,
+                                      const int num_negatives,
+                                      const int seed
+                                    )
+{
+  if(values->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_triples_cbow_packed_gpu(values,offsets,window_size,padding_idx,triples,num_negatives,seed));
+  }else{
+    return to_windows_triples_cbow_packed_cpu(values,offsets,window_size,padding_idx,triples,num_negatives,seed);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples(const torch::Tensor *triples_indexed,
+                                      const torch::Tensor *relation_tail_index,
+                                      const torch::Tensor *target_nodes,
+                                      const int walk_length,
+                                      const int window_size,
+                                      const int64_t padding_idx,
+                                      const bool restart,
+                                      const int walks_per_node,
+                                      const int num_negatives,
+                                      const int walk_seed,
+                                      const int window_seed
+                                    )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return triples::walk_windows_triples_gpu(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed));
+  }else{
+    return triples::walk_windows_triples_cpu(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed);
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> walk_windows_triples_cbow(const torch::Tensor *triples_indexed,
+                                      const torch::Tensor *relation_tail_index,
+                                      const torch::Tensor *target_nodes,
+                                      const int walk_length,
+                                      const int window_size,
+                                      const int64_t padding_idx,
+                                      const bool restart,
+                                      const int walks_per_node,
+                                      const int num_negatives,
+                                      const int walk_seed,
+                                      const int window_seed
+                                    )
+{
+  if(target_nodes->device().is_cuda()) {
+    CUDA_ONLY(return triples::walk_windows_triples_cbow_gpu(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed));
+  }else{
+    return triples::walk_windows_triples_cbow_cpu(triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,padding_idx,restart,walks_per_node,num_negatives,walk_seed,window_seed);
+  }
+}
+
+at::Tensor to_windows_triples_index(const torch::Tensor *walks,
+                                      const int window_size,
+                                      const torch::Tensor *triples,
+                                      const int num_negatives,
+                                      const int seed
+                                    )
+{
+  if(walks->device().is_cuda()) {
+    CUDA_ONLY(return to_windows_triples_index_gpu(walks,window_size,triples,num_negatives,seed));
+  }else{
+    return to_windows_triples_index_cpu(walks,window_size,triples,num_negatives,seed);
+  }
+}
+
+at::Tensor to_windows_triples_cbow_index(const torch::Tensor *walks,
+                                      const int window_size,
+                                      const int64_t padding_idx,
+                                      const torch::Tensor *triples,
+                                      const int num_negatives,
                                       const int seed
                                     )
 {
   if(walks->device().is_cuda()) {
-    return to_windows_triples_cbow_gpu(walks,window_size,num_nodes,padding_idx,triples,seed);
+    CUDA_ONLY(return to_windows_triples_cbow_index_gpu(walks,window_size,padding_idx,triples,num_negatives,seed));
   }else{
-    return to_windows_triples_cbow_cpu(walks,window_size,num_nodes,padding_idx,triples,seed);
+    return to_windows_triples_cbow_index_cpu(walks,window_size,padding_idx,triples,num_negatives,seed);
   }
 }
 
+double train_sg(const torch::Tensor *walks,
+                const torch::Tensor *window_offsets,
+                const torch::Tensor *neg_index,
+                const torch::Tensor *triples,
+                const std::vector<torch::Tensor> &tables,
+                const int window_size,
+                const int64_t padding_idx,
+                const int64_t relation_offset,
+                const int64_t entity_padding,
+                const int64_t relation_padding,
+                const double lr
+              )
+{
+  TORCH_CHECK(!walks->device().is_cuda(), "the native trainer only runs on the cpu");
+  return train_sg_cpu(walks,window_offsets,neg_index,triples,tables,window_size,padding_idx,relation_offset,entity_padding,relation_padding,lr);
+}
+
+double train_cbow(const torch::Tensor *walks,
+                  const torch::Tensor *window_offsets,
+                  const torch::Tensor *neg_index,
+                  const torch::Tensor *triples,
+                  const std::vector<torch::Tensor> &tables,
+                  const int window_size,
+                  const int64_t padding_idx,
+                  const int64_t relation_offset,
+                  const int64_t entity_padding,
+                  const int64_t relation_padding,
+                  const double lr
+                )
+{
+  TORCH_CHECK(!walks->device().is_cuda(), "the native trainer only runs on the cpu");
+  return train_cbow_cpu(walks,window_offsets,neg_index,triples,tables,window_size,padding_idx,relation_offset,entity_padding,relation_padding,lr);
+}
+
 PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
-  m.def("walk_triples", &walk_triples, "walk_triples");
-  m.def("to_windows_triples",&to_windows_triples,"to_windows_triples");
-  m.def("to_windows_triples_cbow",&to_windows_triples_cbow,"to_windows_triples_cbow");
+  // the kernels run without the gil, so that python threads can overlap them with training
+  m.def("walk", &walk, "walk", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_edge_list", &walk_edge_list, "walk_edge_list", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows", &to_windows, "to_windows", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_cbow", &to_windows_cbow, "to_windows_cbow", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_triples", &walk_triples, "walk_triples", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_triples_packed", &walk_triples_packed, "walk_triples_packed", py::call_guard<py::gil_scoped_release>());
+  m.def("pack_walks", &pack_walks, "pack_walks", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_triples_biased", &walk_triples_biased, "walk_triples_biased", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_triples_weighted", &walk_triples_weighted, "walk_triples_weighted", py::call_guard<py::gil_scoped_release>());
+  m.def("build_alias_table", &build_alias_table, "build_alias_table", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples", &to_windows_triples, "to_windows_triples", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples_cbow", &to_windows_triples_cbow, "to_windows_triples_cbow", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples_index", &to_windows_triples_index, "to_windows_triples_index", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples_cbow_index", &to_windows_triples_cbow_index, "to_windows_triples_cbow_index", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples_packed", &to_windows_triples_packed, "to_windows_triples_packed", py::call_guard<py::gil_scoped_release>());
+  m.def("to_windows_triples_cbow_packed", &to_windows_triples_cbow_packed, "to_windows_triples_cbow_packed", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_windows_triples", &walk_windows_triples, "walk_windows_triples", py::call_guard<py::gil_scoped_release>());
+  m.def("walk_windows_triples_cbow", &walk_windows_triples_cbow, "walk_windows_triples_cbow", py::call_guard<py::gil_scoped_release>());
+  m.def("train_sg", &train_sg, "train_sg", py::call_guard<py::gil_scoped_release>());
+  m.def("train_cbow", &train_cbow, "train_cbow", py::call_guard<py::gil_scoped_release>());
 }
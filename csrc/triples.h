@@ -0,0 +1,274 @@
+#pragma once
+#include <math.h>
+#include "utils.h"
+#include "rng.h"
+
+// Triple walk steps shared by the cpu and cuda kernels.
+namespace triples {
+
+  // pick one of the outgoing triples of target_node uniformly at random
+  template <typename index_t, typename triples_t>
+  HOST_DEVICE RelationTail sample_neighbor(int64_t target_node,
+                        const index_t &relation_tail_index,
+                        const triples_t &triples_indexed,
+                        int64_t padding_index,
+                        rng::Philox &generator
+                      ) {
+
+    RelationTail rt;
+
+    // if target node is padding index, then jump node becomes target node
+    if(target_node != padding_index){
+
+      // get the edge range for the target node
+      auto start_index = relation_tail_index[target_node][0];
+      auto end_index = relation_tail_index[target_node][1];
+
+      // randomly select an index in this range
+      if(start_index == -1 || end_index == -1){
+        rt.relation = padding_index;
+        rt.tail = padding_index;
+      }else{
+        auto nbr_edge_index = generator.sample_int(start_index,end_index);
+
+        // get the edge at this index
+        rt.relation = triples_indexed[nbr_edge_index][1];
+        rt.tail = triples_indexed[nbr_edge_index][2];
+      }
+
+    }else{
+      rt.relation = padding_index;
+      rt.tail = padding_index;
+    }
+
+    return rt;
+  }
+
+  // pick one of the outgoing triples of target_node in proportion to its weight, with the
+  // alias table of the node (Vose, "A linear algorithm for generating random numbers with
+  // a given distribution"). alias_prob and alias_index are aligned with the sorted triples,
+  // see build_alias_table_cpu, so a draw costs one uniform index and one coin flip.
+  template <typename index_t, typename triples_t, typename prob_t, typename alias_t>
+  HOST_DEVICE RelationTail sample_weighted_neighbor(int64_t target_node,
+                        const index_t &relation_tail_index,
+                        const triples_t &triples_indexed,
+                        const prob_t &alias_prob,
+                        const alias_t &alias_index,
+                        int64_t padding_index,
+                        rng::Philox &generator
+                      ) {
+
+    RelationTail rt;
+    rt.relation = padding_index;
+    rt.tail = padding_index;
+
+    if(target_node == padding_index){
+      return rt;
+    }
+
+    auto start_index = relation_tail_index[target_node][0];
+    auto end_index = relation_tail_index[target_node][1];
+    if(start_index == -1 || end_index == -1){
+      return rt;
+    }
+
+    int64_t column = generator.sample_int(start_index,end_index);
+    auto random_prob = generator.uniform();
+    int64_t nbr_edge_index = random_prob < alias_prob[column] ? column : int64_t(alias_index[column]);
+
+    rt.relation = triples_indexed[nbr_edge_index][1];
+    rt.tail = triples_indexed[nbr_edge_index][2];
+    return rt;
+  }
+
+  // whether node has an outgoing triple to tail, by binary search over the tails of
+  // node sorted within its range of relation_tail_index (see utils.build_sorted_tails)
+  template <typename index_t, typename tails_t>
+  HOST_DEVICE bool has_tail(int64_t node,
+                            int64_t tail,
+                            const index_t &relation_tail_index,
+                            const tails_t &sorted_tails,
+                            int64_t padding_index) {
+    if(node == padding_index || tail == padding_index){
+      return false;
+    }
+
+    int64_t low = relation_tail_index[node][0];
+    int64_t high = relation_tail_index[node][1];
+    if(low == -1 || high == -1){
+      return false;
+    }
+
+    while(low <= high){
+      int64_t middle = low + ((high - low) / 2);
+      int64_t middle_tail = sorted_tails[middle];
+      if(middle_tail == tail){
+        return true;
+      }else if(middle_tail < tail){
+        low = middle + 1;
+      }else{
+        high = middle - 1;
+      }
+    }
+    return false;
+  }
+
+  // second order bias of a triple walk. Like node2vec, a tail is weighted by 1/p when it
+  // returns to the node before the current one, by 1 when that node links to it and by
+  // 1/q otherwise. The weight is further multiplied by relation_bias when the triple
+  // repeats the relation of the previous step. Weights are normalized by the largest one
+  // so that they can be used as acceptance probabilities.
+  struct TripleBias {
+    double prob_return;
+    double prob_near;
+    double prob_far;
+    double relation_bias;
+
+    HOST_DEVICE TripleBias(double p, double q, double relation_bias) : relation_bias(relation_bias) {
+      double max_prob = fmax(fmax(1.0/p,1.0),1.0/q) * fmax(relation_bias,1.0);
+      prob_return = 1.0/p/max_prob;
+      prob_near = 1.0/max_prob;
+      prob_far = 1.0/q/max_prob;
+    }
+  };
+
+  // next triple of a biased walk that reached current_node from previous_node over previous_relation.
+  // Proposals are drawn uniformly and accepted with their normalized weight, so a step costs
+  // one binary search per proposal, for at most rng::MAX_PROPOSALS proposals. Steps from or to
+  // the padding index are not biased.
+  template <typename index_t, typename triples_t, typename tails_t>
+  HOST_DEVICE RelationTail sample_biased_neighbor(int64_t current_node,
+                        int64_t previous_node,
+                        int64_t previous_relation,
+                        const index_t &relation_tail_index,
+                        const triples_t &triples_indexed,
+                        const tails_t &sorted_tails,
+                        int64_t padding_index,
+                        const TripleBias &bias,
+                        rng::Philox &generator
+                      ) {
+    RelationTail rt;
+    for(int proposal = 0; proposal < rng::MAX_PROPOSALS; proposal++){
+      rt = sample_neighbor(current_node,relation_tail_index,triples_indexed,padding_index,generator);
+      auto random_prob = generator.uniform();
+
+      if(rt.tail == padding_index || previous_node == padding_index){
+        return rt;
+      }
+
+      double prob = bias.prob_far;
+      if(rt.tail == previous_node){
+        prob = bias.prob_return;
+      }else if(has_tail(previous_node,rt.tail,relation_tail_index,sorted_tails,padding_index)){
+        prob = bias.prob_near;
+      }
+
+      if(rt.relation == previous_relation){
+        prob = prob * bias.relation_bias;
+      }
+
+      if(random_prob < prob){
+        return rt;
+      }
+    }
+
+    // every proposal was rejected, the step takes the last one
+    return rt;
+  }
+
+  // one step of a uniform triple walk from previous_node. A dead end leads to the padding
+  // index as relation and tail, which ends the walk. With restart a dead end other than the
+  // source gives the padding index as relation and source_node as tail instead, so that the
+  // walk goes on from its source and the jump is not mistaken for a triple of the graph.
+  template <typename index_t, typename triples_t>
+  HOST_DEVICE RelationTail uniform_step(int64_t previous_node,
+                                        int64_t source_node,
+                                        bool restart,
+                                        const index_t &relation_tail_index,
+                                        const triples_t &triples_indexed,
+                                        int64_t padding_index,
+                                        rng::Philox &generator) {
+    auto rt = sample_neighbor(previous_node,relation_tail_index,triples_indexed,padding_index,generator);
+    if(restart && rt.tail == padding_index && previous_node != padding_index && previous_node != source_node){
+      rt.tail = source_node;
+    }
+    return rt;
+  }
+
+  // a uniform triple walk from source_node written to walk[0 .. walk_length - 1]. Returns
+  // the number of positions up to the end of the walk, the positions after it are only
+  // filled with the padding index when pad is true.
+  template <typename walk_t, typename index_t, typename triples_t>
+  HOST_DEVICE int64_t uniform_walk(walk_t &walk,
+                                   int64_t walk_length,
+                                   int64_t source_node,
+                                   bool restart,
+                                   bool pad,
+                                   const index_t &relation_tail_index,
+                                   const triples_t &triples_indexed,
+                                   int64_t padding_index,
+                                   rng::Philox &generator) {
+    walk[0] = source_node;
+    int64_t previous_node = source_node;
+    for(int64_t walk_step=1;walk_step < walk_length;walk_step=walk_step+2){
+      auto next_rt = uniform_step(previous_node,source_node,restart,relation_tail_index,triples_indexed,padding_index,generator);
+
+      // a walk that ended draws nothing more, the rest of it is padding
+      if(next_rt.tail == padding_index){
+        for(int64_t pos=walk_step;pad && pos < walk_length;pos++){
+          walk[pos] = padding_index;
+        }
+        return walk_step;
+      }
+
+      walk[walk_step] = next_rt.relation;
+      walk[walk_step+1] = next_rt.tail;
+      previous_node = next_rt.tail;
+    }
+    return walk_length;
+  }
+
+  // a window of the walk kept in a ring buffer, indexed with positions of the full walk.
+  // It must be large enough to hold every position a window looks at (see ring_size).
+  struct WalkRing {
+    int64_t *values;
+    int64_t size;
+
+    HOST_DEVICE int64_t &operator[](int64_t pos) {
+      return values[pos % size];
+    }
+
+    HOST_DEVICE int64_t operator[](int64_t pos) const {
+      return values[pos % size];
+    }
+  };
+
+  // positions of the walk that one window needs, from the head of the furthest
+  // left context triple to the tail of the furthest right context triple
+  HOST_DEVICE int64_t ring_size(int64_t window_size) {
+    return (window_size * 4) + 4;
+  }
+
+  // extend a walk kept in a ring until it holds position `needed`, with the steps of uniform_walk.
+  // next_pos is the next position to generate and previous_node the last node of the walk.
+  template <typename index_t, typename triples_t>
+  HOST_DEVICE void extend_walk(WalkRing &ring,
+                               int64_t needed,
+                               int64_t &next_pos,
+                               int64_t &previous_node,
+                               int64_t source_node,
+                               bool restart,
+                               const index_t &relation_tail_index,
+                               const triples_t &triples_indexed,
+                               int64_t padding_idx,
+                               rng::Philox &generator) {
+    while(next_pos <= needed){
+      auto next_rt = uniform_step(previous_node,source_node,restart,relation_tail_index,triples_indexed,padding_idx,generator);
+      ring[next_pos] = next_rt.relation;
+      ring[next_pos + 1] = next_rt.tail;
+      previous_node = next_rt.tail;
+      next_pos = next_pos + 2;
+    }
+  }
+
+}
@@ -0,0 +1,185 @@
+#pragma once
+#include <stdint.h>
+#include <math.h>
+#include "rng.h"
+
+// Node walks over a csr graph or over an edge list sorted by head, shared by the cpu and cuda kernels.
+//
+// Both graphs offer sample_neighbor(node, jump_node, generator) and is_neighbor(node, other)
+// so that the uniform and the biased (node2vec) walks are written once.
+namespace walks {
+
+  // neighbors of a node are column_idx[row_ptr[node] .. row_ptr[node + 1] - 1]
+  template <typename accessor_t>
+  struct CSRGraph {
+    accessor_t row_ptr;
+    accessor_t column_idx;
+    int64_t col_length;
+
+    // a node without neighbors stays where it is
+    HOST_DEVICE int64_t sample_neighbor(int64_t node, int64_t jump_node, rng::Philox &generator) const {
+      auto column_start = int64_t(row_ptr[node]);
+      auto column_end = int64_t(row_ptr[node + 1]);
+      if(column_end <= column_start){
+        return node;
+      }
+
+      auto nbr_idx = generator.sample_int(column_start,column_end - 1);
+      if(nbr_idx >= 0 && nbr_idx < col_length){
+        return column_idx[nbr_idx];
+      }else{
+        return node;
+      }
+    }
+
+    HOST_DEVICE bool is_neighbor(int64_t node, int64_t other) const {
+      for(int64_t i = row_ptr[other];i<row_ptr[other + 1];i++){
+        if(column_idx[i] == node){
+          return true;
+        }
+      }
+      return false;
+    }
+
+    HOST_DEVICE bool is_padding(int64_t node) const {
+      return false;
+    }
+  };
+
+  // edges of a node are edge_list[node_edge_index[node][0] .. node_edge_index[node][1]],
+  // a node without edges leads to the padding index and the padding index to the jump node
+  template <typename accessor_t>
+  struct EdgeListGraph {
+    accessor_t node_edge_index;
+    accessor_t edge_list;
+    int64_t padding_idx;
+
+    HOST_DEVICE int64_t sample_neighbor(int64_t node, int64_t jump_node, rng::Philox &generator) const {
+      if(node == padding_idx){
+        return jump_node;
+      }
+
+      auto start_index = node_edge_index[node][0];
+      auto end_index = node_edge_index[node][1];
+      if(start_index == -1 || end_index == -1){
+        return padding_idx;
+      }
+
+      auto nbr_edge_index = generator.sample_int(start_index,end_index);
+      return edge_list[nbr_edge_index][1];
+    }
+
+    HOST_DEVICE bool is_neighbor(int64_t node, int64_t other) const {
+      if(other == padding_idx){
+        return false;
+      }
+
+      auto start_index = node_edge_index[other][0];
+      auto end_index = node_edge_index[other][1];
+      if(start_index == -1 || end_index == -1){
+        return false;
+      }
+
+      for(int64_t i = start_index;i<=end_index;i++){
+        if(edge_list[i][1] == node){
+          return true;
+        }
+      }
+      return false;
+    }
+
+    HOST_DEVICE bool is_padding(int64_t node) const {
+      return node == padding_idx;
+    }
+  };
+
+  // node2vec acceptance probabilities of returning to the previous node (0),
+  // staying at distance 1 (1) and moving away to distance 2 (2), normalized by the largest
+  struct BiasProbs {
+    double prob_0;
+    double prob_1;
+    double prob_2;
+
+    HOST_DEVICE BiasProbs(double p, double q) {
+      double max_prob = fmax(fmax(1.0/p,1.0),1.0/q);
+      prob_0 = 1.0/p/max_prob;
+      prob_1 = 1.0/max_prob;
+      prob_2 = 1.0/q/max_prob;
+    }
+  };
+
+  // walk of walk_size nodes starting at target_node, every step picks a neighbor uniformly
+  template <typename graph_t, typename walk_t>
+  HOST_DEVICE void uniform_walk(const graph_t &graph,
+                                walk_t walk,
+                                int64_t walk_size,
+                                int64_t target_node,
+                                int64_t jump_node,
+                                rng::Philox &generator) {
+    walk[0] = target_node;
+    int64_t previous_node = target_node;
+    for(int64_t walk_step=1;walk_step < walk_size;walk_step++){
+      previous_node = graph.sample_neighbor(previous_node,jump_node,generator);
+      walk[walk_step] = previous_node;
+    }
+  }
+
+  // second order walk of node2vec (Grover and Leskovec, 2016) with rejection sampling.
+  // Moves from or to the padding index (dead ends and restarts) are not biased.
+  template <typename graph_t, typename walk_t>
+  HOST_DEVICE void biased_walk(const graph_t &graph,
+                               walk_t walk,
+                               int64_t walk_size,
+                               int64_t target_node,
+                               int64_t jump_node,
+                               const BiasProbs &probs,
+                               rng::Philox &generator) {
+    walk[0] = target_node;
+    if(walk_size < 2){
+      return;
+    }
+
+    // the first step has no previous node to be biased by
+    walk[1] = graph.sample_neighbor(target_node,jump_node,generator);
+
+    int64_t previous_node = walk[1];
+    for(int64_t walk_step=2;walk_step < walk_size;walk_step++){
+      int64_t t_node = walk[walk_step-2];
+      int64_t selected_node = -1;
+
+      // at most rng::MAX_PROPOSALS proposals, the last one is taken when all are rejected
+      for(int proposal = 0; proposal < rng::MAX_PROPOSALS; proposal++){
+        int64_t new_node = graph.sample_neighbor(previous_node,jump_node,generator);
+        auto random_prob = generator.uniform();
+        selected_node = new_node;
+
+        if(graph.is_padding(previous_node) || graph.is_padding(new_node)){
+          break;
+        }
+
+        // new_node is the same as previous to previous node, so go back
+        else if(new_node == t_node){
+          if(random_prob < probs.prob_0){
+            break;
+          }
+        }
+
+        // new_node and t_node are neighbors i.e distance is 1
+        else if(graph.is_neighbor(new_node,t_node)){
+          if(random_prob < probs.prob_1){
+            break;
+          }
+        }
+
+        // else distance is 2
+        else if(random_prob < probs.prob_2){
+          break;
+        }
+      }
+
+      walk[walk_step] = selected_node;
+      previous_node = selected_node;
+    }
+  }
+
+}
@@ -0,0 +1,181 @@
+#pragma once
+#include <stdint.h>
+#include "rng.h"
+
+// Per-walk window builders shared by the cpu and cuda kernels.
+//
+// A triple walk of length L = 2n+1 holds the nodes at even positions and the
+// relations at odd positions, so the j-th triple of the walk is made of the
+// positions (2j, 2j+1, 2j+2). Positions that fall outside of the walk are
+// replaced by the padding index. `walk` can be anything that can be indexed
+// with a position (a tensor accessor or a ring buffer).
+namespace windows {
+
+  // number of target triples in a walk of the given length
+  HOST_DEVICE int64_t num_windows_in_walk(int64_t walk_length) {
+    return (walk_length - 1) / 2;
+  }
+
+  // value at a position of the walk or the padding index if it is out of range
+  template <typename walk_t>
+  HOST_DEVICE int64_t walk_value(const walk_t &walk, int64_t pos, int64_t walk_length, int64_t padding_idx) {
+    if(pos >= 0 && pos < walk_length){
+      return walk[pos];
+    }else{
+      return padding_idx;
+    }
+  }
+
+  // write the j-th triple of the walk to out
+  template <typename walk_t, typename out_t>
+  HOST_DEVICE void copy_triple(const walk_t &walk, int64_t triple_idx, int64_t walk_length, int64_t padding_idx, out_t out) {
+    out[0] = walk_value(walk,(triple_idx*2),walk_length,padding_idx);       // Head
+    out[1] = walk_value(walk,(triple_idx*2) + 1,walk_length,padding_idx);   // Relation
+    out[2] = walk_value(walk,(triple_idx*2) + 2,walk_length,padding_idx);   // Tail
+  }
+
+  // fill the context of target triple t: the window_size triples before it
+  // (closest first) followed by the window_size triples after it
+  template <typename walk_t, typename out_t>
+  HOST_DEVICE void copy_context(const walk_t &walk, int64_t target_idx, int64_t walk_length, int64_t window_size, int64_t padding_idx, out_t context) {
+    for(int64_t hop=0;hop<window_size;hop++){
+      copy_triple(walk,target_idx - (hop + 1),walk_length,padding_idx,context[hop]);
+      copy_triple(walk,target_idx + (hop + 1),walk_length,padding_idx,context[hop + window_size]);
+    }
+  }
+
+  // index of a random triple to use as a negative
+  HOST_DEVICE int64_t sample_negative(int64_t num_triples, rng::Philox &generator) {
+    return generator.sample_int(0,(num_triples-1));
+  }
+
+  // index of a random triple that is not equal to the target triple
+  template <typename walk_t, typename triples_t>
+  HOST_DEVICE int64_t sample_cbow_negative(const walk_t &walk,
+                                           int64_t target_idx,
+                                           int64_t walk_length,
+                                           int64_t padding_idx,
+                                           const triples_t &triples,
+                                           int64_t num_triples,
+                                           rng::Philox &generator) {
+    auto pos_head = walk_value(walk,(target_idx*2),walk_length,padding_idx);
+    auto pos_rel = walk_value(walk,(target_idx*2) + 1,walk_length,padding_idx);
+    auto pos_tail = walk_value(walk,(target_idx*2) + 2,walk_length,padding_idx);
+
+    // loop until we find a negative triple that is not equal to positive triple
+    auto neg_triple_idx = sample_negative(num_triples,generator);
+    auto max_checks = 0;
+    while(triples[neg_triple_idx][0] == pos_head && triples[neg_triple_idx][1] == pos_rel && triples[neg_triple_idx][2] == pos_tail && max_checks<=100){
+      neg_triple_idx = sample_negative(num_triples,generator);
+      max_checks = max_checks + 1;
+    }
+    return neg_triple_idx;
+  }
+
+  // skip-gram windows of one target triple: the target, its context and num_negatives random
+  // triples per context slot, neg_window holds the num_negatives sets one after the other
+  template <typename walk_t, typename triples_t, typename target_t, typename context_t>
+  HOST_DEVICE void triples_sg_window(const walk_t &walk,
+                                     int64_t target_idx,
+                                     int64_t walk_length,
+                                     int64_t window_size,
+                                     int64_t padding_idx,
+                                     const triples_t &triples,
+                                     int64_t num_triples,
+                                     int64_t num_negatives,
+                                     rng::Philox &generator,
+                                     target_t target_triple,
+                                     context_t pos_window,
+                                     context_t neg_window) {
+
+    // get the target triple
+    copy_triple(walk,target_idx,walk_length,padding_idx,target_triple);
+
+    // get the positive window
+    copy_context(walk,target_idx,walk_length,window_size,padding_idx,pos_window);
+
+    // create negatives
+    for(int64_t hop=0;hop<(window_size*2*num_negatives);hop++){
+      auto triple_idx = sample_negative(num_triples,generator);
+      neg_window[hop][0] = triples[triple_idx][0];
+      neg_window[hop][1] = triples[triple_idx][1];
+      neg_window[hop][2] = triples[triple_idx][2];
+    }
+  }
+
+  // cbow windows of one target triple: the target, one random triple that differs from it and its context
+  template <typename walk_t, typename triples_t, typename target_t, typename context_t>
+  HOST_DEVICE void triples_cbow_window(const walk_t &walk,
+                                       int64_t target_idx,
+                                       int64_t walk_length,
+                                       int64_t window_size,
+                                       int64_t padding_idx,
+                                       const triples_t &triples,
+                                       int64_t num_triples,
+                                       rng::Philox &generator,
+                                       target_t pos_triple,
+                                       target_t neg_triple,
+                                       context_t pos_window) {
+
+    // get the target triple
+    copy_triple(walk,target_idx,walk_length,padding_idx,pos_triple);
+
+    // get a negative triple that is not equal to positive triple
+    auto neg_triple_idx = sample_cbow_negative(walk,target_idx,walk_length,padding_idx,triples,num_triples,generator);
+
+    neg_triple[0] = triples[neg_triple_idx][0];
+    neg_triple[1] = triples[neg_triple_idx][1];
+    neg_triple[2] = triples[neg_triple_idx][2];
+
+    // get the positive window
+    copy_context(walk,target_idx,walk_length,window_size,padding_idx,pos_window);
+  }
+
+  // the negatives after the first of a cbow window with num_negatives of them, drawn
+  // after triples_cbow_window from the same stream into neg_triples[1:]
+  template <typename walk_t, typename triples_t, typename negatives_t>
+  HOST_DEVICE void triples_cbow_negatives(const walk_t &walk,
+                                          int64_t target_idx,
+                                          int64_t walk_length,
+                                          int64_t padding_idx,
+                                          const triples_t &triples,
+                                          int64_t num_triples,
+                                          int64_t num_negatives,
+                                          rng::Philox &generator,
+                                          negatives_t neg_triples) {
+    for(int64_t negative=1;negative<num_negatives;negative++){
+      auto neg_triple_idx = sample_cbow_negative(walk,target_idx,walk_length,padding_idx,triples,num_triples,generator);
+      neg_triples[negative][0] = triples[neg_triple_idx][0];
+      neg_triples[negative][1] = triples[neg_triple_idx][1];
+      neg_triples[negative][2] = triples[neg_triple_idx][2];
+    }
+  }
+
+  // skip-gram negatives of one target triple as indices into triples, drawn
+  // in the same order as triples_sg_window so that both give the same windows
+  template <typename index_t>
+  HOST_DEVICE void triples_sg_negatives(int64_t window_size,
+                                        int64_t num_triples,
+                                        int64_t num_negatives,
+                                        rng::Philox &generator,
+                                        index_t neg_index) {
+    for(int64_t hop=0;hop<(window_size*2*num_negatives);hop++){
+      neg_index[hop] = sample_negative(num_triples,generator);
+    }
+  }
+
+  // node windows: the node in the middle of window_size consecutive nodes and the other nodes as context
+  template <typename walk_t, typename context_t>
+  HOST_DEVICE int64_t copy_node_window(const walk_t &walk, int64_t window_start, int64_t window_size, context_t context) {
+    int64_t mid_pos = window_size/2;
+    int64_t pos_index = 0;
+    for(int64_t i = 0;i<window_size;i++){
+      if(i != mid_pos){
+        context[pos_index] = walk[window_start + i];
+        pos_index = pos_index + 1;
+      }
+    }
+    return walk[window_start + mid_pos];
+  }
+
+}
@@ -0,0 +1,44 @@
+import argparse
+import time
+import torch
+from triple_walk import utils
+from triple_walk import rw
+
+# time per step of biased triple walks on graphs with hubs of growing degree,
+# the neighbor test is a binary search so the cost should grow with log(degree)
+parser = argparse.ArgumentParser()
+parser.add_argument("--degrees",type=int,nargs="+",default=[1000,10000,100000])
+parser.add_argument("--num_hubs",type=int,default=10)
+parser.add_argument("--num_walks",type=int,default=10000)
+parser.add_argument("--walk_length",type=int,default=20)
+parser.add_argument("--p",type=float,default=0.5)
+parser.add_argument("--q",type=float,default=2.0)
+args = parser.parse_args()
+
+num_relations = 10
+for degree in args.degrees:
+    # every hub links to degree random entities, which link back to random hubs
+    num_entities = args.num_hubs * degree
+    hub_heads = torch.arange(args.num_hubs).repeat_interleave(degree)
+    hub_tails = torch.randint(0,num_entities,(len(hub_heads),))
+    leaf_heads = torch.arange(num_entities)
+    leaf_tails = torch.randint(0,args.num_hubs,(num_entities,))
+    heads = torch.cat((hub_heads,leaf_heads))
+    tails = torch.cat((hub_tails,leaf_tails))
+    relations = torch.randint(num_entities,num_entities+num_relations,(len(heads),))
+    triples = torch.stack((heads,relations,tails),dim=1)
+
+    relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(num_entities))
+    sorted_tails = utils.build_sorted_tails(triples_sorted)
+    target_nodes = torch.randint(0,num_entities,(args.num_walks,))
+    padding_idx = num_entities + num_relations
+
+    timings = {}
+    for name, p, q in [("uniform",1.0,1.0),("biased",args.p,args.q)]:
+        start = time.perf_counter()
+        rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0,
+                        p=p,q=q,sorted_tails=sorted_tails)
+        timings[name] = time.perf_counter() - start
+
+    steps = args.num_walks * args.walk_length
+    print(f"degree {degree:>8,}: " + " ".join(f"{name} {seconds/steps*1e9:>8.1f} ns/step" for name, seconds in timings.items()))
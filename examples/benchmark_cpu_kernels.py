@@ -0,0 +1,52 @@
+import argparse
+import time
+import torch
+import triple_walk_native
+from triple_walk import utils
+from triple_walk import rw
+
+# times the cpu kernels of the installed build, run it against builds with different
+# compile flags (for example before and after changing them in setup.py) to compare
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_triples",type=int,default=1000000)
+parser.add_argument("--num_walks",type=int,default=100000)
+parser.add_argument("--walk_length",type=int,default=20)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--repeats",type=int,default=5)
+args = parser.parse_args()
+
+num_relations = 20
+generator = torch.Generator().manual_seed(0)
+heads = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+relations = torch.randint(args.num_entities,args.num_entities+num_relations,(args.num_triples,),generator=generator)
+triples = torch.stack((heads,relations,tails),dim=1)
+relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities))
+sorted_tails = utils.build_sorted_tails(triples_sorted)
+alias_table = rw.build_alias_table(relation_tail_index,torch.rand(args.num_triples,generator=generator))
+target_nodes = torch.randint(0,args.num_entities,(args.num_walks,),generator=generator)
+padding_idx = args.num_entities + num_relations
+walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0)
+
+kernels = {
+    "walk_triples": lambda: rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0),
+    "walk_triples_biased": lambda: rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0,
+                                                   p=0.5,q=2.0,sorted_tails=sorted_tails),
+    "walk_triples_weighted": lambda: rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0,
+                                                     alias_table=alias_table),
+    "to_windows_triples_sg": lambda: rw.to_windows_triples_sg(walks,args.window_size,args.num_entities,padding_idx,triples_sorted,seed=0),
+    "walk_windows_triples_sg": lambda: rw.walk_windows_triples_sg(triples_sorted,relation_tail_index,target_nodes,args.walk_length,
+                                                                  args.window_size,padding_idx,seed=0),
+}
+
+print(f"threads: {torch.get_num_threads()} / native module: {triple_walk_native.__file__}")
+for name, kernel in kernels.items():
+    kernel()
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        kernel()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{name:>24} {timings[len(timings)//2]*1000:>10.1f} ms")
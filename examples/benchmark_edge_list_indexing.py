@@ -0,0 +1,29 @@
+import argparse
+import time
+import networkx as nx
+from triple_walk import utils
+
+# times to_edge_list_indexed on random graphs of growing size, the time should grow
+# about linearly with the nodes (a quadratic node lookup would grow 16x per 4x nodes)
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_nodes",type=int,nargs="+",default=[20000,80000,320000])
+parser.add_argument("--edges_per_node",type=int,default=2)
+parser.add_argument("--repeats",type=int,default=3)
+args = parser.parse_args()
+
+def seconds(graph):
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        utils.to_edge_list_indexed(graph)
+        utils.nodes_tensor(graph)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+previous = None
+for num_nodes in args.num_nodes:
+    graph = nx.gnm_random_graph(num_nodes,num_nodes*args.edges_per_node,seed=1)
+    elapsed = seconds(graph)
+    growth = "" if previous is None else f" {elapsed/previous[1]:>6.1f}x time for {num_nodes/previous[0]:.0f}x nodes"
+    print(f"{num_nodes:>10,} nodes {elapsed:>10.3f} s{growth}")
+    previous = (num_nodes,elapsed)
@@ -0,0 +1,44 @@
+import argparse
+import os
+import torch
+from triple_walk import utils
+from triple_walk.model import SkipGramTriple
+from triple_walk.train import train_hogwild
+
+# windows per second of train_hogwild for a growing number of processes, each
+# with one thread, with the autograd path and with the native trainer
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--num_triples",type=int,default=1000000)
+parser.add_argument("--num_nodes",type=int,default=20000,help="target nodes walked per run")
+parser.add_argument("--walk_length",type=int,default=10)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--embedding_dim",type=int,default=128)
+parser.add_argument("--processes",type=int,nargs="+",default=None)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    processes = args.processes
+    if processes is None:
+        processes = [1] + list(range(2,os.cpu_count()+1,2))
+
+    generator = torch.Generator().manual_seed(0)
+    heads = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+    tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+    relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,),generator=generator)
+    triples = torch.stack((heads,relations,tails),dim=1)
+    relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities))
+    target_nodes = torch.randint(0,args.num_entities,(args.num_nodes,),generator=generator)
+
+    model = SkipGramTriple(num_nodes=None,embedding_dim=args.embedding_dim,padding_index=args.num_entities+args.num_relations,
+                           num_entities=args.num_entities,num_relations=args.num_relations)
+
+    for native in [False,True]:
+        baseline = None
+        for num_processes in processes:
+            num_windows, seconds = train_hogwild(model,triples_sorted,relation_tail_index,target_nodes,args.walk_length,args.window_size,
+                                                 num_processes=num_processes,lr=0.1,native=native)
+            throughput = num_windows / seconds
+            baseline = throughput if baseline is None else baseline
+            print(f"{'native' if native else 'autograd':>8} processes {num_processes:>3}: {throughput:>10.0f} windows/s {throughput/baseline:>6.2f} x")
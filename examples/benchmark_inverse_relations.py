@@ -0,0 +1,46 @@
+import argparse
+import time
+import torch
+from triple_walk import utils
+from triple_walk import rw
+
+# walks on a directed graph where most entities are only tails, with and without the inverse
+# relations of build_relation_tail_index(..., add_inverse=True). Reports the triples walked
+# before a dead end and the windows of walked triples built per second, with packed walks
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_heads",type=int,default=20000,help="entities with outgoing triples")
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--num_triples",type=int,default=200000)
+parser.add_argument("--num_walks",type=int,default=100000)
+parser.add_argument("--walk_length",type=int,default=20)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--repeats",type=int,default=3)
+args = parser.parse_args()
+
+generator = torch.Generator().manual_seed(0)
+heads = torch.randint(0,args.num_heads,(args.num_triples,),generator=generator)
+tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,),generator=generator)
+triples = torch.stack((heads,relations,tails),dim=1)
+target_nodes = torch.randint(0,args.num_entities,(args.num_walks,),generator=generator)
+
+for add_inverse in [False,True]:
+    start = time.perf_counter()
+    relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities),
+                                                                          add_inverse=add_inverse,num_relations=args.num_relations)
+    build_seconds = time.perf_counter() - start
+    padding_idx = args.num_entities + args.num_relations * (2 if add_inverse else 1)
+
+    seconds = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        values, offsets = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,
+                                          seed=0,restart=False,packed=True)
+        windows = rw.to_windows_triples_sg_packed(values,offsets,args.window_size,padding_idx,triples_sorted,seed=1)
+        seconds.append(time.perf_counter() - start)
+    seconds = sorted(seconds)[len(seconds)//2]
+
+    num_windows = len(windows[0])
+    print(f"inverse={add_inverse}: index built in {build_seconds:.3f} s, {num_windows/args.num_walks:.2f} triples per walk, "
+          f"{num_windows/seconds:,.0f} windows/s")
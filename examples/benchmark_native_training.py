@@ -0,0 +1,57 @@
+import argparse
+import time
+import torch
+from triple_walk import utils
+from triple_walk import rw
+from triple_walk.model import SkipGramTriple
+
+# windows per second of one epoch of SkipGramTriple with forward_walks, autograd and
+# torch.optim.SGD on minibatches, and with the native trainer of train_walks
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--num_triples",type=int,default=1000000)
+parser.add_argument("--num_walks",type=int,default=10000)
+parser.add_argument("--walk_length",type=int,default=21)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--embedding_dim",type=int,default=128)
+parser.add_argument("--batch_size",type=int,default=1024)
+parser.add_argument("--sparse",action="store_true",help="train the autograd path with sparse embeddings")
+args = parser.parse_args()
+
+generator = torch.Generator().manual_seed(0)
+heads = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,),generator=generator)
+triples = torch.stack((heads,relations,tails),dim=1)
+relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities))
+padding_idx = args.num_entities + args.num_relations
+target_nodes = torch.randint(0,args.num_entities,(args.num_walks,),generator=generator)
+walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0)
+neg_index = rw.to_windows_triples_sg_index(walks,args.window_size,triples_sorted,seed=0)
+window_offsets = torch.arange(len(neg_index),dtype=torch.int32)
+
+def new_model():
+    return SkipGramTriple(num_nodes=None,embedding_dim=args.embedding_dim,padding_index=padding_idx,
+                          num_entities=args.num_entities,num_relations=args.num_relations,sparse=args.sparse)
+
+def autograd_epoch(model):
+    optimizer = torch.optim.SGD(model.parameters(),lr=0.1)
+    for batch in torch.split(window_offsets,args.batch_size):
+        optimizer.zero_grad()
+        model.forward_walks(walks,batch,neg_index,triples_sorted,args.window_size).backward()
+        optimizer.step()
+
+def native_epoch(model):
+    model.train_walks(walks,window_offsets,neg_index,triples_sorted,args.window_size,lr=0.1)
+
+print(f"threads: {torch.get_num_threads()} / windows: {len(window_offsets):,}")
+timings = {}
+for name, epoch in [("autograd",autograd_epoch),("native",native_epoch)]:
+    model = new_model()
+    start = time.perf_counter()
+    epoch(model)
+    timings[name] = time.perf_counter() - start
+    print(f"{name:>10} {len(window_offsets)/timings[name]:>12.0f} windows/s")
+
+print(f"{'speedup':>10} {timings['autograd']/timings['native']:>12.1f} x")
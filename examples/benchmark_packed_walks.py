@@ -0,0 +1,49 @@
+import argparse
+import time
+import torch
+from triple_walk import utils
+from triple_walk import rw
+
+# memory and time of walking and building skip-gram windows on a sparse directed graph, where
+# most entities are dead ends, with padded walks and with packed walks that end at the dead ends
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_heads",type=int,default=20000,help="entities with outgoing triples")
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--num_triples",type=int,default=200000)
+parser.add_argument("--num_walks",type=int,default=100000)
+parser.add_argument("--walk_length",type=int,default=20)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--repeats",type=int,default=3)
+args = parser.parse_args()
+
+generator = torch.Generator().manual_seed(0)
+heads = torch.randint(0,args.num_heads,(args.num_triples,),generator=generator)
+tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,),generator=generator)
+triples = torch.stack((heads,relations,tails),dim=1)
+relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities))
+padding_idx = args.num_entities + args.num_relations
+target_nodes = torch.randint(0,args.num_heads,(args.num_walks,),generator=generator)
+
+def padded():
+    walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0,restart=False)
+    return (walks,) + tuple(rw.to_windows_triples_sg(walks,args.window_size,padding_idx,padding_idx,triples_sorted,seed=1))
+
+def packed():
+    values, offsets = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,args.walk_length,padding_idx,seed=0,restart=False,packed=True)
+    return (values,offsets) + tuple(rw.to_windows_triples_sg_packed(values,offsets,args.window_size,padding_idx,triples_sorted,seed=1))
+
+def measure(function):
+    seconds = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        tensors = function()
+        seconds.append(time.perf_counter() - start)
+    return sorted(seconds)[len(seconds)//2], sum(tensor.nbytes for tensor in tensors), len(tensors[-1])
+
+padded_seconds, padded_bytes, padded_windows = measure(padded)
+packed_seconds, packed_bytes, packed_windows = measure(packed)
+print(f"padded: {padded_windows} windows, {padded_bytes/2**20:.1f} MiB, {padded_seconds:.3f} s")
+print(f"packed: {packed_windows} windows, {packed_bytes/2**20:.1f} MiB, {packed_seconds:.3f} s")
+print(f"{padded_bytes/packed_bytes:.2f}x less memory, {padded_seconds/packed_seconds:.2f}x faster")
@@ -0,0 +1,50 @@
+import argparse
+import time
+import torch
+from triple_walk import utils
+from triple_walk.data import Prefetcher, TripleWalkDataset
+from triple_walk.model import SkipGramTriple
+
+# one epoch of SkipGramTriple on the batches of a TripleWalkDataset, with the walks and
+# windows built in sequence with the model steps and built ahead by a Prefetcher
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--num_triples",type=int,default=1000000)
+parser.add_argument("--num_nodes",type=int,default=20000,help="target nodes walked in the epoch")
+parser.add_argument("--walk_length",type=int,default=10)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--embedding_dim",type=int,default=64)
+parser.add_argument("--batch_size",type=int,default=4096)
+parser.add_argument("--depth",type=int,default=4)
+args = parser.parse_args()
+
+generator = torch.Generator().manual_seed(0)
+heads = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+tails = torch.randint(0,args.num_entities,(args.num_triples,),generator=generator)
+relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,),generator=generator)
+triples = torch.stack((heads,relations,tails),dim=1)
+relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(args.num_entities))
+padding_idx = args.num_entities + args.num_relations
+target_nodes = torch.randint(0,args.num_entities,(args.num_nodes,),generator=generator)
+
+dataset = TripleWalkDataset(triples_sorted,relation_tail_index,target_nodes,args.walk_length,args.window_size,padding_idx,
+                            batch_size=args.batch_size)
+model = SkipGramTriple(num_nodes=None,embedding_dim=args.embedding_dim,padding_index=padding_idx,
+                       num_entities=args.num_entities,num_relations=args.num_relations,sparse=True)
+optimizer = torch.optim.SparseAdam(list(model.parameters()))
+
+def epoch(batches):
+    start = time.perf_counter()
+    for batch in batches:
+        optimizer.zero_grad()
+        model(*batch).backward()
+        optimizer.step()
+    return time.perf_counter() - start
+
+print(f"threads: {torch.get_num_threads()}")
+sequential = epoch(dataset)
+print(f"{'sequential':>12} {sequential:>8.2f} s")
+prefetcher = Prefetcher(dataset,depth=args.depth)
+prefetched = epoch(prefetcher)
+print(f"{'prefetched':>12} {prefetched:>8.2f} s, walks and windows {prefetcher.produce_seconds:.2f} s of which {prefetcher.hidden_seconds:.2f} s hidden")
@@ -0,0 +1,66 @@
+import argparse
+import time
+import pandas as pd
+import torch
+from triple_walk import utils
+
+# compares the vectorized build_relation_tail_index with the previous pandas + python loop version
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_triples",type=int,default=1000000)
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--skip_loop",action="store_true",help="only time the vectorized version")
+args = parser.parse_args()
+
+def build_relation_tail_index_loop(triples_indexed_tensor,all_entities_tensor):
+    # the previous implementation, kept here as the baseline
+    triples_indexed_pd = pd.DataFrame(data=triples_indexed_tensor.numpy(),columns=["head","relation","tail"])
+    triples_indexed_pd = triples_indexed_pd.sort_values(by="head",ascending=True,kind="stable")
+    triples_indexed_tensor = torch.from_numpy(triples_indexed_pd.to_numpy()).to(int).contiguous()
+
+    nodes_sorted,_ = torch.sort(all_entities_tensor)
+
+    num_nodes = len(nodes_sorted)
+    num_edges = len(triples_indexed_tensor)
+    node_edge_index = torch.full((num_nodes,2),-1).to(int).contiguous()
+
+    current_node = triples_indexed_tensor[0][0]
+    for edge_index in range(num_edges):
+        edge = triples_indexed_tensor[edge_index]
+        head = edge[0]
+
+        if head != current_node:
+            node_edge_index[current_node][1] = edge_index - 1
+            node_edge_index[head] = edge_index
+            current_node = head
+        else:
+            if edge_index == 0:
+                node_edge_index[head][0] = 0
+            else:
+                node_edge_index[head][1] = edge_index
+
+    return node_edge_index, triples_indexed_tensor
+
+# random triples
+heads = torch.randint(0,args.num_entities,(args.num_triples,))
+tails = torch.randint(0,args.num_entities,(args.num_triples,))
+relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,(args.num_triples,))
+triples = torch.stack((heads,relations,tails),dim=1)
+entities = torch.arange(args.num_entities)
+
+print(f"triples: {args.num_triples:,} / entities: {args.num_entities:,}")
+
+start = time.perf_counter()
+index, triples_sorted = utils.build_relation_tail_index(triples,entities)
+vectorized_seconds = time.perf_counter() - start
+print(f"{'vectorized':>12} {vectorized_seconds:>10.3f} s")
+
+if args.skip_loop == False:
+    start = time.perf_counter()
+    index_loop, triples_sorted_loop = build_relation_tail_index_loop(triples,entities)
+    loop_seconds = time.perf_counter() - start
+    print(f"{'loop':>12} {loop_seconds:>10.3f} s")
+    print(f"{'speedup':>12} {loop_seconds/vectorized_seconds:>10.1f} x")
+
+    assert torch.equal(index,index_loop), "the indices differ"
+    assert torch.equal(triples_sorted,triples_sorted_loop), "the sorted triples differ"
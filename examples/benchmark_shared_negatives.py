@@ -0,0 +1,57 @@
+import argparse
+import time
+import torch
+from triple_walk.model import SkipGramTriple, sample_shared_negatives
+
+# forward + backward throughput of SkipGramTriple with the per window negatives of
+# forward and with the batch wide negatives of forward_shared
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,default=100000)
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--embedding_dim",type=int,default=128)
+parser.add_argument("--batch_size",type=int,default=1024)
+parser.add_argument("--window_size",type=int,default=20)
+parser.add_argument("--num_negatives",type=int,default=64)
+parser.add_argument("--repeats",type=int,default=5)
+parser.add_argument("--sparse",action="store_true",help="use sparse embeddings, which leaves out the dense gradients of the whole tables")
+args = parser.parse_args()
+
+def random_triples(shape):
+    heads = torch.randint(0,args.num_entities,shape)
+    relations = torch.randint(args.num_entities,args.num_entities+args.num_relations,shape)
+    tails = torch.randint(0,args.num_entities,shape)
+    return torch.stack((heads,relations,tails),dim=-1)
+
+padding_idx = args.num_entities + args.num_relations
+context_size = args.window_size * 2
+triples = random_triples((args.num_entities,))
+target_triples = random_triples((args.batch_size,))
+pos_context = random_triples((args.batch_size,context_size))
+neg_context = random_triples((args.batch_size,context_size))
+
+model = SkipGramTriple(num_nodes=None,
+                       embedding_dim=args.embedding_dim,
+                       padding_index=padding_idx,
+                       num_entities=args.num_entities,
+                       num_relations=args.num_relations,
+                       sparse=args.sparse)
+
+steps = {
+    "per window negatives": lambda: model(target_triples,pos_context,neg_context),
+    "shared negatives": lambda: model.forward_shared(target_triples,pos_context,sample_shared_negatives(triples,args.num_negatives)),
+}
+
+timings = {}
+for name, step in steps.items():
+    step().backward()
+    runs = []
+    for _ in range(args.repeats):
+        model.zero_grad()
+        start = time.perf_counter()
+        step().backward()
+        runs.append(time.perf_counter() - start)
+    runs.sort()
+    timings[name] = runs[len(runs)//2]
+    print(f"{name:>22} {args.batch_size/timings[name]:>10.0f} windows/s")
+
+print(f"{'speedup':>22} {timings['per window negatives']/timings['shared negatives']:>10.1f} x")
@@ -0,0 +1,54 @@
+import argparse
+import time
+import torch
+from triple_walk.model import SkipGramTriple
+
+# time of one training step (forward, backward and optimizer) of a fixed batch for growing
+# numbers of entities, with dense embeddings and Adam and with sparse embeddings and SparseAdam
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_entities",type=int,nargs="+",default=[10000,100000,1000000])
+parser.add_argument("--num_relations",type=int,default=100)
+parser.add_argument("--embedding_dim",type=int,default=32)
+parser.add_argument("--batch_size",type=int,default=4096)
+parser.add_argument("--window_size",type=int,default=4)
+parser.add_argument("--repeats",type=int,default=5)
+args = parser.parse_args()
+
+def random_triples(num_entities,shape):
+    heads = torch.randint(0,num_entities,shape)
+    relations = torch.randint(num_entities,num_entities+args.num_relations,shape)
+    tails = torch.randint(0,num_entities,shape)
+    return torch.stack((heads,relations,tails),dim=-1)
+
+for num_entities in args.num_entities:
+    padding_idx = num_entities + args.num_relations
+    target_triples = random_triples(num_entities,(args.batch_size,))
+    pos_context = random_triples(num_entities,(args.batch_size,args.window_size*2))
+    neg_context = random_triples(num_entities,(args.batch_size,args.window_size*2))
+
+    timings = {}
+    for sparse in [False,True]:
+        model = SkipGramTriple(num_nodes=None,
+                               embedding_dim=args.embedding_dim,
+                               padding_index=padding_idx,
+                               num_entities=num_entities,
+                               num_relations=args.num_relations,
+                               sparse=sparse)
+        if sparse:
+            optimizer = torch.optim.SparseAdam(list(model.parameters()))
+        else:
+            optimizer = torch.optim.Adam(model.parameters())
+
+        steps = []
+        for _ in range(args.repeats + 1):
+            start = time.perf_counter()
+            optimizer.zero_grad()
+            model(target_triples,pos_context,neg_context).backward()
+            optimizer.step()
+            steps.append(time.perf_counter() - start)
+
+        # the first step allocates the optimizer state
+        steps = sorted(steps[1:])
+        timings["sparse" if sparse else "dense"] = steps[len(steps)//2]
+
+    print(f"entities {num_entities:>10,}: " + " ".join(f"{name} {seconds*1000:>8.1f} ms" for name, seconds in timings.items()))
@@ -0,0 +1,57 @@
+import argparse
+import os
+import time
+import torch
+from triple_walk import rw
+
+# strong scaling of the window generators: the problem size stays fixed while the number of threads grows
+parser = argparse.ArgumentParser()
+parser.add_argument("--num_walks",type=int,default=50000)
+parser.add_argument("--walk_length",type=int,default=100)
+parser.add_argument("--window_size",type=int,default=2)
+parser.add_argument("--num_nodes",type=int,default=1000000)
+parser.add_argument("--max_threads",type=int,default=os.cpu_count())
+parser.add_argument("--repeats",type=int,default=3)
+args = parser.parse_args()
+
+# random walks and triples, the content does not matter for the timing
+walk_size = (args.walk_length*2)+1
+walks = torch.randint(low=0,high=args.num_nodes,size=(args.num_walks,walk_size))
+triples = torch.randint(low=0,high=args.num_nodes,size=(args.num_nodes,3))
+padding_idx = args.num_nodes
+
+print(f"walk steps: {walks.numel():,} / windows: {args.num_walks*args.walk_length:,}")
+
+# thread counts 1, 2, 4, ... max_threads
+thread_counts = []
+threads = 1
+while threads < args.max_threads:
+    thread_counts.append(threads)
+    threads = threads * 2
+thread_counts.append(args.max_threads)
+
+def time_function(function):
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        outputs = function(walks=walks,
+                           window_size=args.window_size,
+                           num_nodes=args.num_nodes,
+                           padding_idx=padding_idx,
+                           triples=triples,
+                           seed=20)
+        timings.append(time.perf_counter() - start)
+        del outputs
+    return min(timings)
+
+for name, function in [("skipgram",rw.to_windows_triples_sg),("cbow",rw.to_windows_triples_cbow)]:
+    print(f"\n{name}")
+    print(f"{'threads':>8} {'seconds':>10} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        seconds = time_function(function)
+        if baseline is None:
+            baseline = seconds
+        speedup = baseline / seconds
+        print(f"{threads:>8} {seconds:>10.3f} {speedup:>8.2f} {speedup/threads:>10.2f}")
@@ -66,9 +66,12 @@ pos_target, neg_target, context = rw.to_windows_triples_cbow(walks=walks,
 
 
 # create the model
-model = CBOWTriple(num_nodes=len(all_entities_list),
+# with separate vocabularies the relation tables only hold the relations
+model = CBOWTriple(num_nodes=None,
                                     embedding_dim=32,
-                                    padding_index=padding_idx
+                                    padding_index=padding_idx,
+                                    num_entities=len(entities_map),
+                                    num_relations=len(relations_map)
                                 )
 
 # train the model for one step
@@ -40,8 +40,6 @@ triples_index_tensor = triples_index_tensor.repeat_interleave(amplify_triples,0)
 target_entities_list = list(set(triples_index_tensor[:,0].tolist()+triples_index_tensor[:,2].tolist()))
 target_entities_tensor = torch.Tensor(target_entities_list).to(int)
 
-target_entities_tensor = target_entities_tensor.repeat_interleave(walks_per_node)
-
 # build node edge index
 relation_tail_index,triples_index_tensor_sorted = utils.build_relation_tail_index(triples_index_tensor,target_entities_tensor)
 
@@ -59,8 +57,10 @@ triples_index_tensor_sorted = triples_index_tensor_sorted.cuda()
 relation_tail_index = relation_tail_index.cuda()
 target_entities_tensor = target_entities_tensor.cuda()
 
-# training loop
+# training loop, the walks and windows of an epoch are written over the ones of the previous epoch
 from tqdm import tqdm
+walks = None
+windows = None
 for i in tqdm(range(epochs)):
 
     # perform walk
@@ -70,16 +70,18 @@ for i in tqdm(range(epochs)):
                             walk_length=walk_length,
                             seed=10,
                             padding_idx=padding_idx,
-                            restart=False
+                            restart=False,
+                            walks_per_node=walks_per_node,
+                            out=walks
                             )
 
-    # amplify walks
-    walks = walks.repeat_interleave(num_negatives,0)
-
-    # split walk to windows
-    target_triples,pos_context,neg_context = rw.to_windows_triples_sg(walks=walks,
-                                                                    window_size=window_size,
-                                                                    num_nodes=len(all_entities_list),
-                                                                    padding_idx=padding_idx,
-                                                                    triples=triples_index_tensor_sorted,
-                                                                    seed=20)
\ No newline at end of file
+    # split walk to windows, with num_negatives sets of negatives per window
+    windows = rw.to_windows_triples_sg(walks=walks,
+                                       window_size=window_size,
+                                       num_nodes=len(all_entities_list),
+                                       padding_idx=padding_idx,
+                                       triples=triples_index_tensor_sorted,
+                                       seed=20,
+                                       num_negatives=num_negatives,
+                                       out=windows)
+    target_triples,pos_context,neg_context = windows
\ No newline at end of file
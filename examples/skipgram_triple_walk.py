@@ -67,9 +67,12 @@ target_triples,pos_context,neg_context = rw.to_windows_triples_sg(walks=walks,
 
 
 # create the model
-model = SkipGramTriple(num_nodes=len(all_entities_list),
+# with separate vocabularies the relation tables only hold the relations
+model = SkipGramTriple(num_nodes=None,
                                     embedding_dim=32,
-                                    padding_index=padding_idx
+                                    padding_index=padding_idx,
+                                    num_entities=len(entities_map),
+                                    num_relations=len(relations_map)
                                 )
 
 # move model to gpu
@@ -1,54 +1,84 @@
 import setuptools
 from setuptools import find_packages
-from torch.utils.cpp_extension import BuildExtension, CppExtension, CUDAExtension
+from torch.utils.cpp_extension import BuildExtension, CppExtension, CUDAExtension, CUDA_HOME
 import glob
 import os
+import sys
 import torch
 
 with open('README.md') as f:
     long_description = f.read()
 
+def use_cuda():
+    # FORCE_CUDA=1 builds the cuda kernels without a visible gpu (e.g. in a docker build),
+    # FORCE_CPU=1 builds only the cpu kernels even when cuda is available
+    if os.getenv('FORCE_CPU', '0') == '1':
+        return False
+    if os.getenv('FORCE_CUDA', '0') == '1':
+        return CUDA_HOME is not None
+    return torch.cuda.is_available() and CUDA_HOME is not None
+
+def cxx_flags():
+    if sys.platform == 'win32':
+        return ['/O2', '/openmp', '-DAT_PARALLEL_OPENMP']
+
+    flags = ['-O3', '-funroll-loops', '-fno-math-errno']
+
+    # openmp, apple clang has no -fopenmp by default
+    if sys.platform != 'darwin':
+        flags += ['-fopenmp', '-DAT_PARALLEL_OPENMP']
+
+    # the default build runs on any cpu of the platform, set TRIPLE_WALK_ARCH=native
+    # (or any -march value) to tune the kernels for the build machine
+    arch = os.getenv('TRIPLE_WALK_ARCH', '')
+    if arch != '':
+        flags += [f'-march={arch}']
+
+    return flags
+
 def get_extension():
 
-    # get the sources
-    sources = glob.glob('csrc/**/*.cpp',recursive=True)
-    #sources.extend(glob.glob('csrc/**/*.h',recursive=True))
+    with_cuda = use_cuda()
 
-    # get the cuda sources
-    sources_cuda = glob.glob('csrc/**/*.cu',recursive=True)   
-    sources.extend(sources_cuda)
+    # get the sources, only the cpu kernels without cuda
+    sources = glob.glob('csrc/cpu/*.cpp') + ['csrc/rw_init.cpp']
+    if with_cuda:
+        sources.extend(glob.glob('csrc/cuda/*.cu'))
 
     # remove file names having hip
-    sources_cleaned = []
-    for file_name in sources:
-        if "hip" not in file_name:
-            sources_cleaned.append(file_name)
+    sources = [file_name for file_name in sources if "hip" not in file_name]
 
-    sources = sources_cleaned
-    
     print(sources)
 
-    # openmp
-    extra_compile_args = {'cxx': ['-O2']}
-    extra_compile_args['cxx'] += ['-DAT_PARALLEL_OPENMP']
-    extra_compile_args['cxx'] += ['-fopenmp']
+    extra_compile_args = {'cxx': cxx_flags()}
+    extra_link_args = ['-fopenmp'] if sys.platform not in ('win32', 'darwin') else []
+
+    # set include dirs
+    include_dirs = ["csrc"]
+
+    if with_cuda == False:
+        return CppExtension(
+            'triple_walk_native',
+            sources=sources,
+            include_dirs=include_dirs,
+            extra_compile_args=extra_compile_args,
+            extra_link_args=extra_link_args
+        )
 
     # cuda
-    define_macros = []
-    define_macros += [('WITH_CUDA', None)]
+    define_macros = [('WITH_CUDA', None)]
     nvcc_flags = os.getenv('NVCC_FLAGS', '')
     nvcc_flags = [] if nvcc_flags == '' else nvcc_flags.split(' ')
     nvcc_flags += ['-arch=sm_52', '-O2']
     extra_compile_args['nvcc'] = nvcc_flags
 
-    # set include dirs
-    include_dirs = ["csrc"]
-
     extension = CUDAExtension(
         'triple_walk_native',
         sources=sources,
         include_dirs=include_dirs,
-        extra_compile_args=extra_compile_args
+        define_macros=define_macros,
+        extra_compile_args=extra_compile_args,
+        extra_link_args=extra_link_args
     )
 
     return extension
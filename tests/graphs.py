@@ -0,0 +1,25 @@
+from typing import NamedTuple
+import torch
+from triple_walk import utils
+
+
+class RandomGraph(NamedTuple):
+    triples: torch.Tensor
+    triples_sorted: torch.Tensor
+    relation_tail_index: torch.Tensor
+    num_entities: int
+    num_relations: int
+    padding_idx: int
+
+
+def random_graph(num_entities=50,num_triples=300,num_relations=4,num_heads=None,seed=5):
+    """A random graph of the tests, only the first num_heads entities have outgoing triples
+    so that the others are dead ends. All entities are heads by default."""
+    generator = torch.Generator().manual_seed(seed)
+    num_heads = num_entities if num_heads is None else num_heads
+    heads = torch.randint(0,num_heads,(num_triples,),generator=generator)
+    tails = torch.randint(0,num_entities,(num_triples,),generator=generator)
+    relations = torch.randint(num_entities,num_entities+num_relations,(num_triples,),generator=generator)
+    triples = torch.stack((heads,relations,tails),dim=1)
+    relation_tail_index,triples_sorted = utils.build_relation_tail_index(triples,torch.arange(num_entities))
+    return RandomGraph(triples,triples_sorted,relation_tail_index,num_entities,num_relations,num_entities+num_relations)
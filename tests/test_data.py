@@ -0,0 +1,83 @@
+import torch
+from torch.utils.data import DataLoader
+import pytest
+from triple_walk.data import Prefetcher, TripleWalkDataset
+from tests.graphs import random_graph
+
+def create_graph():
+    graph = random_graph(num_heads=45)
+    return graph.triples_sorted, graph.relation_tail_index, torch.arange(graph.num_entities), graph.padding_idx
+
+def start_nodes(batches,walk_length):
+    # the first window of every walk has the start node as the head of its target
+    target_triples = torch.cat([batch[0] for batch in batches])
+    return target_triples[::walk_length,0]
+
+def test_triple_walk_dataset_batches():
+    triples, relation_tail_index, target_nodes, padding_idx = create_graph()
+    walk_length = 6
+
+    for mode in ["sg","cbow"]:
+        dataset = TripleWalkDataset(triples,relation_tail_index,target_nodes,walk_length,2,padding_idx,
+                                    batch_size=32,mode=mode,walks_per_node=3,chunk_size=7,seed=10)
+        batches = list(dataset)
+
+        # every batch but the last is full
+        assert all(len(batch[0]) == 32 for batch in batches[:-1])
+        assert sum(len(batch[0]) for batch in batches) == len(target_nodes) * 3 * walk_length
+
+        # every node starts walks_per_node walks
+        starts,_ = torch.sort(start_nodes(batches,walk_length))
+        assert torch.equal(starts,target_nodes.repeat_interleave(3))
+
+        # the same epoch gives the same batches and a new epoch new ones
+        again = list(dataset)
+        assert all(torch.equal(x,y) for batch, batch_again in zip(batches,again) for x, y in zip(batch,batch_again))
+        dataset.set_epoch(1)
+        next_epoch = list(dataset)
+        assert not torch.equal(batches[0][1],next_epoch[0][1])
+
+    # num_negatives sets of negatives per window from the fused kernels
+    for mode, negatives_index, set_shape in [("sg",2,(2,4,3)),("cbow",1,(2,3))]:
+        dataset = TripleWalkDataset(triples,relation_tail_index,target_nodes,walk_length,2,padding_idx,
+                                    batch_size=32,mode=mode,num_negatives=2,seed=10)
+        batch = next(iter(dataset))
+        assert batch[negatives_index].shape == (32,) + set_shape
+
+def test_triple_walk_dataset_workers():
+    triples, relation_tail_index, target_nodes, padding_idx = create_graph()
+    walk_length = 6
+
+    dataset = TripleWalkDataset(triples,relation_tail_index,target_nodes,walk_length,2,padding_idx,
+                                batch_size=12,walks_per_node=2,seed=10)
+    loader = DataLoader(dataset,batch_size=None,num_workers=2)
+    batches = list(loader)
+
+    # the shards of the workers are disjoint and cover all target nodes
+    starts,_ = torch.sort(start_nodes(batches,walk_length))
+    assert torch.equal(starts,target_nodes.repeat_interleave(2))
+
+def test_prefetcher():
+    triples, relation_tail_index, target_nodes, padding_idx = create_graph()
+    dataset = TripleWalkDataset(triples,relation_tail_index,target_nodes,6,2,padding_idx,
+                                batch_size=16,walks_per_node=2,chunk_size=5,seed=10)
+
+    # the same batches in the same order
+    prefetcher = Prefetcher(dataset,depth=3)
+    batches = list(prefetcher)
+    expected = list(dataset)
+    assert len(batches) == len(expected)
+    assert all(torch.equal(x,y) for batch, batch_expected in zip(batches,expected) for x, y in zip(batch,batch_expected))
+    assert prefetcher.produce_seconds > 0
+    assert 0 <= prefetcher.hidden_seconds <= prefetcher.produce_seconds
+
+    # stopping early releases the producer and errors reach the consumer
+    for batch in prefetcher:
+        break
+
+    def failing():
+        yield 1
+        raise KeyError("broken")
+
+    with pytest.raises(KeyError):
+        list(Prefetcher(failing()))
@@ -1,10 +1,11 @@
 import unittest
 from triple_walk import utils
 from triple_walk import rw
-from triple_walk.model import CBOWTriple, SkipGramTriple
+from triple_walk.model import CBOWTriple, SkipGramTriple, sample_shared_negatives
 import torch
 import numpy as np
 import pandas as pd
+from tests.graphs import random_graph
 
 
 class ModelTest(unittest.TestCase):
@@ -77,6 +78,12 @@ class ModelTest(unittest.TestCase):
 
         assert loss != 0, "loss cannot be zero"
 
+        # gathering the windows from the walks gives the same loss
+        neg_index = rw.to_windows_triples_cbow_index(walks,4,padding_idx,triples_index_tensor_sorted,seed=20)
+        window_offsets = torch.arange(len(neg_index),dtype=torch.int32)
+        loss_walks = model.forward_walks(walks,window_offsets,neg_index,triples_index_tensor_sorted,window_size=4)
+        assert torch.allclose(loss,loss_walks)
+
 
     def test_model_skipgram(self):
     
@@ -146,6 +153,16 @@ class ModelTest(unittest.TestCase):
 
         assert loss != 0, "loss cannot be zero"
 
+        # int32 indices give the same loss
+        loss_int32 = model(target_triples.int(),pos_context.int(),neg_context.int())
+        assert torch.allclose(loss,loss_int32)
+
+        # gathering the windows from the walks gives the same loss
+        neg_index = rw.to_windows_triples_sg_index(walks,4,triples_index_tensor_sorted,seed=20)
+        window_offsets = torch.arange(len(neg_index),dtype=torch.int32)
+        loss_walks = model.forward_walks(walks,window_offsets,neg_index,triples_index_tensor_sorted,window_size=4)
+        assert torch.allclose(loss,loss_walks)
+
         # get head embeddings
         head_embedding = model.get_head_embedding(to_cpu=False)
 
@@ -166,3 +183,198 @@ class ModelTest(unittest.TestCase):
         
 
 
+
+    def test_model_separate_vocabularies(self):
+
+        # 5 entities, 3 relations and the padding index
+        _, triples_sorted, relation_tail_index, num_entities, num_relations, padding_idx = random_graph(5,40,3,seed=0)
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,torch.arange(num_entities),walk_length=6,padding_idx=padding_idx,seed=1)
+
+        sg_windows = rw.to_windows_triples_sg(walks,4,num_entities,padding_idx,triples_sorted,seed=2)
+        cbow_windows = rw.to_windows_triples_cbow(walks,4,num_entities,padding_idx,triples_sorted,seed=2)
+
+        for model_class, windows in [(SkipGramTriple,sg_windows),(CBOWTriple,cbow_windows)]:
+            model = model_class(num_nodes=padding_idx,embedding_dim=8,padding_index=padding_idx)
+            model_small = model_class(num_nodes=None,embedding_dim=8,padding_index=padding_idx,
+                                      num_entities=num_entities,num_relations=num_relations)
+
+            # the head and tail tables only hold the entities and the relation tables the relations
+            self.assertEqual(model_small.target_head_embedding.num_embeddings,num_entities+1)
+            self.assertEqual(model_small.context_rel_embedding.num_embeddings,num_relations+1)
+
+            # with the same rows both models give the same loss
+            entity_rows = list(range(num_entities)) + [padding_idx]
+            relation_rows = list(range(num_entities,padding_idx)) + [padding_idx]
+            with torch.no_grad():
+                for name in ["target_head","target_tail","context_head","context_tail"]:
+                    getattr(model_small,name+"_embedding").weight.copy_(getattr(model,name+"_embedding").weight[entity_rows])
+                for name in ["target_rel","context_rel"]:
+                    getattr(model_small,name+"_embedding").weight.copy_(getattr(model,name+"_embedding").weight[relation_rows])
+
+            self.assertTrue(torch.allclose(model(*windows),model_small(*windows)))
+
+        with self.assertRaises(ValueError):
+            SkipGramTriple(num_nodes=3,embedding_dim=8,padding_index=padding_idx,num_entities=num_entities,num_relations=num_relations)
+
+    def test_model_sparse(self):
+
+        _, triples_sorted, relation_tail_index, num_entities, num_relations, padding_idx = random_graph(20,100,3,seed=0)
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,torch.arange(num_entities),walk_length=8,padding_idx=padding_idx,seed=1)
+        windows = rw.to_windows_triples_sg(walks,2,num_entities,padding_idx,triples_sorted,seed=2)
+
+        # sparse gradients give the same sgd steps as dense ones
+        models = {}
+        for sparse in [False,True]:
+            torch.manual_seed(0)
+            model = SkipGramTriple(num_nodes=None,embedding_dim=8,padding_index=padding_idx,
+                                   num_entities=num_entities,num_relations=num_relations,sparse=sparse)
+            optimizer = torch.optim.SGD(model.parameters(),lr=0.1)
+            for _ in range(5):
+                optimizer.zero_grad()
+                model(*windows).backward()
+                optimizer.step()
+            models[sparse] = model
+
+        self.assertTrue(models[True].target_head_embedding.weight.grad.is_sparse)
+        for dense_param, sparse_param in zip(models[False].parameters(),models[True].parameters()):
+            self.assertTrue(torch.allclose(dense_param,sparse_param,atol=1e-6))
+
+        # and SparseAdam trains the sparse model
+        model = models[True]
+        optimizer = torch.optim.SparseAdam(list(model.parameters()),lr=0.05)
+        initial_loss = model(*windows).item()
+        for _ in range(20):
+            optimizer.zero_grad()
+            model(*windows).backward()
+            optimizer.step()
+        self.assertLess(model(*windows).item(),initial_loss)
+
+    def test_model_num_negatives(self):
+
+        _, triples_sorted, relation_tail_index, num_entities, num_relations, padding_idx = random_graph(20,100,3,seed=0)
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,torch.arange(num_entities),walk_length=8,padding_idx=padding_idx,seed=1)
+
+        windows = {
+            SkipGramTriple: rw.to_windows_triples_sg_index(walks,2,triples_sorted,seed=2,num_negatives=3),
+            CBOWTriple: rw.to_windows_triples_cbow_index(walks,2,padding_idx,triples_sorted,seed=2,num_negatives=3),
+        }
+        window_offsets = torch.arange(len(windows[SkipGramTriple]),dtype=torch.int32)
+
+        # the loss with several sets of negatives is the mean of the losses of the sets
+        for model_class, neg_index in windows.items():
+            model = model_class(num_nodes=padding_idx,embedding_dim=8,padding_index=padding_idx)
+            loss = model.forward_walks(walks,window_offsets,neg_index,triples_sorted,2)
+            set_losses = [model.forward_walks(walks,window_offsets,neg_index[:,negative],triples_sorted,2) for negative in range(3)]
+            self.assertTrue(torch.allclose(loss,torch.stack(set_losses).mean()))
+
+            with self.assertRaises(RuntimeError):
+                model.train_walks(walks,window_offsets,neg_index,triples_sorted,2,lr=0.5)
+
+    def test_model_shared_negatives(self):
+
+        _, triples_sorted, relation_tail_index, num_entities, num_relations, padding_idx = random_graph(20,100,3,seed=0)
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,torch.arange(num_entities),walk_length=8,padding_idx=padding_idx,seed=1)
+        target_triples, pos_context, _ = rw.to_windows_triples_sg(walks,2,num_entities,padding_idx,triples_sorted,seed=2)
+
+        generator = torch.Generator().manual_seed(0)
+        neg_triples = sample_shared_negatives(triples_sorted,16,generator=generator)
+        self.assertEqual(neg_triples.shape,(16,3))
+        self.assertTrue((neg_triples[:,None,:] == triples_sorted[None,:,:]).all(dim=2).any(dim=1).all())
+
+        model = SkipGramTriple(num_nodes=None,embedding_dim=8,padding_index=padding_idx,
+                               num_entities=num_entities,num_relations=num_relations,sparse=True)
+
+        # the loss of forward with the shared negatives as the negatives of every window
+        loss = model.forward_shared(target_triples,pos_context,neg_triples)
+        expected = model(target_triples,pos_context,neg_triples.expand(len(target_triples),-1,-1))
+        self.assertTrue(torch.allclose(loss,expected))
+        loss.backward()
+        shared_grads = [param.grad.to_dense().clone() for param in model.parameters()]
+        model.zero_grad()
+        expected.backward()
+        for shared_grad, param in zip(shared_grads,model.parameters()):
+            self.assertTrue(torch.allclose(shared_grad,param.grad.to_dense(),atol=1e-6))
+        model.zero_grad()
+
+        # padding in the context does not change the loss
+        padded_context = torch.cat((pos_context,torch.full_like(pos_context[:,:1],padding_idx)),dim=1)
+        self.assertTrue(torch.allclose(loss,model.forward_shared(target_triples,padded_context,neg_triples)))
+
+        optimizer = torch.optim.SparseAdam(list(model.parameters()),lr=0.05)
+        initial_loss = loss.item()
+        for _ in range(20):
+            optimizer.zero_grad()
+            model.forward_shared(target_triples,pos_context,neg_triples).backward()
+            optimizer.step()
+        self.assertLess(model.forward_shared(target_triples,pos_context,neg_triples).item(),initial_loss)
+
+    def test_model_train_walks(self):
+
+        _, triples_sorted, relation_tail_index, num_entities, num_relations, padding_idx = random_graph(20,100,3,seed=0)
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,torch.arange(num_entities),walk_length=8,padding_idx=padding_idx,seed=1)
+
+        windows = {
+            SkipGramTriple: rw.to_windows_triples_sg_index(walks,2,triples_sorted,seed=2),
+            CBOWTriple: rw.to_windows_triples_cbow_index(walks,2,padding_idx,triples_sorted,seed=2),
+        }
+        window_offsets = torch.arange(len(windows[SkipGramTriple]),dtype=torch.int32)
+
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            for model_class, neg_index in windows.items():
+                for num_nodes, model_entities, model_relations in [(padding_idx,None,None),(None,num_entities,num_relations)]:
+                    torch.manual_seed(0)
+                    native = model_class(num_nodes=num_nodes,embedding_dim=8,padding_index=padding_idx,
+                                         num_entities=model_entities,num_relations=model_relations)
+                    torch.manual_seed(0)
+                    reference = model_class(num_nodes=num_nodes,embedding_dim=8,padding_index=padding_idx,
+                                            num_entities=model_entities,num_relations=model_relations)
+
+                    # the native step of every window is an SGD step on that window alone
+                    batch = window_offsets[:30]
+                    optimizer = torch.optim.SGD(reference.parameters(),lr=0.5)
+                    losses = []
+                    for window in batch:
+                        optimizer.zero_grad()
+                        loss = reference.forward_walks(walks,window.view(1),neg_index,triples_sorted,2)
+                        loss.backward()
+                        optimizer.step()
+                        losses.append(loss.item())
+
+                    loss = native.train_walks(walks,batch,neg_index,triples_sorted,2,lr=0.5)
+                    self.assertAlmostEqual(loss,np.mean(losses),places=4)
+                    for native_param, reference_param in zip(native.parameters(),reference.parameters()):
+                        self.assertTrue(torch.allclose(native_param,reference_param,atol=1e-5))
+        finally:
+            torch.set_num_threads(num_threads)
+
+        # with all threads the loss of the windows goes down
+        model = SkipGramTriple(num_nodes=padding_idx,embedding_dim=8,padding_index=padding_idx)
+        neg_index = windows[SkipGramTriple]
+        initial_loss = model.train_walks(walks,window_offsets,neg_index,triples_sorted,2,lr=0.5)
+        for _ in range(20):
+            loss = model.train_walks(walks,window_offsets,neg_index,triples_sorted,2,lr=0.5)
+        self.assertLess(loss,initial_loss)
+
+        # windows of other walks and negatives of other triples are rejected before training
+        for model_class, neg_index in windows.items():
+            model = model_class(num_nodes=padding_idx,embedding_dim=8,padding_index=padding_idx)
+            bad_offsets = window_offsets.clone()
+            bad_offsets[5] = len(neg_index)
+            bad_negatives = neg_index.clone()
+            bad_negatives[window_offsets[3]] = len(triples_sorted)
+            for arguments in [(walks,bad_offsets,neg_index,triples_sorted),
+                              (walks,window_offsets,bad_negatives,triples_sorted),
+                              (walks[:10],window_offsets,neg_index,triples_sorted)]:
+                with self.assertRaises(RuntimeError):
+                    model.train_walks(*arguments,2,lr=0.5)
+
+            # and ids without rows in the tables of a smaller model, entities, relations or both
+            for model_entities, model_relations in [(15,8),(20,1),(10,2)]:
+                model = model_class(num_nodes=None,embedding_dim=8,padding_index=padding_idx,
+                                    num_entities=model_entities,num_relations=model_relations)
+                with self.assertRaisesRegex(RuntimeError,"rows in the embedding tables"):
+                    model.train_walks(walks,window_offsets,neg_index,triples_sorted,2,lr=0.5)
+                with self.assertRaises(IndexError):
+                    model.forward_walks(walks,window_offsets,neg_index,triples_sorted,2)
@@ -0,0 +1,92 @@
+import torch
+import networkx as nx
+from triple_walk import utils
+from triple_walk import rw
+import unittest
+
+
+class WalkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = nx.DiGraph()
+        self.graph.add_edges_from([(0,1),(0,2),(1,2),(1,3),(2,0),(2,3),(3,4),(4,0),(4,1)])
+        # node 5 has no out edges
+        self.graph.add_edge(3,5)
+
+        self.row_ptr, self.col_idx = utils.to_csr(self.graph)
+        self.target_nodes = utils.nodes_tensor(self.graph)
+        self.edges = set(self.graph.edges())
+
+        edge_list, _ = utils.to_edge_list_indexed(self.graph)
+        self.node_edges_idx, self.edge_list = utils.build_node_edge_index(edge_list,self.target_nodes)
+        self.padding_idx = self.graph.number_of_nodes()
+
+    def assert_valid_csr_walks(self,walks):
+        for walk in walks.tolist():
+            for node, next_node in zip(walk[:-1],walk[1:]):
+                # nodes without neighbors repeat themselves
+                self.assertTrue((node,next_node) in self.edges or (node == next_node == 5))
+
+    def assert_valid_edge_list_walks(self,walks,restart):
+        for walk in walks.tolist():
+            for node, next_node in zip(walk[:-1],walk[1:]):
+                if node == 5:
+                    self.assertEqual(next_node,self.padding_idx)
+                elif node == self.padding_idx:
+                    self.assertEqual(next_node,walk[0] if restart else self.padding_idx)
+                else:
+                    self.assertIn((node,next_node),self.edges)
+
+    def test_walk_cpu(self):
+        for p, q in [(1.0,1.0),(0.5,2.0),(4.0,0.25)]:
+            walks = rw.walk(self.row_ptr,self.col_idx,self.target_nodes,walk_length=20,seed=7,p=p,q=q)
+            self.assertEqual(walks.shape,(len(self.target_nodes),21))
+            self.assertTrue(torch.equal(walks[:,0],self.target_nodes))
+            self.assert_valid_csr_walks(walks)
+
+            # the walks do not depend on the number of threads
+            num_threads = torch.get_num_threads()
+            try:
+                torch.set_num_threads(1)
+                walks_single = rw.walk(self.row_ptr,self.col_idx,self.target_nodes,walk_length=20,seed=7,p=p,q=q)
+            finally:
+                torch.set_num_threads(num_threads)
+            self.assertTrue(torch.equal(walks,walks_single))
+
+    def test_walk_edge_list_cpu(self):
+        for restart in [True,False]:
+            for p, q in [(1.0,1.0),(0.5,2.0)]:
+                walks = rw.walk_edge_list(self.edge_list,self.node_edges_idx,self.target_nodes,
+                                          walk_length=20,padding_idx=self.padding_idx,seed=3,p=p,q=q,restart=restart)
+                self.assertEqual(walks.shape,(len(self.target_nodes),21))
+                self.assert_valid_edge_list_walks(walks,restart)
+
+    def test_walk_int32_cpu(self):
+        walks = rw.walk(self.row_ptr,self.col_idx,self.target_nodes,walk_length=10,seed=1,p=0.5,q=2.0)
+        walks_int32 = rw.walk(self.row_ptr.int(),self.col_idx.int(),self.target_nodes.int(),walk_length=10,seed=1,p=0.5,q=2.0)
+        self.assertEqual(walks_int32.dtype,torch.int32)
+        self.assertTrue(torch.equal(walks,walks_int32.long()))
+
+    def test_to_windows_cpu(self):
+        walks = rw.walk(self.row_ptr,self.col_idx,self.target_nodes,walk_length=6,seed=1)
+        target, pos_windows, neg_windows = rw.to_windows(walks,3,self.graph.number_of_nodes(),seed=1)
+        self.assertEqual(len(target),len(pos_windows))
+        self.assertEqual(pos_windows.shape[1],2)
+        self.assertEqual(neg_windows.shape,pos_windows.shape)
+
+    @unittest.skipIf(torch.cuda.is_available() == False,"cuda is not available")
+    def test_walk_gpu(self):
+        for p, q in [(1.0,1.0),(0.5,2.0)]:
+            walks = rw.walk(self.row_ptr,self.col_idx,self.target_nodes,walk_length=20,seed=7,p=p,q=q)
+            walks_gpu = rw.walk(self.row_ptr.cuda(),self.col_idx.cuda(),self.target_nodes.cuda(),walk_length=20,seed=7,p=p,q=q)
+            self.assertTrue(torch.equal(walks,walks_gpu.cpu()))
+
+            walks = rw.walk_edge_list(self.edge_list,self.node_edges_idx,self.target_nodes,
+                                      walk_length=20,padding_idx=self.padding_idx,seed=7,p=p,q=q)
+            walks_gpu = rw.walk_edge_list(self.edge_list.cuda(),self.node_edges_idx.cuda(),self.target_nodes.cuda(),
+                                          walk_length=20,padding_idx=self.padding_idx,seed=7,p=p,q=q)
+            self.assertTrue(torch.equal(walks,walks_gpu.cpu()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import torch
 from triple_walk import utils
 from triple_walk import rw
 import unittest
+from tests.graphs import random_graph
 
 
 class TriplesTest(unittest.TestCase):
@@ -63,19 +64,291 @@ class TriplesTest(unittest.TestCase):
                                 restart=False
                                 )
         
-        walks_gt = torch.Tensor([[0, 5, 2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8],
-                                [0, 6, 3, 6, 2, 6, 4, 8, 8, 8, 8, 8, 8],
+        walks_gt = torch.Tensor([[0, 5, 1, 6, 3, 7, 0, 6, 3, 6, 2, 6, 4],
+                                [0, 5, 2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8],
                                 [1, 6, 3, 6, 2, 7, 1, 6, 3, 6, 2, 7, 1],
-                                [1, 6, 3, 6, 2, 7, 1, 6, 3, 6, 2, 6, 4],
-                                [2, 7, 1, 6, 3, 7, 0, 5, 2, 6, 4, 8, 8],
-                                [2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8],
+                                [1, 6, 3, 7, 0, 5, 1, 6, 3, 6, 2, 6, 4],
+                                [2, 7, 1, 6, 3, 6, 2, 6, 4, 8, 8, 8, 8],
+                                [2, 7, 1, 6, 3, 7, 0, 5, 1, 6, 3, 7, 0],
+                                [3, 7, 0, 5, 1, 6, 3, 7, 0, 5, 2, 6, 4],
                                 [3, 6, 2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8],
-                                [3, 7, 0, 5, 2, 7, 1, 6, 3, 6, 2, 6, 4],
                                 [4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8],
                                 [4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8]]).to(int)
 
         self.assertTrue(torch.equal(walks,walks_gt),"Triple walks on cpu do not match the ground truth")
 
+    def test_uniform_walk_edge_triples_threads(self):
+
+        # a random graph large enough to be split across threads
+        _, triples_tensor_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(500,5000,10)
+        target_nodes = torch.arange(num_entities).repeat_interleave(20)
+
+        # the walkers hand GRAIN_SIZE (32768) elements to a thread at once, so these walks are split
+        # into chunks for every thread
+        walk_size = (20*2)+1
+        self.assertGreaterEqual(len(target_nodes),4*(32768 // walk_size))
+
+        # the walks only depend on the seed, not on how the work is split across threads
+        num_threads = torch.get_num_threads()
+        walks = []
+        try:
+            for threads in [1,4]:
+                torch.set_num_threads(threads)
+                walks.append(rw.walk_triples(triples_indexed=triples_tensor_sorted,
+                                            relation_tail_index=relation_tail_index,
+                                            target_nodes=target_nodes,
+                                            walk_length=20,
+                                            seed=10,
+                                            padding_idx=padding_idx,
+                                            restart=False
+                                            ))
+        finally:
+            torch.set_num_threads(num_threads)
+
+        self.assertTrue(torch.equal(walks[0],walks[1]),"Triple walks depend on the number of threads")
+
+
+    def test_biased_walk_triples_cpu(self):
+
+        # a random graph with dead ends
+        triples_tensor, triples_tensor_sorted, relation_tail_index, num_entities, num_relations, padding_idx = \
+            random_graph(100,2000,5,num_heads=95,seed=3)
+        target_nodes = torch.arange(num_entities).repeat_interleave(10)
+        sorted_tails = utils.build_sorted_tails(triples_tensor_sorted)
+        for start, end in relation_tail_index.tolist():
+            if start != -1:
+                self.assertEqual(sorted_tails[start:end+1].tolist(),sorted(triples_tensor_sorted[start:end+1,2].tolist()))
+
+        def biased_walks(p,q,relation_bias):
+            return rw.walk_triples(triples_indexed=triples_tensor_sorted,
+                                   relation_tail_index=relation_tail_index,
+                                   target_nodes=target_nodes,
+                                   walk_length=20,
+                                   seed=4,
+                                   padding_idx=padding_idx,
+                                   p=p,
+                                   q=q,
+                                   relation_bias=relation_bias,
+                                   sorted_tails=sorted_tails)
+
+        # every step follows a triple of the graph or stays at the padding index
+        all_triples = set(map(tuple,triples_tensor.tolist()))
+        walks = biased_walks(0.5,2.0,2.0)
+        for walk in walks.tolist():
+            for step in range(0,len(walk)-1,2):
+                triple = tuple(walk[step:step+3])
+                if triple[0] == padding_idx or triple[2] == padding_idx:
+                    self.assertEqual(triple[1:],(padding_idx,padding_idx))
+                else:
+                    self.assertIn(triple,all_triples)
+
+        # a low p returns more often and a high relation bias repeats relations more often
+        def repeat_fraction(walks,first,distance):
+            # how often position i + distance repeats position i, for every other position from first on
+            earlier = walks[:,first:-distance:2]
+            later = walks[:,first+distance::2]
+            mask = (earlier != padding_idx) & (later != padding_idx)
+            return ((earlier == later) & mask).sum().item() / mask.sum().item()
+
+        uniform = biased_walks(1.0,1.0,1.0)
+        self.assertGreater(repeat_fraction(biased_walks(0.1,1.0,1.0),0,4),2 * repeat_fraction(uniform,0,4))
+        self.assertGreater(repeat_fraction(biased_walks(1.0,1.0,10.0),1,2),2 * repeat_fraction(uniform,1,2))
+
+        # the walks do not depend on the number of threads
+        num_threads = torch.get_num_threads()
+        try:
+            torch.set_num_threads(1)
+            walks_single = biased_walks(0.5,2.0,2.0)
+        finally:
+            torch.set_num_threads(num_threads)
+        self.assertTrue(torch.equal(walks,walks_single),"Biased triple walks depend on the number of threads")
+
+        # weights that reject almost every proposal still end every step in a triple of the graph
+        single_relation = triples_tensor.clone()
+        single_relation[:,1] = num_entities
+        relation_tail_index,triples_tensor_sorted = utils.build_relation_tail_index(single_relation,torch.arange(num_entities))
+        walks = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=4,p=1e-6,q=1e-6,relation_bias=1e-12)
+        self.assertTrue(((walks[:,1::2] == num_entities) | (walks[:,1::2] == padding_idx)).all())
+
+        for options in [{"p":0.0},{"q":-1.0},{"relation_bias":0.0}]:
+            with self.assertRaises(ValueError):
+                rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=4,**options)
+
+        # biased walks end at dead ends and can not restart
+        self.assertTrue(torch.equal(rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=4,p=0.5,restart=False),
+                                    rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=4,p=0.5)))
+        with self.assertRaises(ValueError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=4,p=0.5,restart=True)
+
+    def test_weighted_walk_triples_cpu(self):
+
+        # entity 0 has four triples with weights 1, 2, 7 and 0
+        num_entities = 5
+        padding_idx = num_entities + 2
+        triples_tensor = torch.tensor([[0,5,1],[0,5,2],[0,6,3],[0,6,4],[1,5,0],[2,6,0],[3,5,0]])
+        weights = torch.tensor([1.0,2.0,7.0,0.0,1.0,1.0,1.0],dtype=torch.float64)
+        relation_tail_index,triples_tensor_sorted = utils.build_relation_tail_index(triples_tensor,torch.arange(num_entities))
+
+        # the alias table gives every triple exactly its share of the weights of its head
+        alias_prob, alias_index = rw.build_alias_table(relation_tail_index,weights)
+        for start, end in relation_tail_index.tolist():
+            if start == -1:
+                continue
+            degree = end - start + 1
+            shares = torch.zeros(degree,dtype=torch.float64)
+            for column in range(start,end+1):
+                shares[column-start] += alias_prob[column].item()
+                shares[alias_index[column].item()-start] += 1.0 - alias_prob[column].item()
+            expected = weights[start:end+1] / weights[start:end+1].sum()
+            self.assertTrue(torch.allclose(shares / degree,expected,atol=1e-6))
+
+        # weights that do not cover the ranges of the index are rejected, not written past
+        with self.assertRaises(RuntimeError):
+            rw.build_alias_table(relation_tail_index,weights[:3])
+
+        # the first steps from entity 0 follow the weights
+        target_nodes = torch.zeros(20000,dtype=torch.int64)
+        walks = rw.walk_triples(triples_indexed=triples_tensor_sorted,
+                                relation_tail_index=relation_tail_index,
+                                target_nodes=target_nodes,
+                                walk_length=3,
+                                seed=10,
+                                padding_idx=padding_idx,
+                                weights=weights)
+        frequencies = torch.bincount(walks[:,2],minlength=num_entities).double() / len(walks)
+        self.assertTrue(torch.allclose(frequencies[1:],torch.tensor([0.1,0.2,0.7,0.0],dtype=torch.float64),atol=0.02))
+        self.assertEqual(frequencies[4].item(),0.0)
+
+        # a precomputed table and int32 indices give the same walks
+        walks_cached = rw.walk_triples(triples_indexed=triples_tensor_sorted.int(),
+                                       relation_tail_index=relation_tail_index.int(),
+                                       target_nodes=target_nodes.int(),
+                                       walk_length=3,
+                                       seed=10,
+                                       padding_idx=padding_idx,
+                                       alias_table=(alias_prob,alias_index.int()))
+        self.assertTrue(torch.equal(walks,walks_cached.long()))
+
+        with self.assertRaises(ValueError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,3,padding_idx,seed=10,p=0.5,weights=weights)
+
+        # weighted walks end at dead ends and can not restart
+        self.assertTrue(torch.equal(rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,3,padding_idx,seed=10,weights=weights,restart=False),walks))
+        for options in [{"weights":weights},{"alias_table":(alias_prob,alias_index)}]:
+            with self.assertRaises(ValueError):
+                rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,3,padding_idx,seed=10,restart=True,**options)
+
+    def test_uniform_walk_edge_triples_int32(self):
+
+        # a random graph with dead ends
+        triples_tensor, _, _, num_entities, _, padding_idx = random_graph(num_heads=45)
+        target_nodes = torch.arange(num_entities)
+
+        # int32 indices give the same walks in an int32 tensor
+        walks = {}
+        for dtype in [torch.int64,torch.int32]:
+            relation_tail_index,triples_tensor_sorted = utils.build_relation_tail_index(triples_tensor.to(dtype),target_nodes.to(dtype))
+            self.assertEqual(relation_tail_index.dtype,dtype)
+            self.assertEqual(triples_tensor_sorted.dtype,dtype)
+            walks[dtype] = rw.walk_triples(triples_indexed=triples_tensor_sorted,
+                                           relation_tail_index=relation_tail_index,
+                                           target_nodes=target_nodes.to(dtype),
+                                           walk_length=10,
+                                           seed=10,
+                                           padding_idx=padding_idx
+                                           )
+
+        self.assertEqual(walks[torch.int32].dtype,torch.int32)
+        self.assertTrue(torch.equal(walks[torch.int32].long(),walks[torch.int64]),"int32 walks do not match the int64 walks")
+
+    def test_walks_per_node_cpu(self):
+
+        # a random graph with dead ends
+        _, triples_tensor_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(num_heads=45)
+        target_nodes = torch.arange(num_entities)
+        generator = torch.Generator().manual_seed(5)
+        weights = torch.rand(len(triples_tensor_sorted),generator=generator,dtype=torch.float64)
+
+        # walks_per_node gives the walks of the repeated target nodes, for every kind of walk
+        for options in [{},{"restart":False},{"p":0.5,"q":2.0,"relation_bias":0.5},{"weights":weights}]:
+            expected = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes.repeat_interleave(4),10,padding_idx,seed=10,**options)
+            walks = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,walks_per_node=4,**options)
+            self.assertTrue(torch.equal(walks,expected),f"walks_per_node does not match repeat_interleave for {list(options)}")
+
+        with self.assertRaises(RuntimeError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,walks_per_node=0)
+
+    def test_walk_triples_out_cpu(self):
+
+        # a random graph with dead ends
+        _, triples_tensor_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(num_heads=45)
+        target_nodes = torch.arange(num_entities)
+        generator = torch.Generator().manual_seed(5)
+        weights = torch.rand(len(triples_tensor_sorted),generator=generator,dtype=torch.float64)
+
+        # the walks of one epoch are refilled in place with the walks of the next, for every kind of walk
+        for options in [{},{"p":0.5,"q":2.0,"relation_bias":0.5},{"weights":weights}]:
+            buffer = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,walks_per_node=2,**options)
+            data_ptr = buffer.data_ptr()
+            expected = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=20,walks_per_node=2,**options)
+            walks = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=20,walks_per_node=2,out=buffer,**options)
+            self.assertEqual(walks.data_ptr(),data_ptr)
+            self.assertTrue(torch.equal(walks,expected),f"walks written to out differ for {list(options)}")
+
+        # the buffer must hold the walks
+        with self.assertRaises(RuntimeError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,out=buffer)
+        with self.assertRaises(RuntimeError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,walks_per_node=2,out=buffer.int())
+        with self.assertRaises(ValueError):
+            rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=10,walks_per_node=2,out=buffer,packed=True)
+
+    def test_walk_triples_restart_cpu(self):
+
+        # a random graph where a third of the entities are dead ends
+        triples_tensor, triples_tensor_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(60,150,num_heads=40)
+        target_nodes = torch.arange(num_entities)
+        graph = set(map(tuple,triples_tensor.tolist()))
+
+        for restart in [False,True]:
+            walks = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=10,restart=restart)
+            for walk in walks.tolist():
+                source = walk[0]
+                for step in range(1,len(walk),2):
+                    previous, relation, tail = walk[step-1], walk[step], walk[step+1]
+                    if tail == padding_idx:
+                        # a dead end ends the walk, with restart only at the source
+                        self.assertTrue(all(value == padding_idx for value in walk[step:]))
+                        if restart:
+                            self.assertEqual(previous,source)
+                        break
+                    if relation == padding_idx:
+                        # a restart jumps back to the source from a dead end
+                        self.assertTrue(restart)
+                        self.assertEqual(tail,source)
+                        self.assertEqual(relation_tail_index[previous,0].item(),-1)
+                    else:
+                        self.assertIn((previous,relation,tail),graph)
+
+        # restarting keeps more of the walks than ending them
+        ended = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=10,restart=False)
+        restarted = rw.walk_triples(triples_tensor_sorted,relation_tail_index,target_nodes,20,padding_idx,seed=10,restart=True)
+        self.assertGreater((restarted[:,2::2] != padding_idx).sum(),(ended[:,2::2] != padding_idx).sum())
+
+    def test_build_relation_tail_index(self):
+
+        # a random graph where some entities have no outgoing triples
+        triples_tensor, triples_tensor_sorted, relation_tail_index, num_entities, _, _ = random_graph(200,2000,10,num_heads=180)
+        self.assertEqual(tuple(relation_tail_index.shape),(num_entities,2))
+
+        # every range holds exactly the triples of its head, in their original order
+        for entity in range(num_entities):
+            expected = triples_tensor[triples_tensor[:,0] == entity]
+            start, end = relation_tail_index[entity].tolist()
+            if len(expected) == 0:
+                self.assertEqual((start,end),(-1,-1))
+            else:
+                self.assertTrue(torch.equal(triples_tensor_sorted[start:end+1],expected))
 
     def test_uniform_walk_edge_triples_gpu(self):
         
@@ -141,16 +414,16 @@ class TriplesTest(unittest.TestCase):
                                 )
 
      
-        walks_gt = torch.Tensor([[0, 5, 1, 6, 3, 6, 2, 7, 1, 6, 3, 6, 2],
+        walks_gt = torch.Tensor([[0, 5, 1, 6, 3, 7, 0, 6, 3, 6, 2, 6, 4],
                                 [0, 5, 2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8],
-                                [1, 6, 3, 7, 0, 5, 1, 6, 3, 7, 0, 5, 2],
-                                [1, 6, 3, 7, 0, 5, 2, 6, 4, 8, 8, 8, 8],
-                                [2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8],
+                                [1, 6, 3, 6, 2, 7, 1, 6, 3, 6, 2, 7, 1],
+                                [1, 6, 3, 7, 0, 5, 1, 6, 3, 6, 2, 6, 4],
                                 [2, 7, 1, 6, 3, 6, 2, 6, 4, 8, 8, 8, 8],
-                                [3, 7, 0, 5, 1, 6, 3, 6, 2, 7, 1, 6, 3],
-                                [3, 7, 0, 5, 1, 6, 3, 7, 0, 5, 1, 6, 3],
+                                [2, 7, 1, 6, 3, 7, 0, 5, 1, 6, 3, 7, 0],
+                                [3, 7, 0, 5, 1, 6, 3, 7, 0, 5, 2, 6, 4],
+                                [3, 6, 2, 6, 4, 8, 8, 8, 8, 8, 8, 8, 8],
                                 [4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8],
-                                [4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8]],).to(int).cuda()
+                                [4, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8]]).to(int).cuda()
 
         self.assertTrue(torch.equal(walks,walks_gt),"Triple walks on gpu do not match the ground truth")
         
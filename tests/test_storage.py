@@ -0,0 +1,172 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import torch
+from triple_walk import ingest
+from triple_walk import rw
+from triple_walk import storage
+from triple_walk import utils
+
+
+class StorageTest(unittest.TestCase):
+
+    def test_save_load_graph(self):
+
+        # triples
+        triples_list = [
+            ("A","r1","B"),
+            ("B","r2","D"),
+            ("A","r1","C"),
+            ("C","r2","E"),
+            ("C","r3","B"),
+            ("A","r2","D"),
+            ("D","r3","A"),
+            ("D","r2","C")
+        ]
+        triple_list_pd = pd.DataFrame(data=triples_list,columns=["head","relation","tail"])
+
+        for dtype in [np.int64,np.int32]:
+            triples_index, entities, relations = utils.to_indexed_triples(triple_list_pd,return_arrays=True,dtype=dtype)
+            triples_index_tensor = torch.from_numpy(triples_index)
+            target_nodes = torch.arange(len(entities),dtype=triples_index_tensor.dtype)
+            relation_tail_index,triples_index_tensor_sorted = utils.build_relation_tail_index(triples_index_tensor,target_nodes)
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory,"graph.twg")
+                storage.save_graph(path,triples_index_tensor_sorted,relation_tail_index,entities=entities,relations=relations)
+                graph = storage.load_graph(path)
+
+                # the tensors are equal to the saved ones
+                self.assertTrue(torch.equal(graph.triples_indexed,triples_index_tensor_sorted))
+                self.assertTrue(torch.equal(graph.relation_tail_index,relation_tail_index))
+                self.assertEqual(graph.entities.tolist(),entities.tolist())
+                self.assertEqual(graph.relations.tolist(),relations.tolist())
+                self.assertEqual(graph.padding_idx,8)
+
+                # and can be walked directly
+                walks = rw.walk_triples(triples_indexed=graph.triples_indexed,
+                                        relation_tail_index=graph.relation_tail_index,
+                                        target_nodes=graph.target_nodes,
+                                        walk_length=6,
+                                        seed=10,
+                                        padding_idx=graph.padding_idx)
+                walks_expected = rw.walk_triples(triples_indexed=triples_index_tensor_sorted,
+                                                 relation_tail_index=relation_tail_index,
+                                                 target_nodes=target_nodes,
+                                                 walk_length=6,
+                                                 seed=10,
+                                                 padding_idx=8)
+                self.assertTrue(torch.equal(walks,walks_expected))
+                del graph
+
+    def test_save_load_inverse_relations(self):
+
+        # a graph with inverse relations keeps the names of its relations and
+        # puts the padding index after the inverse relations
+        triples = torch.tensor([[0,4,1],[1,5,2],[2,4,3],[0,5,3]])
+        relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(4),add_inverse=True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"graph.twg")
+            storage.save_graph(path,triples_sorted,relation_tail_index,entities=np.array(["a","b","c","d"]),relations=np.array(["r1","r2"]))
+            graph = storage.load_graph(path)
+            self.assertEqual(graph.num_relations,4)
+            self.assertEqual(graph.padding_idx,8)
+            self.assertEqual(graph.relations.tolist(),["r1","r2"])
+            del graph
+
+    def test_save_load_alias_table(self):
+        triples = torch.tensor([[0,3,1],[0,4,2],[1,3,2],[2,4,0]])
+        relation_tail_index,triples_sorted = utils.build_relation_tail_index(triples,torch.arange(3))
+        alias_table = rw.build_alias_table(relation_tail_index,torch.tensor([1.0,3.0,1.0,1.0]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"graph.twg")
+            storage.save_graph(path,triples_sorted,relation_tail_index,alias_table=alias_table)
+            graph = storage.load_graph(path)
+
+            self.assertTrue(torch.equal(graph.alias_table[0],alias_table[0]))
+            self.assertTrue(torch.equal(graph.alias_table[1],alias_table[1]))
+            self.assertEqual(graph.num_relations,2)
+            del graph
+
+    def test_ingest_triples(self):
+
+        # triples
+        triples_list = [
+            ("A","r1","B"),
+            ("B","r2","D"),
+            ("A","r1","C"),
+            ("C","r2","E"),
+            ("C","r3","B"),
+            ("A","r2","D"),
+            ("D","r3","A"),
+            ("D","r2","C")
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            tsv_path = os.path.join(directory,"triples.tsv")
+            with open(tsv_path,"w") as f:
+                for triple in triples_list:
+                    f.write("\t".join(triple) + "\n")
+
+            nt_path = os.path.join(directory,"triples.nt")
+            with open(nt_path,"w") as f:
+                for head, relation, tail in triples_list:
+                    f.write(f"<{head}> <{relation}> <{tail}> .\n")
+
+            for path, format, names in [(tsv_path,"tsv",triples_list),
+                                        (nt_path,"nt",[tuple(f"<{name}>" for name in triple) for triple in triples_list])]:
+
+                # small chunks so that several runs are merged
+                graph = ingest.ingest_triples(path,os.path.join(directory,"graph.twg"),format=format,chunk_size=3)
+                self.assertEqual((graph.num_entities,graph.num_relations),(5,3))
+
+                # the ids map back to the names
+                entities = graph.entities.tolist()
+                relations = graph.relations.tolist()
+                entity_ids = {name:index for index, name in enumerate(entities)}
+                relation_ids = {name:index+len(entities) for index, name in enumerate(relations)}
+                triples_tensor = torch.LongTensor([(entity_ids[h],relation_ids[r],entity_ids[t]) for h, r, t in names])
+
+                # and the layout is the one of build_relation_tail_index
+                relation_tail_index,triples_tensor_sorted = utils.build_relation_tail_index(triples_tensor,torch.arange(len(entities)))
+                self.assertTrue(torch.equal(graph.triples_indexed,triples_tensor_sorted))
+                self.assertTrue(torch.equal(graph.relation_tail_index,relation_tail_index))
+                del graph
+
+            # the ids are the ones of to_indexed_triples on all triples for any chunk size,
+            # also when an entity is a tail in one chunk and a head in a later one
+            triples_index, entities_map, relations_map = utils.to_indexed_triples(pd.DataFrame(data=triples_list,columns=["head","relation","tail"]))
+            _, triples_index_sorted = utils.build_relation_tail_index(torch.from_numpy(triples_index),torch.arange(len(entities_map)))
+            for chunk_size in [1,2,3,5,100]:
+                graph = ingest.ingest_triples(tsv_path,os.path.join(directory,"graph.twg"),chunk_size=chunk_size)
+                self.assertEqual(graph.entities.tolist(),sorted(entities_map,key=entities_map.get))
+                self.assertEqual(graph.relations.tolist(),sorted(relations_map,key=relations_map.get))
+                self.assertTrue(torch.equal(graph.triples_indexed,triples_index_sorted))
+                del graph
+
+            # comments and empty lines are skipped, literals and blank nodes are kept and
+            # lines that are not triples are reported
+            with open(nt_path,"w") as f:
+                f.write("# a comment\n\n")
+                f.write('<A> <name> "a . b"@en .\n')
+                f.write('_:b1 <age> "3"^^<http://www.w3.org/2001/XMLSchema#int> .\n')
+                f.write("<A> <r1> <B>\n")
+                f.write("<B> <r2> _:b1 .\n")
+            with self.assertWarns(UserWarning):
+                graph = ingest.ingest_triples(nt_path,os.path.join(directory,"graph.twg"),format="nt",chunk_size=2)
+            self.assertEqual(len(graph.triples_indexed),3)
+            self.assertEqual(sorted(graph.entities.tolist()),sorted(['<A>','"a . b"@en','_:b1','"3"^^<http://www.w3.org/2001/XMLSchema#int>','<B>']))
+            del graph
+            with self.assertRaises(ValueError):
+                ingest.ingest_triples(nt_path,os.path.join(directory,"graph.twg"),format="nt",on_bad_lines="error")
+
+            # files without triples give an empty graph
+            for format in ["tsv","csv","nt"]:
+                empty_path = os.path.join(directory,f"empty.{format}")
+                open(empty_path,"w").close()
+                graph = ingest.ingest_triples(empty_path,os.path.join(directory,"graph.twg"),format=format)
+                self.assertEqual((len(graph.triples_indexed),graph.num_entities,graph.num_relations),(0,0,0))
+                del graph
@@ -0,0 +1,25 @@
+import torch
+from triple_walk.model import CBOWTriple, SkipGramTriple
+from triple_walk.train import train_hogwild
+from tests.graphs import random_graph
+
+def create_graph():
+    graph = random_graph()
+    return graph.triples_sorted, graph.relation_tail_index, torch.arange(graph.num_entities), graph.num_entities
+
+def test_train_hogwild():
+    triples, relation_tail_index, target_nodes, num_entities = create_graph()
+    walk_length = 7
+
+    for model_class, native in [(SkipGramTriple,False),(CBOWTriple,True)]:
+        model = model_class(num_nodes=None,embedding_dim=8,padding_index=num_entities+4,num_entities=num_entities,num_relations=4)
+        initial = [param.detach().clone() for param in model.parameters()]
+
+        num_windows, seconds = train_hogwild(model,triples,relation_tail_index,target_nodes,walk_length,2,num_processes=2,
+                                             epochs=2,lr=0.5,batch_size=16,chunk_size=10,native=native)
+
+        # every node walked once per epoch and the workers trained the tables of the caller
+        assert num_windows == len(target_nodes) * 2 * walk_length
+        assert seconds > 0
+        assert all(param.is_shared() for param in model.parameters())
+        assert all(not torch.equal(param,before) for param, before in zip(model.parameters(),initial))
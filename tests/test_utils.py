@@ -0,0 +1,139 @@
+import unittest
+import networkx as nx
+import numpy as np
+import pandas as pd
+import torch
+from triple_walk import utils
+from triple_walk import rw
+
+
+class UtilsTest(unittest.TestCase):
+
+    def test_to_indexed_triples(self):
+
+        # triples
+        triples_list = [
+            ("A","r1","B"),
+            ("B","r2","D"),
+            ("A","r1","C"),
+            ("C","r2","E"),
+            ("C","r3","B"),
+            ("A","r2","D"),
+            ("D","r3","A"),
+            ("D","r2","C")
+        ]
+
+        triple_list_pd = pd.DataFrame(data=triples_list,columns=["head","relation","tail"])
+
+        # convert to indexed triples
+        triples_index, entities_map,relations_map = utils.to_indexed_triples(triple_list_pd)
+
+        # entities come first and relations after them
+        self.assertEqual(sorted(entities_map.values()),list(range(5)))
+        self.assertEqual(sorted(relations_map.values()),list(range(5,8)))
+
+        # every triple maps back to its names
+        for triple, triple_index in zip(triples_list,triples_index):
+            self.assertEqual(entities_map[triple[0]],triple_index[0])
+            self.assertEqual(relations_map[triple[1]],triple_index[1])
+            self.assertEqual(entities_map[triple[2]],triple_index[2])
+
+        # the arrays are the same vocabularies
+        triples_index_arrays, entities, relations = utils.to_indexed_triples(triple_list_pd,return_arrays=True,dtype=np.int32)
+        self.assertEqual(triples_index_arrays.dtype,np.int32)
+        self.assertTrue(np.array_equal(triples_index_arrays,triples_index))
+        self.assertEqual(dict(zip(entities,range(len(entities)))),entities_map)
+        self.assertEqual(dict(zip(relations,range(len(entities),len(entities)+len(relations)))),relations_map)
+
+    def test_triple_weights(self):
+        # relation 3 is used three times and relation 4 once
+        triples = torch.tensor([[0,3,1],[1,3,2],[2,3,0],[0,4,2]])
+        weights = utils.triple_weights(triples,num_entities=3,
+                                       confidence=[1.0,0.5,1.0,1.0],
+                                       relation_weights=[1.0,2.0],
+                                       frequency_exponent=1.0)
+        self.assertEqual(weights.dtype,torch.float64)
+        self.assertTrue(torch.allclose(weights,torch.tensor([1/3,0.5/3,1/3,2.0],dtype=torch.float64)))
+
+        with self.assertRaises(ValueError):
+            utils.triple_weights(triples,num_entities=3,confidence=[1.0,-1.0,1.0,1.0])
+
+    def test_triple_weights_original_order(self):
+        # confidence given in the order of the unsorted triples, entity 0 has three triples
+        triples = torch.tensor([[2,4,0],[0,4,1],[1,5,2],[0,5,3],[2,5,1],[0,4,2]])
+        confidence = torch.tensor([0.1,0.2,0.3,0.4,0.5,0.6],dtype=torch.float64)
+        relation_tail_index, triples_sorted, order = utils.build_relation_tail_index(triples,torch.arange(4),return_order=True)
+        self.assertTrue(torch.equal(triples_sorted,triples[order]))
+
+        # the weights and the alias table follow the sorted triples
+        weights = utils.triple_weights(triples_sorted,num_entities=4,confidence=confidence[order])
+        expected = {tuple(triple): value for triple, value in zip(triples.tolist(),confidence.tolist())}
+        self.assertEqual(weights.tolist(),[expected[tuple(triple)] for triple in triples_sorted.tolist()])
+
+        alias_prob, alias_index = rw.build_alias_table(relation_tail_index,weights)
+        start, end = relation_tail_index[0].tolist()
+        degree = end - start + 1
+        shares = torch.zeros(degree,dtype=torch.float64)
+        for column in range(start,end+1):
+            shares[column-start] += alias_prob[column].item()
+            shares[alias_index[column].item()-start] += 1.0 - alias_prob[column].item()
+        self.assertTrue(torch.allclose(shares / degree,torch.tensor([0.2,0.4,0.6],dtype=torch.float64) / 1.2,atol=1e-6))
+
+        # the inverse triples point past the triples, order % len(triples) is the triple they reverse
+        _, triples_sorted, order = utils.build_relation_tail_index(triples,torch.arange(4),add_inverse=True,return_order=True)
+        self.assertTrue(torch.equal(triples_sorted,utils.add_inverse_triples(triples,4)[order]))
+        reversed_triples = triples[order % len(triples)]
+        is_inverse = order >= len(triples)
+        self.assertTrue(torch.equal(triples_sorted[is_inverse][:,[2,0]],reversed_triples[is_inverse][:,[0,2]]))
+
+    def test_build_relation_tail_index_inverse(self):
+        # entities 0 - 3 and relations 4 and 5, entity 3 is only a tail
+        triples = torch.tensor([[0,4,1],[1,5,2],[2,4,3],[0,5,3]])
+        relation_tail_index, triples_sorted = utils.build_relation_tail_index(triples,torch.arange(4),add_inverse=True)
+
+        # every triple and its reverse with the inverse relation, sorted by head
+        self.assertEqual(len(triples_sorted),8)
+        self.assertEqual(set(map(tuple,triples_sorted.tolist())),
+                         {(0,4,1),(1,5,2),(2,4,3),(0,5,3),(1,6,0),(2,7,1),(3,6,2),(3,7,0)})
+        self.assertTrue(bool((relation_tail_index[:,0] >= 0).all()))
+        for head, (start, end) in enumerate(relation_tail_index.tolist()):
+            self.assertTrue(bool((triples_sorted[start:end+1,0] == head).all()))
+
+        # inverse relations map back to their relations
+        self.assertEqual(utils.inverse_relation_ids(triples_sorted[:,1],4,2).tolist(),
+                         [{4:6,5:7,6:4,7:5}[relation] for relation in triples_sorted[:,1].tolist()])
+
+        # the relation count can be given, and relation ids outside of it are rejected
+        _, triples_int32 = utils.build_relation_tail_index(triples.int(),torch.arange(4),add_inverse=True,num_relations=3)
+        self.assertEqual(triples_int32.dtype,torch.int32)
+        self.assertEqual(sorted(set(triples_int32[:,1].tolist())),[4,5,7,8])
+        with self.assertRaises(ValueError):
+            utils.build_relation_tail_index(triples,torch.arange(4),add_inverse=True,num_relations=1)
+
+    def test_to_edge_list_indexed(self):
+
+        graph = nx.DiGraph([("b","c"),("a","b"),("c","a"),("c","b")])
+        graph.add_node("d")
+
+        edge_list_indexed, node_index_mapping = utils.to_edge_list_indexed(graph)
+        self.assertEqual(node_index_mapping,{"a":0,"b":1,"c":2,"d":3})
+        self.assertEqual(edge_list_indexed.tolist(),[[1,2],[2,0],[2,1],[0,1]])
+        self.assertEqual(utils.nodes_tensor(graph).tolist(),[0,1,2,3])
+
+        # undirected edges are added in both directions
+        edge_list_indexed, _ = utils.to_edge_list_indexed(graph.to_undirected())
+        self.assertEqual(len(edge_list_indexed),6)
+
+    def test_to_edge_list_indexed_large(self):
+
+        # on a large graph every edge maps to the indices of its nodes, in both directions when undirected
+        graph = nx.relabel_nodes(nx.gnm_random_graph(20000,40000,seed=1),lambda node: f"node{node}")
+        for directed in [True,False]:
+            graph_edges = graph.to_directed() if directed else graph
+            edge_list_indexed, node_index_mapping = utils.to_edge_list_indexed(graph_edges)
+            self.assertEqual(node_index_mapping,{node: index for index, node in enumerate(sorted(graph.nodes()))})
+
+            expected = [[node_index_mapping[head],node_index_mapping[tail]] for head, tail in graph_edges.edges()]
+            if not directed:
+                expected += [[tail,head] for head, tail in expected]
+            self.assertEqual(edge_list_indexed.tolist(),expected)
@@ -1,5 +1,8 @@
+import pytest
 import torch
 from triple_walk import rw
+from triple_walk import model
+from tests.graphs import random_graph
 
 def test_to_windows_triples_cpu():
     # create an array of walks
@@ -29,7 +32,7 @@ def test_to_windows_triples_cpu():
                                         [13,  6, 27],
                                         [27,  0,  7]],
 
-                                        [[10, 10, 27],
+                                        [[11, 10, 27],
                                         [-1, -1, 11],
                                         [-1, -1, -1],
                                         [-1, -1, -1],
@@ -38,23 +41,23 @@ def test_to_windows_triples_cpu():
                                         [27,  0,  7],
                                         [ 7, 14, 20]]]).to(int)
 
-    neg_windows_expected = torch.Tensor([[[18,  5, 19],
+    neg_windows_expected = torch.Tensor([[[ 7, 25, 24],
+                                        [ 1,  8,  6],
                                         [ 7, 25, 24],
-                                        [10,  4, 14],
-                                        [16, 24, 21],
+                                        [26, 20, 23],
                                         [20, 23, 10],
-                                        [18,  5, 19],
-                                        [20,  5, 14],
+                                        [29,  9, 17],
+                                        [29,  9, 17],
                                         [18,  5, 19]],
 
-                                        [[29,  9, 17],
-                                        [18,  5, 19],
+                                        [[26, 20, 23],
                                         [29,  9, 17],
+                                        [18,  5, 19],
+                                        [ 8, 19,  6],
                                         [ 1,  8,  6],
                                         [10,  4, 14],
-                                        [16, 24, 21],
                                         [ 1,  8,  6],
-                                        [16, 24, 21]]]).to(int)
+                                        [10,  4, 14]]]).to(int)
 
 
     assert torch.equal(target_triples[:2],target_triples_expected)
@@ -90,7 +93,7 @@ def test_to_windows_triples_cuda():
                                         [13,  6, 27],
                                         [27,  0,  7]],
 
-                                        [[10, 10, 27],
+                                        [[11, 10, 27],
                                         [-1, -1, 11],
                                         [-1, -1, -1],
                                         [-1, -1, -1],
@@ -99,23 +102,23 @@ def test_to_windows_triples_cuda():
                                         [27,  0,  7],
                                         [ 7, 14, 20]]]).to(int).cuda()
 
-    neg_windows_expected = torch.Tensor([[[18,  5, 19],
-                                        [10,  4, 14],
-                                        [16, 24, 21],
+    neg_windows_expected = torch.Tensor([[[ 7, 25, 24],
                                         [ 1,  8,  6],
-                                        [18,  5, 19],
-                                        [20,  5, 14],
+                                        [ 7, 25, 24],
                                         [26, 20, 23],
-                                        [ 1,  8,  6]],
+                                        [20, 23, 10],
+                                        [29,  9, 17],
+                                        [29,  9, 17],
+                                        [18,  5, 19]],
 
-                                        [[29,  9, 17],
-                                        [20,  5, 14],
+                                        [[26, 20, 23],
                                         [29,  9, 17],
+                                        [18,  5, 19],
+                                        [ 8, 19,  6],
+                                        [ 1,  8,  6],
                                         [10,  4, 14],
-                                        [26, 20, 23],
-                                        [16, 24, 21],
-                                        [10,  4, 14],
-                                        [16, 24, 21]]]).to(int).cuda()
+                                        [ 1,  8,  6],
+                                        [10,  4, 14]]]).to(int).cuda()
 
     assert torch.equal(target_triples[:2],target_triples_expected)
     assert torch.equal(pos_windows[:2],pos_windows_expected)
@@ -141,8 +144,8 @@ def test_to_windows_triples_cbow_cpu():
     pos_triples_expected = torch.Tensor([[11, 10, 27],
                                         [27, 13, 24]]).to(int)
 
-    neg_triples_expected = torch.Tensor([[18,  5, 19],
-                                        [ 7, 25, 24]]).to(int)
+    neg_triples_expected = torch.Tensor([[ 7, 25, 24],
+                                        [ 1,  8,  6]]).to(int)
 
     windows_expected = torch.Tensor([[[-1, -1, 11],
                                     [-1, -1, -1],
@@ -153,7 +156,7 @@ def test_to_windows_triples_cbow_cpu():
                                     [13,  6, 27],
                                     [27,  0,  7]],
 
-                                    [[10, 10, 27],
+                                    [[11, 10, 27],
                                     [-1, -1, 11],
                                     [-1, -1, -1],
                                     [-1, -1, -1],
@@ -185,8 +188,8 @@ def test_to_windows_triples_cbow_gpu():
     pos_triples_expected = torch.Tensor([[11, 10, 27],
                                         [27, 13, 24]]).to(int).cuda()
 
-    neg_triples_expected = torch.Tensor([[18,  5, 19],
-                                        [10,  4, 14]]).to(int).cuda()
+    neg_triples_expected = torch.Tensor([[ 7, 25, 24],
+                                        [ 1,  8,  6]]).to(int).cuda()
 
     windows_expected = torch.Tensor([[[-1, -1, 11],
                                     [-1, -1, -1],
@@ -197,7 +200,7 @@ def test_to_windows_triples_cbow_gpu():
                                     [13,  6, 27],
                                     [27,  0,  7]],
 
-                                    [[10, 10, 27],
+                                    [[11, 10, 27],
                                     [-1, -1, 11],
                                     [-1, -1, -1],
                                     [-1, -1, -1],
@@ -214,3 +217,293 @@ def test_to_windows_triples_cbow_gpu():
 
 
 
+
+
+def test_to_windows_triples_threads_cpu():
+    # enough walks to be split into several chunks
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(2000,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+
+    # the windows only depend on the seed, not on how the walks are split across threads
+    num_threads = torch.get_num_threads()
+    windows = []
+    try:
+        for threads in [1,4]:
+            torch.set_num_threads(threads)
+            windows.append(rw.to_windows_triples_sg(walks=walks,
+                                                    window_size=4,
+                                                    num_nodes=30,
+                                                    padding_idx=-1,
+                                                    triples=triples,
+                                                    seed=20))
+    finally:
+        torch.set_num_threads(num_threads)
+
+    for single_thread, multi_thread in zip(windows[0],windows[1]):
+        assert torch.equal(single_thread,multi_thread)
+
+
+def test_walk_windows_triples_cpu():
+    # a random graph with dead ends
+    _, triples_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(num_heads=45)
+    target_nodes = torch.arange(num_entities).repeat_interleave(3)
+
+    for restart in [False,True]:
+        walks = rw.walk_triples(triples_indexed=triples_sorted,
+                                relation_tail_index=relation_tail_index,
+                                target_nodes=target_nodes,
+                                walk_length=12,
+                                seed=10,
+                                padding_idx=padding_idx,
+                                restart=restart)
+
+        for window_size in [1,3,20]:
+            # the fused walker gives exactly the windows of the materialized walks
+            expected = rw.to_windows_triples_sg(walks,window_size,num_entities,padding_idx,triples_sorted,20)
+            fused = rw.walk_windows_triples_sg(triples_indexed=triples_sorted,
+                                               relation_tail_index=relation_tail_index,
+                                               target_nodes=target_nodes,
+                                               walk_length=12,
+                                               window_size=window_size,
+                                               padding_idx=padding_idx,
+                                               seed=10,
+                                               window_seed=20,
+                                               restart=restart)
+            for expected_tensor, fused_tensor in zip(expected,fused):
+                assert torch.equal(expected_tensor,fused_tensor)
+
+            expected = rw.to_windows_triples_cbow(walks,window_size,num_entities,padding_idx,triples_sorted,20)
+            fused = rw.walk_windows_triples_cbow(triples_indexed=triples_sorted,
+                                                 relation_tail_index=relation_tail_index,
+                                                 target_nodes=target_nodes,
+                                                 walk_length=12,
+                                                 window_size=window_size,
+                                                 padding_idx=padding_idx,
+                                                 seed=10,
+                                                 window_seed=20,
+                                                 restart=restart)
+            for expected_tensor, fused_tensor in zip(expected,fused):
+                assert torch.equal(expected_tensor,fused_tensor)
+
+    # walks_per_node and num_negatives give the windows of the two step path too
+    walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,12,padding_idx,seed=10,walks_per_node=2)
+    for to_windows, walk_windows in [(rw.to_windows_triples_sg,rw.walk_windows_triples_sg),(rw.to_windows_triples_cbow,rw.walk_windows_triples_cbow)]:
+        expected = to_windows(walks,3,num_entities,padding_idx,triples_sorted,20,num_negatives=3)
+        fused = walk_windows(triples_sorted,relation_tail_index,target_nodes,12,3,padding_idx,seed=10,window_seed=20,
+                             walks_per_node=2,num_negatives=3)
+        for expected_tensor, fused_tensor in zip(expected,fused):
+            assert torch.equal(expected_tensor,fused_tensor)
+
+    with pytest.raises(RuntimeError):
+        rw.walk_windows_triples_sg(triples_sorted,relation_tail_index,target_nodes,12,3,padding_idx,seed=10,walks_per_node=0)
+    with pytest.raises(RuntimeError):
+        rw.walk_windows_triples_cbow(triples_sorted,relation_tail_index,target_nodes,12,3,padding_idx,seed=10,num_negatives=0)
+
+
+def test_walk_windows_triples_gpu():
+    # a random graph with dead ends
+    _, triples_sorted, relation_tail_index, num_entities, _, padding_idx = random_graph(num_heads=45)
+    target_nodes = torch.arange(num_entities).repeat_interleave(3)
+
+    # the gpu uses the same random streams as the cpu
+    for function in [rw.walk_windows_triples_sg,rw.walk_windows_triples_cbow]:
+        for options in [{},{"walks_per_node":2,"num_negatives":3}]:
+            expected = function(triples_sorted,relation_tail_index,target_nodes,12,3,padding_idx,seed=10,window_seed=20,**options)
+            fused = function(triples_sorted.cuda(),relation_tail_index.cuda(),target_nodes.cuda(),12,3,padding_idx,seed=10,window_seed=20,**options)
+            for expected_tensor, fused_tensor in zip(expected,fused):
+                assert torch.equal(expected_tensor,fused_tensor.cpu())
+
+
+def test_to_windows_triples_index_cpu():
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(50,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+
+    for window_size in [1,4,20]:
+        # skip-gram: the gathered windows equal the copied ones
+        target_triples, pos_windows, neg_windows = rw.to_windows_triples_sg(walks,window_size,30,-1,triples,seed=20)
+        neg_index = rw.to_windows_triples_sg_index(walks,window_size,triples,seed=20)
+        assert neg_index.dtype == torch.int32 and len(neg_index) == len(target_triples)
+        window_offsets = torch.arange(len(neg_index),dtype=torch.int32)
+
+        gathered_target, gathered_context = model.gather_windows(walks,window_offsets,window_size,-1)
+        assert torch.equal(gathered_target,target_triples)
+        assert torch.equal(gathered_context,pos_windows)
+        assert torch.equal(triples[neg_index.long()],neg_windows)
+
+        # cbow
+        pos_triples, neg_triples, context_windows = rw.to_windows_triples_cbow(walks,window_size,30,-1,triples,seed=20)
+        neg_index = rw.to_windows_triples_cbow_index(walks,window_size,-1,triples,seed=20)
+        gathered_target, gathered_context = model.gather_windows(walks,window_offsets,window_size,-1)
+        assert torch.equal(gathered_target,pos_triples)
+        assert torch.equal(gathered_context,context_windows)
+        assert torch.equal(triples[neg_index.long()],neg_triples)
+
+    # with a large window the index form is an order of magnitude smaller
+    copied = sum(tensor.nbytes for tensor in (target_triples,pos_windows,neg_windows))
+    neg_index = rw.to_windows_triples_sg_index(walks,20,triples,seed=20)
+    assert copied > 10 * neg_index.nbytes
+
+
+def test_to_windows_triples_num_negatives_cpu():
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(50,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+    num_windows = 50*10
+
+    # skip-gram: num_negatives sets per window, the first window of a walk starts with the set of num_negatives=1
+    _, _, neg_windows = rw.to_windows_triples_sg(walks,4,30,-1,triples,seed=20)
+    target_triples, pos_windows, neg_sets = rw.to_windows_triples_sg(walks,4,30,-1,triples,seed=20,num_negatives=3)
+    assert neg_sets.shape == (num_windows,3,8,3)
+    assert pos_windows.shape == (num_windows,8,3)
+    assert torch.equal(neg_sets[::10,0],neg_windows[::10])
+    neg_index = rw.to_windows_triples_sg_index(walks,4,triples,seed=20,num_negatives=3)
+    assert neg_index.shape == (num_windows,3,8)
+    assert torch.equal(triples[neg_index.long()],neg_sets)
+
+    # cbow
+    _, neg_triples, _ = rw.to_windows_triples_cbow(walks,4,30,-1,triples,seed=20)
+    pos_triples, neg_sets, context_windows = rw.to_windows_triples_cbow(walks,4,30,-1,triples,seed=20,num_negatives=3)
+    assert neg_sets.shape == (num_windows,3,3)
+    assert torch.equal(neg_sets[::10,0],neg_triples[::10])
+    neg_index = rw.to_windows_triples_cbow_index(walks,4,-1,triples,seed=20,num_negatives=3)
+    assert neg_index.shape == (num_windows,3)
+    assert torch.equal(triples[neg_index.long()],neg_sets)
+
+    # the negatives of a window are drawn from the triples and avoid the target triple
+    assert (neg_sets[:,:,None,:] == triples[None,None,:,:]).all(dim=3).any(dim=2).all()
+    assert not (neg_sets == pos_triples[:,None,:]).all(dim=2).any()
+
+
+def packed_test_walks(device):
+    # a random graph where a third of the entities are dead ends
+    graph = random_graph(60,150,num_heads=40)
+    return (graph.triples_sorted.to(device), graph.relation_tail_index.to(device),
+            torch.arange(graph.num_entities,device=device), graph.padding_idx)
+
+
+def test_to_windows_triples_packed_cpu():
+    triples_sorted, relation_tail_index, target_nodes, padding_idx = packed_test_walks("cpu")
+
+    for restart in [False,True]:
+        walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=3,restart=restart,walks_per_node=2)
+        values, offsets = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=3,restart=restart,walks_per_node=2,packed=True)
+
+        # the packed walks are the padded ones up to their end
+        lengths = offsets[1:] - offsets[:-1]
+        assert offsets[0] == 0 and len(offsets) == len(walks) + 1
+        assert values.numel() < walks.numel()
+        for walk, start, length in zip(walks,offsets[:-1],lengths):
+            assert torch.equal(values[start:start+length],walk[:length])
+            assert (walk[length:] == padding_idx).all()
+
+        # the windows of the packed walks are the ones of the padded walks within the walks
+        num_triples = torch.div(lengths - 1,2,rounding_mode="floor")
+        inside = (torch.arange(10).unsqueeze(0) < num_triples.unsqueeze(1)).flatten()
+        for num_negatives in [1,2]:
+            expected = rw.to_windows_triples_sg(walks,3,padding_idx,padding_idx,triples_sorted,20,num_negatives=num_negatives)
+            packed = rw.to_windows_triples_sg_packed(values,offsets,3,padding_idx,triples_sorted,20,num_negatives=num_negatives)
+            for expected_tensor, packed_tensor in zip(expected,packed):
+                assert torch.equal(expected_tensor[inside],packed_tensor)
+
+            expected = rw.to_windows_triples_cbow(walks,3,padding_idx,padding_idx,triples_sorted,20,num_negatives=num_negatives)
+            packed = rw.to_windows_triples_cbow_packed(values,offsets,3,padding_idx,triples_sorted,20,num_negatives=num_negatives)
+            for expected_tensor, packed_tensor in zip(expected,packed):
+                assert torch.equal(expected_tensor[inside],packed_tensor)
+
+    # walks that are not packed by the walker are packed from the padded walks
+    walks = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=3,p=0.5,q=2.0)
+    values, offsets = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=3,p=0.5,q=2.0,packed=True)
+    for expected_tensor, packed_tensor in zip(rw.pack_walks(walks,padding_idx),(values,offsets)):
+        assert torch.equal(expected_tensor,packed_tensor)
+
+
+def test_to_windows_triples_packed_gpu():
+    triples_sorted, relation_tail_index, target_nodes, padding_idx = packed_test_walks("cuda")
+
+    # the gpu packs the same walks and builds the same windows as the cpu
+    expected_walks = rw.walk_triples(triples_sorted.cpu(),relation_tail_index.cpu(),target_nodes.cpu(),10,padding_idx,seed=3,packed=True)
+    values, offsets = rw.walk_triples(triples_sorted,relation_tail_index,target_nodes,10,padding_idx,seed=3,packed=True)
+    for expected_tensor, actual_tensor in zip(expected_walks,(values,offsets)):
+        assert torch.equal(expected_tensor,actual_tensor.cpu())
+
+    for function in [rw.to_windows_triples_sg_packed,rw.to_windows_triples_cbow_packed]:
+        expected = function(*expected_walks,3,padding_idx,triples_sorted.cpu(),20,num_negatives=2)
+        actual = function(values,offsets,3,padding_idx,triples_sorted,20,num_negatives=2)
+        for expected_tensor, actual_tensor in zip(expected,actual):
+            assert torch.equal(expected_tensor,actual_tensor.cpu())
+
+
+def test_to_windows_triples_index_gpu():
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(50,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+
+    # the gpu draws the same negatives as the cpu
+    expected = rw.to_windows_triples_sg_index(walks,4,triples,seed=20)
+    actual = rw.to_windows_triples_sg_index(walks.cuda(),4,triples.cuda(),seed=20)
+    assert torch.equal(expected,actual.cpu())
+
+    expected = rw.to_windows_triples_cbow_index(walks,4,-1,triples,seed=20)
+    actual = rw.to_windows_triples_cbow_index(walks.cuda(),4,-1,triples.cuda(),seed=20)
+    assert torch.equal(expected,actual.cpu())
+
+
+def test_windows_triples_int32_cpu():
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(50,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+
+    # int32 walks and triples give the same windows in int32 tensors
+    for function in [rw.to_windows_triples_sg,rw.to_windows_triples_cbow]:
+        expected = function(walks,4,30,-1,triples,seed=20)
+        actual = function(walks.int(),4,30,-1,triples.int(),seed=20)
+        for expected_tensor, actual_tensor in zip(expected,actual):
+            assert actual_tensor.dtype == torch.int32
+            assert torch.equal(expected_tensor,actual_tensor.long())
+
+    expected = rw.to_windows_triples_cbow_index(walks,4,-1,triples,seed=20)
+    actual = rw.to_windows_triples_cbow_index(walks.int(),4,-1,triples.int(),seed=20)
+    assert torch.equal(expected,actual)
+
+    # the fused generators too
+    _, triples_sorted, relation_tail_index, _, _, _ = random_graph(30,100,num_heads=25)
+    for function in [rw.walk_windows_triples_sg,rw.walk_windows_triples_cbow]:
+        expected = function(triples_sorted,relation_tail_index,torch.arange(30),8,2,34,seed=10)
+        actual = function(triples_sorted.int(),relation_tail_index.int(),torch.arange(30).int(),8,2,34,seed=10)
+        for expected_tensor, actual_tensor in zip(expected,actual):
+            assert actual_tensor.dtype == torch.int32
+            assert torch.equal(expected_tensor,actual_tensor.long())
+
+
+def test_to_windows_triples_out_cpu():
+    torch.manual_seed(20)
+    walk_length = (10*2)+1
+    walks = torch.randint(low=0,high=30,size=(50,walk_length))
+    triples = torch.randint(low=0,high=30,size=(10,3))
+
+    # the windows of one call are refilled in place by the next one, with the windows of a new call
+    for function in [rw.to_windows_triples_sg,rw.to_windows_triples_cbow]:
+        for num_negatives in [1,3]:
+            buffers = function(walks,4,30,-1,triples,seed=10,num_negatives=num_negatives)
+            data_ptrs = [buffer.data_ptr() for buffer in buffers]
+            expected = function(walks,4,30,-1,triples,seed=20,num_negatives=num_negatives)
+            actual = function(walks,4,30,-1,triples,seed=20,num_negatives=num_negatives,out=buffers)
+            for expected_tensor, actual_tensor, data_ptr in zip(expected,actual,data_ptrs):
+                assert actual_tensor.data_ptr() == data_ptr
+                assert torch.equal(expected_tensor,actual_tensor)
+
+        # buffers of the wrong shape, dtype or number are rejected
+        buffers = function(walks,4,30,-1,triples,seed=10)
+        with pytest.raises(RuntimeError):
+            function(walks[:10],4,30,-1,triples,seed=20,out=buffers)
+        with pytest.raises(RuntimeError):
+            function(walks,4,30,-1,triples,seed=20,out=[buffer.int() for buffer in buffers])
+        with pytest.raises(RuntimeError):
+            function(walks,4,30,-1,triples,seed=20,out=buffers[:2])
@@ -0,0 +1,206 @@
+import math
+import queue
+import threading
+import time
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from triple_walk import rw
+
+
+class TripleWalkDataset(IterableDataset):
+    """Stream minibatches of triple walk windows without building the whole epoch.
+
+    The walks are generated `chunk_size` walks at a time with the fused
+    walk-to-window kernels and cut into batches of `batch_size` windows, so
+    memory is bounded by the chunk and the batch instead of by the graph.
+    Every batch is a tuple that can be passed to `model(*batch)`:
+    (target_triples, pos_windows, neg_windows) for "sg" and
+    (pos_triples, neg_triples, windows) for "cbow", with num_negatives sets of
+    negatives per window as in rw.to_windows_triples_sg and to_windows_triples_cbow.
+
+    The dataset batches by itself, use it with `DataLoader(dataset, batch_size=None)`.
+    With several workers every worker walks a disjoint shard of the target nodes.
+    Call `set_epoch` before every epoch to get new walks and a new shuffle.
+    """
+
+    def __init__(self,
+                triples_indexed,
+                relation_tail_index,
+                target_nodes,
+                walk_length,
+                window_size,
+                padding_idx,
+                batch_size,
+                mode="sg",
+                walks_per_node=1,
+                num_negatives=1,
+                chunk_size=None,
+                shuffle=True,
+                restart=True,
+                seed=0
+                ):
+
+        super(TripleWalkDataset, self).__init__()
+
+        if mode not in ("sg","cbow"):
+            raise ValueError(f"mode should be 'sg' or 'cbow' but got '{mode}'")
+
+        self.triples_indexed = triples_indexed
+        self.relation_tail_index = relation_tail_index
+        self.target_nodes = target_nodes
+        self.walk_length = walk_length
+        self.window_size = window_size
+        self.padding_idx = padding_idx
+        self.batch_size = batch_size
+        self.mode = mode
+        self.walks_per_node = walks_per_node
+        self.num_negatives = num_negatives
+        self.shuffle = shuffle
+        self.restart = restart
+        self.seed = seed
+        self.epoch = 0
+
+        # by default a chunk of walks makes about one batch of windows
+        if chunk_size is None:
+            chunk_size = math.ceil(batch_size / walk_length)
+        self.chunk_size = max(chunk_size,1)
+
+    def set_epoch(self,epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+
+        # shard the target nodes between the workers
+        target_nodes = self._epoch_target_nodes()
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            target_nodes = torch.tensor_split(target_nodes,worker_info.num_workers)[worker_info.id]
+            shard_id = worker_info.id
+        else:
+            shard_id = 0
+
+        # windows left over from the previous chunk
+        pending = None
+
+        for walk_round in range(self.walks_per_node):
+            for chunk_start in range(0,len(target_nodes),self.chunk_size):
+                chunk = target_nodes[chunk_start:chunk_start+self.chunk_size]
+                windows = self._walk_windows(chunk,self._chunk_seed(shard_id,walk_round,chunk_start))
+
+                if pending is not None:
+                    windows = tuple(torch.cat((pending_tensor,tensor)) for pending_tensor, tensor in zip(pending,windows))
+
+                # emit the full batches and keep the rest for the next chunk
+                num_windows = len(windows[0])
+                num_full = (num_windows // self.batch_size) * self.batch_size
+                for batch_start in range(0,num_full,self.batch_size):
+                    yield tuple(tensor[batch_start:batch_start+self.batch_size] for tensor in windows)
+
+                pending = tuple(tensor[num_full:] for tensor in windows) if num_full < num_windows else None
+
+        if pending is not None:
+            yield pending
+
+    def _epoch_target_nodes(self):
+        if self.shuffle == False:
+            return self.target_nodes
+
+        generator = torch.Generator().manual_seed(self._chunk_seed(-1,-1,-1))
+        permutation = torch.randperm(len(self.target_nodes),generator=generator)
+        return self.target_nodes[permutation.to(self.target_nodes.device)]
+
+    def _chunk_seed(self,shard_id,walk_round,chunk_start):
+        # the kernels key their streams by the walk index inside the call, so
+        # every chunk needs its own seed to not repeat the walks of another chunk
+        entropy = [self.seed,self.epoch,shard_id+1,walk_round+1,chunk_start+1]
+        state = np.random.SeedSequence(entropy).generate_state(1)[0]
+        return int(state & 0x7FFFFFFF)
+
+    def _walk_windows(self,target_nodes,seed):
+        if self.mode == "sg":
+            function = rw.walk_windows_triples_sg
+        else:
+            function = rw.walk_windows_triples_cbow
+
+        return function(triples_indexed=self.triples_indexed,
+                        relation_tail_index=self.relation_tail_index,
+                        target_nodes=target_nodes,
+                        walk_length=self.walk_length,
+                        window_size=self.window_size,
+                        padding_idx=self.padding_idx,
+                        seed=seed,
+                        window_seed=seed,
+                        restart=self.restart,
+                        num_negatives=self.num_negatives)
+
+
+class Prefetcher:
+    """Iterate over an iterable in a background thread, up to `depth` items ahead.
+
+    The native kernels release the gil, so the walks and windows of the next
+    chunks of a TripleWalkDataset (or any other iterable) are built while the
+    model step of the current batch runs in the foreground. After every pass
+    `produce_seconds` holds the time spent producing the items, `wait_seconds`
+    the time the foreground waited for them and `hidden_seconds` the
+    difference, the producer time hidden behind the training.
+    """
+
+    def __init__(self,iterable,depth=2):
+        if depth < 1:
+            raise ValueError(f"depth should be at least 1 but got {depth}")
+        self.iterable = iterable
+        self.depth = depth
+        self.produce_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @property
+    def hidden_seconds(self):
+        return max(self.produce_seconds - self.wait_seconds,0.0)
+
+    def __iter__(self):
+        self.produce_seconds = 0.0
+        self.wait_seconds = 0.0
+        items = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+        done = object()
+
+        producer = threading.Thread(target=self._produce,args=(items,stop,done),daemon=True)
+        producer.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                item, error = items.get()
+                self.wait_seconds += time.perf_counter() - start
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            # a consumer that stops early releases the producer
+            stop.set()
+            producer.join()
+
+    def _produce(self,items,stop,done):
+        iterator = iter(self.iterable)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item, error = next(iterator), None
+            except StopIteration:
+                item, error = done, None
+            except BaseException as exception:
+                item, error = None, exception
+            self.produce_seconds += time.perf_counter() - start
+
+            # wait for a free slot without missing a stop
+            while not stop.is_set():
+                try:
+                    items.put((item,error),timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+            if item is done or error is not None:
+                return
@@ -0,0 +1,248 @@
+import itertools
+import os
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from triple_walk import storage
+
+# subject, predicate and object of an N-Triples line
+NTRIPLES_PATTERN = r'^\s*(<[^>]*>|_:\S+)\s+(<[^>]*>)\s+(.*?)\s*\.\s*$'
+
+# N-Triples lines without a triple, which are skipped
+NTRIPLES_EMPTY_PATTERN = r'^\s*(#.*)?$'
+
+
+class IdMap:
+    """Ids assigned to names in the order they are first seen."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self,names):
+        # only the unique names of a chunk go through the dict
+        codes, uniques = pd.factorize(names)
+        unique_ids = np.empty(len(uniques),dtype=np.int64)
+        for index, name in enumerate(uniques):
+            name_id = self.ids.get(name)
+            if name_id is None:
+                name_id = len(self.names)
+                self.ids[name] = name_id
+                self.names.append(name)
+            unique_ids[index] = name_id
+        return unique_ids[codes]
+
+
+class FirstSeen:
+    """Ids in the order they are first seen, over all the chunks of ids given to add."""
+
+    def __init__(self):
+        self.seen = np.zeros(0,dtype=bool)
+        self.order = []
+
+    def add(self,ids):
+        if len(ids) == 0:
+            return
+        if ids.max() >= len(self.seen):
+            self.seen = np.concatenate((self.seen,np.zeros(int(ids.max()) + 1 - len(self.seen),dtype=bool)))
+        first = pd.unique(ids)
+        first = first[~self.seen[first]]
+        self.seen[first] = True
+        self.order.append(first)
+
+    def ids(self):
+        return np.concatenate(self.order) if self.order else np.zeros(0,dtype=np.int64)
+
+
+def read_ntriples(path,chunk_size,on_bad_lines):
+    # (heads, relations, tails) of the N-Triples file at path, lines that are not a
+    # triple, a comment or empty are bad lines
+    num_bad_lines = 0
+    first_bad_line = None
+    with open(path,"r",encoding="utf-8") as f:
+        for chunk_start in itertools.count(0,chunk_size):
+            lines = pd.Series(list(itertools.islice(f,chunk_size)),dtype=object)
+            if len(lines) == 0:
+                break
+            triples = lines.str.extract(NTRIPLES_PATTERN)
+            bad = triples[0].isna() & ~lines.str.match(NTRIPLES_EMPTY_PATTERN)
+            if bad.any():
+                if on_bad_lines == "error":
+                    line_number = chunk_start + int(np.argmax(bad.to_numpy())) + 1
+                    raise ValueError(f"{path}:{line_number} is not an N-Triples line: {lines[bad].iloc[0].strip()}")
+                if first_bad_line is None:
+                    first_bad_line = lines[bad].iloc[0].strip()
+                num_bad_lines += int(bad.sum())
+            triples = triples.dropna()
+            yield triples[0].to_numpy(), triples[1].to_numpy(), triples[2].to_numpy()
+
+    if num_bad_lines > 0 and on_bad_lines == "warn":
+        warnings.warn(f"skipped {num_bad_lines} lines of {path} that are not N-Triples lines, the first one is: {first_bad_line}")
+
+
+def read_chunks(paths,format,chunk_size,has_header,on_bad_lines):
+    # (heads, relations, tails) string arrays of at most chunk_size triples
+    for path in paths:
+        if format == "nt":
+            yield from read_ntriples(path,chunk_size,on_bad_lines)
+        else:
+            sep = "\t" if format == "tsv" else ","
+            try:
+                reader = pd.read_csv(path,
+                                     sep=sep,
+                                     header=0 if has_header else None,
+                                     usecols=[0,1,2],
+                                     dtype=str,
+                                     keep_default_na=False,
+                                     on_bad_lines=on_bad_lines,
+                                     chunksize=chunk_size)
+            except pd.errors.EmptyDataError:
+                # a file without lines has no triples
+                continue
+            with reader:
+                for chunk in reader:
+                    yield chunk.iloc[:,0].to_numpy(), chunk.iloc[:,1].to_numpy(), chunk.iloc[:,2].to_numpy()
+
+
+def ingest_triples(paths,output_path,format="tsv",chunk_size=1000000,dtype=np.int64,has_header=False,tmp_dir=None,on_bad_lines="warn"):
+    """Build a graph file from TSV, CSV or N-Triples ("nt") files without loading them at once.
+
+    The files are read chunk_size triples at a time. Entities and relations get
+    the ids of utils.to_indexed_triples on all the triples, whatever the
+    chunk_size: entities in the order they are first seen as heads and then as
+    tails, and relations after them in the order they are first seen. Every
+    chunk is spilled to disk as a run and sorted by head once all the ids are
+    known. The runs are then merged k ways into the memory mapped triples
+    of the graph file, one block of about chunk_size triples at a time: every run
+    is read and the triples are written front to back. Apart from the
+    vocabularies only per entity counters and one chunk or block are held in
+    memory. Returns the loaded storage.TripleGraph.
+
+    Lines that can not be parsed, such as N-Triples lines that are not a
+    triple, a comment or empty, raise a ValueError with on_bad_lines="error",
+    are counted and reported in a warning with "warn" and are left out with
+    "skip". Files without triples give a graph without triples.
+    """
+
+    if format not in ("tsv","csv","nt"):
+        raise ValueError(f"format should be 'tsv', 'csv' or 'nt' but got '{format}'")
+    if on_bad_lines not in ("error","warn","skip"):
+        raise ValueError(f"on_bad_lines should be 'error', 'warn' or 'skip' but got '{on_bad_lines}'")
+    if isinstance(paths,(str,os.PathLike)):
+        paths = [paths]
+
+    entities = IdMap()
+    relations = IdMap()
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+
+        # spill every chunk with ids in the order the entities are seen in the chunks,
+        # relations still count from 0, and keep the order they are first seen as heads and as tails
+        runs = []
+        first_heads = FirstSeen()
+        first_tails = FirstSeen()
+        for heads, rels, tails in read_chunks(paths,format,chunk_size,has_header,on_bad_lines):
+            num_triples = len(heads)
+            entity_ids = entities.lookup(np.concatenate((heads,tails)))
+            run = np.stack((entity_ids[:num_triples],relations.lookup(rels),entity_ids[num_triples:]),axis=1)
+            first_heads.add(run[:,0])
+            first_tails.add(run[:,2])
+
+            run_path = os.path.join(run_dir,f"run_{len(runs)}.npy")
+            np.save(run_path,run)
+            runs.append(run_path)
+
+        num_entities = len(entities)
+        num_relations = len(relations)
+        if num_entities + num_relations >= np.iinfo(dtype).max:
+            raise ValueError(f"{num_entities + num_relations} ids do not fit into {np.dtype(dtype).name}")
+
+        # the ids of to_indexed_triples: the heads in the order they are first seen and then
+        # the entities that are only tails, which do not depend on where the chunks end
+        head_order = first_heads.ids()
+        tail_order = first_tails.ids()
+        if len(head_order) > 0:
+            tail_order = tail_order[~np.isin(tail_order,head_order)]
+        entity_order = np.concatenate((head_order,tail_order)).astype(np.int64)
+        entity_ids = np.empty(num_entities,dtype=np.int64)
+        entity_ids[entity_order] = np.arange(num_entities)
+        entity_names = [entities.names[entity] for entity in entity_order]
+
+        # renumber every run and sort it by head, stored by column so that the heads of
+        # a run can be searched in place
+        for run_path in runs:
+            run = np.load(run_path)
+            run[:,0] = entity_ids[run[:,0]]
+            run[:,2] = entity_ids[run[:,2]]
+            run = run[np.argsort(run[:,0],kind="stable")]
+            np.save(run_path,np.ascontiguousarray(run.T))
+
+        # number of triples of every head
+        counts = np.zeros(num_entities,dtype=np.int64)
+        for run_path in runs:
+            run_heads = np.load(run_path,mmap_mode="r")[0]
+            counts += np.bincount(run_heads,minlength=num_entities)
+        num_triples = int(counts.sum())
+        starts = np.cumsum(counts) - counts
+
+        # relation tail index as in utils.build_relation_tail_index
+        relation_tail_index = np.stack((starts,starts + counts - 1),axis=1).astype(dtype)
+        relation_tail_index[counts == 0] = -1
+
+        entity_offsets, entity_data = storage.encode_names(entity_names)
+        relation_offsets, relation_data = storage.encode_names(relations.names)
+        sections = [("triples_indexed",dtype,(num_triples,3)),
+                    ("relation_tail_index",dtype,relation_tail_index.shape),
+                    ("entities_offsets",entity_offsets.dtype,entity_offsets.shape),
+                    ("entities_data",entity_data.dtype,entity_data.shape),
+                    ("relations_offsets",relation_offsets.dtype,relation_offsets.shape),
+                    ("relations_data",relation_data.dtype,relation_data.shape)]
+
+        data_start, section_headers = storage.create_graph_file(output_path,
+                                                                dtype=dtype,
+                                                                num_triples=num_triples,
+                                                                num_entities=num_entities,
+                                                                num_relations=num_relations,
+                                                                sections=sections)
+
+        # merge the runs block by block, a block being the triples of the heads that end
+        # within the next chunk_size triples. Every run is sorted by head, so its triples of
+        # a block follow the ones of the previous block, and a stable sort of the triples of
+        # the block in run order gives the order of a stable sort of all triples by head
+        if num_triples > 0:
+            triples = np.memmap(output_path,dtype=dtype,mode="r+",offset=data_start+section_headers["triples_indexed"]["offset"],shape=(num_triples,3))
+            ends = starts + counts
+            run_arrays = [np.load(run_path,mmap_mode="r") for run_path in runs]
+            run_positions = [0] * len(runs)
+            head_start = 0
+            while head_start < num_entities:
+                head_end = max(head_start + 1,int(np.searchsorted(ends,starts[head_start] + chunk_size,side="right")))
+                head_end = min(head_end,num_entities)
+                pieces = []
+                for index, run in enumerate(run_arrays):
+                    position = run_positions[index]
+                    piece_end = position + int(np.searchsorted(run[0,position:],head_end,side="left"))
+                    pieces.append(run[:,position:piece_end].T)
+                    run_positions[index] = piece_end
+                block = np.concatenate(pieces)
+                block = block[np.argsort(block[:,0],kind="stable")]
+                block[:,1] = block[:,1] + num_entities
+                triples[starts[head_start]:ends[head_end-1]] = block
+                head_start = head_end
+            triples.flush()
+            del triples, run_arrays
+
+    with open(output_path,"r+b") as f:
+        for name, array in [("relation_tail_index",relation_tail_index),
+                            ("entities_offsets",entity_offsets),
+                            ("entities_data",entity_data),
+                            ("relations_offsets",relation_offsets),
+                            ("relations_data",relation_data)]:
+            f.seek(data_start + section_headers[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    return storage.load_graph(output_path)
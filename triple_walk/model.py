@@ -2,29 +2,103 @@ import torch.nn as nn
 import torch
 EPS = 1e-15
 import torch.nn.functional as F
+import triple_walk_native
 
 
-class SkipGramTriple(nn.Module):
-    
+def gather_windows(walks,window_offsets,window_size,padding_index):
+    """Target triples and context windows of window_offsets read from the walks.
+
+    Gives the same (target_triples, context) that the to_windows_triples_* functions
+    copy out, but only for the windows of the batch.
+    """
+
+    # the walk and the triple within the walk of every window
+    walk_length = walks.size(1)
+    num_windows_in_walk = (walk_length - 1) // 2
+    window_offsets = window_offsets.long()
+    walk_idx = torch.div(window_offsets,num_windows_in_walk,rounding_mode="floor")
+    target_idx = window_offsets % num_windows_in_walk
+
+    # triples to the left (closest first) and to the right of the target
+    hops = torch.arange(1,window_size+1,device=walks.device)
+    context_idx = torch.cat((target_idx.unsqueeze(1) - hops,target_idx.unsqueeze(1) + hops),dim=1)
+
+    # positions of head, relation and tail in the walk
+    triple_pos = torch.arange(3,device=walks.device)
+    target_pos = (target_idx.unsqueeze(1)*2) + triple_pos
+    context_pos = (context_idx.unsqueeze(2)*2) + triple_pos
+
+    # positions outside of the walk are padding
+    target_triples = walks[walk_idx.unsqueeze(1),target_pos]
+    valid = (context_pos >= 0) & (context_pos < walk_length)
+    context = walks[walk_idx.view(-1,1,1),context_pos.clamp(0,walk_length-1)]
+    context = torch.where(valid,context,torch.full_like(context,padding_index))
+
+    return target_triples, context
+
+
+def sample_shared_negatives(triples,num_negatives,generator=None):
+    """num_negatives triples drawn uniformly from triples, for SkipGramTriple.forward_shared."""
+    device = triples.device if generator is None else generator.device
+    index = torch.randint(len(triples),(num_negatives,),generator=generator,device=device)
+    return triples[index.to(triples.device)]
+
+
+class TripleEmbeddings(nn.Module):
+    """Target and context embedding tables of heads, relations and tails.
+
+    By default every table has a row for every id below num_nodes + 1. With
+    num_entities and num_relations the head and tail tables only hold the
+    entities and the relation tables only the relations, which are looked up
+    with relation id - num_entities, as ids are assigned by
+    utils.to_indexed_triples. The padding index gets the last row of every
+    table. num_nodes can be None in that case.
+
+    With sparse=True the tables produce sparse gradients that only hold the
+    rows of the batch, train them with an optimizer that supports them, such
+    as torch.optim.SparseAdam, torch.optim.Adagrad or torch.optim.SGD. The
+    cost of a step then depends on the batch and not on the number of ids.
+    """
+
     def __init__(self,
                 num_nodes,
                 embedding_dim,
-                padding_index
+                padding_index,
+                num_entities=None,
+                num_relations=None,
+                sparse=False
                 ):
 
-        super(SkipGramTriple, self).__init__()
-        
+        super(TripleEmbeddings, self).__init__()
+
         # params
         self.embedding_dim = embedding_dim
-        self.num_nodes = num_nodes+1                
+        self.sparse = sparse
         self.padding_index = padding_index
-        self.target_head_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.target_tail_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.target_rel_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-
-        self.context_head_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.context_tail_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.context_rel_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
+        self.num_entities = num_entities
+        self.num_relations = num_relations
+
+        if num_entities is None or num_relations is None:
+            # one row for every node and relation id in every table
+            self.num_nodes = num_nodes+1
+            entity_rows = relation_rows = self.num_nodes
+            self.entity_padding = self.relation_padding = self.padding_index
+        else:
+            if num_nodes is not None and num_nodes != num_entities + num_relations:
+                raise ValueError(f"num_nodes ({num_nodes}) should be num_entities + num_relations ({num_entities + num_relations})")
+            self.num_nodes = num_entities + num_relations + 1
+            entity_rows = num_entities + 1
+            relation_rows = num_relations + 1
+            self.entity_padding = num_entities
+            self.relation_padding = num_relations
+
+        self.target_head_embedding = nn.Embedding(entity_rows,self.embedding_dim,padding_idx=self.entity_padding,sparse=sparse)
+        self.target_tail_embedding = nn.Embedding(entity_rows,self.embedding_dim,padding_idx=self.entity_padding,sparse=sparse)
+        self.target_rel_embedding = nn.Embedding(relation_rows,self.embedding_dim,padding_idx=self.relation_padding,sparse=sparse)
+
+        self.context_head_embedding = nn.Embedding(entity_rows,self.embedding_dim,padding_idx=self.entity_padding,sparse=sparse)
+        self.context_tail_embedding = nn.Embedding(entity_rows,self.embedding_dim,padding_idx=self.entity_padding,sparse=sparse)
+        self.context_rel_embedding = nn.Embedding(relation_rows,self.embedding_dim,padding_idx=self.relation_padding,sparse=sparse)
 
         # init embeddings
         nn.init.uniform_(self.target_head_embedding.weight.data,a=-1,b=1)
@@ -36,30 +110,69 @@ class SkipGramTriple(nn.Module):
 
         # set padding index to a very small value
         with torch.no_grad():
-            self.target_head_embedding.weight[self.padding_index] = 0
-            self.target_tail_embedding.weight[self.padding_index] = 0
-            self.target_rel_embedding.weight[self.padding_index] = 0
-            self.context_head_embedding.weight[self.padding_index] = 0
-            self.context_tail_embedding.weight[self.padding_index] = 0
-            self.context_rel_embedding.weight[self.padding_index] = 0
-
-                
+            self.target_head_embedding.weight[self.entity_padding] = 0
+            self.target_tail_embedding.weight[self.entity_padding] = 0
+            self.target_rel_embedding.weight[self.relation_padding] = 0
+            self.context_head_embedding.weight[self.entity_padding] = 0
+            self.context_tail_embedding.weight[self.entity_padding] = 0
+            self.context_rel_embedding.weight[self.relation_padding] = 0
+
+    def entity_rows(self,ids):
+        # rows of entity ids in the head and tail tables
+        if self.num_entities is None:
+            return ids
+        return torch.where(ids == self.padding_index,torch.full_like(ids,self.entity_padding),ids)
+
+    def relation_rows(self,ids):
+        # rows of relation ids in the relation tables
+        if self.num_relations is None:
+            return ids
+        return torch.where(ids == self.padding_index,torch.full_like(ids,self.relation_padding),ids - self.num_entities)
+
+    def split_triples(self,triples):
+        # rows of the heads, relations and tails of triples (..., 3)
+        return self.entity_rows(triples[...,0]), self.relation_rows(triples[...,1]), self.entity_rows(triples[...,2])
+
+    def native_train_args(self):
+        # tables and id to row mapping of the native trainers
+        tables = [self.target_head_embedding.weight,
+                  self.target_rel_embedding.weight,
+                  self.target_tail_embedding.weight,
+                  self.context_head_embedding.weight,
+                  self.context_rel_embedding.weight,
+                  self.context_tail_embedding.weight]
+        relation_offset = 0 if self.num_relations is None else self.num_entities
+        return [table.detach() for table in tables], self.padding_index, relation_offset, self.entity_padding, self.relation_padding
+
+
+class SkipGramTriple(TripleEmbeddings):
+    
+    def __init__(self,
+                num_nodes,
+                embedding_dim,
+                padding_index,
+                num_entities=None,
+                num_relations=None,
+                sparse=False
+                ):
+
+        super(SkipGramTriple, self).__init__(num_nodes,
+                                             embedding_dim,
+                                             padding_index,
+                                             num_entities=num_entities,
+                                             num_relations=num_relations,
+                                             sparse=sparse)
+
     def forward(self,target_triples,pos_context,neg_context):
         
         # get target head rel and tail
-        target_head = target_triples[:,0]
-        target_rel = target_triples[:,1]
-        target_tail = target_triples[:,2]
+        target_head, target_rel, target_tail = self.split_triples(target_triples)
 
-        # get pos context embedding
-        pos_heads = pos_context[:,:,0] # M x N tensor with N being heads for Mth triple in window
-        pos_rels = pos_context[:,:,1]
-        pos_tails = pos_context[:,:,2]
+        # get pos context embedding, M x N tensors with N being heads for Mth triple in window
+        pos_heads, pos_rels, pos_tails = self.split_triples(pos_context)
 
         # neg pos context embedding
-        neg_heads = neg_context[:,:,0] # M x N tensor with N being heads for Mth triple in window
-        neg_rels = neg_context[:,:,1]
-        neg_tails = neg_context[:,:,2]
+        neg_heads, neg_rels, neg_tails = self.split_triples(neg_context)
 
         # final loss
         loss_heads = self.get_loss(target_head,
@@ -86,6 +199,86 @@ class SkipGramTriple(nn.Module):
 
         return loss
 
+    def forward_walks(self,walks,window_offsets,neg_index,triples,window_size):
+        """Loss of the windows in window_offsets, gathered from the walks and the
+        neg_index of rw.to_windows_triples_sg_index."""
+        target_triples, pos_context = gather_windows(walks,window_offsets,window_size,self.padding_index)
+        neg_context = triples[neg_index[window_offsets.long()].long()]
+        return self.forward(target_triples,pos_context,neg_context)
+
+    @torch.no_grad()
+    def train_walks(self,walks,window_offsets,neg_index,triples,window_size,lr):
+        """Train on the windows of forward_walks without autograd, on the cpu.
+
+        Every window takes one SGD step with learning rate lr on its loss in
+        forward, with the gradients computed in native code and written to the
+        embedding tables in place. The windows are split over the torch
+        threads, which update the tables without locks (Hogwild). Returns the
+        mean loss of the windows before their step.
+        """
+        tables, *rows = self.native_train_args()
+        return triple_walk_native.train_sg(walks.contiguous(),window_offsets.int().contiguous(),neg_index.int(),triples,
+                                           tables,window_size,*rows,lr)
+
+    def forward_shared(self,target_triples,pos_context,neg_triples):
+        """Loss with negatives shared by the whole batch, see sample_shared_negatives.
+
+        The loss of forward, with the same neg_triples (K x 3) as the negatives
+        of every window: forward(target_triples, pos_context,
+        neg_triples.expand(len(target_triples), -1, -1)) gives the same loss.
+        forward scores a window by the target times the sum of its context, so
+        the shared negatives are summed once for the batch instead of
+        gathering and multiplying B x K negative embeddings.
+
+        Head, relation and tail rows are gathered from their own tables, as
+        gathering them from one table would mean concatenating the tables on
+        every step or changing the parameters the native trainers and saved
+        models use.
+        """
+
+        # get target head rel and tail
+        target_head, target_rel, target_tail = self.split_triples(target_triples)
+
+        # get pos context, M x N tensors with N being heads for Mth triple in window
+        pos_heads, pos_rels, pos_tails = self.split_triples(pos_context)
+
+        # shared negatives, K heads, relations and tails
+        neg_heads, neg_rels, neg_tails = self.split_triples(neg_triples)
+
+        loss_heads = self.get_loss_shared(target_head,
+                                          pos_heads,
+                                          neg_heads,
+                                          target_embedding=self.target_head_embedding,
+                                          context_embedding=self.context_head_embedding)
+
+        loss_tails = self.get_loss_shared(target_tail,
+                                          pos_tails,
+                                          neg_tails,
+                                          target_embedding=self.target_tail_embedding,
+                                          context_embedding=self.context_tail_embedding)
+
+        loss_rels = self.get_loss_shared(target_rel,
+                                         pos_rels,
+                                         neg_rels,
+                                         target_embedding=self.target_rel_embedding,
+                                         context_embedding=self.context_rel_embedding)
+
+        return torch.mean(loss_heads + loss_tails + loss_rels)
+
+    def get_loss_shared(self,target_nodes,context_nodes_pos,nodes_neg,target_embedding,context_embedding):
+
+        target_emb = target_embedding(target_nodes)
+
+        # the target times the sum of the context, as in get_loss
+        pos_sum = torch.mul(target_emb,context_embedding(context_nodes_pos).sum(dim=1)) + EPS
+        pos_score = -F.logsigmoid(pos_sum)
+
+        # the negatives of every window are the same K rows, summed once for the batch
+        neg_sum = torch.mul(target_emb,context_embedding(nodes_neg).sum(dim=0)) + EPS
+        neg_score = -F.logsigmoid(1-neg_sum)
+
+        return torch.mean(pos_score + neg_score)
+
     def get_loss(self,target_nodes,context_nodes_pos,context_nodes_neg,target_embedding,context_embedding):
 
         target_emb = target_embedding(target_nodes).unsqueeze(1)
@@ -97,9 +290,14 @@ class SkipGramTriple(nn.Module):
         pos_sum = torch.sum(prod_pos,dim=1) + EPS
         pos_score = -F.logsigmoid(pos_sum)
 
+        # B x K x N negatives of num_negatives > 1 are scored set by set and averaged
+        if context_emb_neg.dim() == 4:
+            target_emb = target_emb.unsqueeze(1)
         prod_neg = torch.mul(target_emb,context_emb_neg)
-        neg_sum = torch.sum(prod_neg,dim=1) + EPS
+        neg_sum = torch.sum(prod_neg,dim=-2) + EPS
         neg_score = -F.logsigmoid(1-neg_sum)
+        if neg_score.dim() == 3:
+            neg_score = neg_score.mean(dim=1)
         
         return torch.mean(pos_score + neg_score)
         
@@ -117,63 +315,34 @@ class SkipGramTriple(nn.Module):
         else:
             return self.target_tail_embedding.weight.detach()
 
-class CBOWTriple(nn.Module):
+class CBOWTriple(TripleEmbeddings):
     
     def __init__(self,
                 num_nodes,
                 embedding_dim,
-                padding_index
+                padding_index,
+                num_entities=None,
+                num_relations=None,
+                sparse=False
                 ):
 
-        super(CBOWTriple, self).__init__()
-        
-        # params
-        self.embedding_dim = embedding_dim
-        self.num_nodes = num_nodes+1                
-        self.padding_index = padding_index
-        self.target_head_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.target_tail_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.target_rel_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-
-        self.context_head_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.context_tail_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-        self.context_rel_embedding = nn.Embedding(self.num_nodes,self.embedding_dim,padding_idx=self.padding_index)
-
-        # init embeddings
-        nn.init.uniform_(self.target_head_embedding.weight.data,a=-1,b=1)
-        nn.init.uniform_(self.target_tail_embedding.weight.data,a=-1,b=1)
-        nn.init.uniform_(self.target_rel_embedding.weight.data,a=-1,b=1)
-        nn.init.uniform_(self.context_head_embedding.weight.data,a=-1,b=1)
-        nn.init.uniform_(self.context_tail_embedding.weight.data,a=-1,b=1)
-        nn.init.uniform_(self.context_rel_embedding.weight.data,a=-1,b=1)
+        super(CBOWTriple, self).__init__(num_nodes,
+                                         embedding_dim,
+                                         padding_index,
+                                         num_entities=num_entities,
+                                         num_relations=num_relations,
+                                         sparse=sparse)
 
-        # set padding index to a very small value
-        with torch.no_grad():
-            self.target_head_embedding.weight[self.padding_index] = 0
-            self.target_tail_embedding.weight[self.padding_index] = 0
-            self.target_rel_embedding.weight[self.padding_index] = 0
-            self.context_head_embedding.weight[self.padding_index] = 0
-            self.context_tail_embedding.weight[self.padding_index] = 0
-            self.context_rel_embedding.weight[self.padding_index] = 0
-
-                
     def forward(self,pos_triples,neg_triples,context_triples):
         
         # get pos head, rel and tail
-        pos_head = pos_triples[:,0]
-        pos_rel = pos_triples[:,1]
-        pos_tail = pos_triples[:,2]
+        pos_head, pos_rel, pos_tail = self.split_triples(pos_triples)
 
         # get neg head, rel and tail
-        neg_head = neg_triples[:,0]
-        neg_rel = neg_triples[:,1]
-        neg_tail = neg_triples[:,2]
-
-        # get context head, rel and tails
-        context_head = context_triples[:,:,0] # M x N tensor with N being heads for Mth triple in window
-        context_rel = context_triples[:,:,1]
-        context_tail = context_triples[:,:,2]
+        neg_head, neg_rel, neg_tail = self.split_triples(neg_triples)
 
+        # get context head, rel and tails, M x N tensors with N being heads for Mth triple in window
+        context_head, context_rel, context_tail = self.split_triples(context_triples)
 
         # final loss
         loss_heads = self.get_loss(pos_head,
@@ -200,6 +369,21 @@ class CBOWTriple(nn.Module):
 
         return loss
 
+    def forward_walks(self,walks,window_offsets,neg_index,triples,window_size):
+        """Loss of the windows in window_offsets, gathered from the walks and the
+        neg_index of rw.to_windows_triples_cbow_index."""
+        pos_triples, context_triples = gather_windows(walks,window_offsets,window_size,self.padding_index)
+        neg_triples = triples[neg_index[window_offsets.long()].long()]
+        return self.forward(pos_triples,neg_triples,context_triples)
+
+    @torch.no_grad()
+    def train_walks(self,walks,window_offsets,neg_index,triples,window_size,lr):
+        """Train on the windows of forward_walks without autograd, on the cpu,
+        see SkipGramTriple.train_walks."""
+        tables, *rows = self.native_train_args()
+        return triple_walk_native.train_cbow(walks.contiguous(),window_offsets.int().contiguous(),neg_index.int(),triples,
+                                             tables,window_size,*rows,lr)
+
     def get_loss(self,pos_nodes,neg_nodes,context_nodes,target_embedding,context_embedding):
 
         # get pos embedding
@@ -211,17 +395,22 @@ class CBOWTriple(nn.Module):
         # get context embedding
         context_emb = context_embedding(context_nodes).mean(dim=1)
 
-        # product
+        # product, B x K negatives of num_negatives > 1 are scored against the same context
         pos_product = torch.mul(pos_emb,context_emb)
-        neg_product = torch.mul(neg_emb,context_emb)
+        if neg_emb.dim() == 3:
+            neg_product = torch.mul(neg_emb,context_emb.unsqueeze(1))
+        else:
+            neg_product = torch.mul(neg_emb,context_emb)
 
         # sum
         pos_sum = torch.sum(pos_product,dim=1) + EPS
-        neg_sum = torch.sum(neg_product,dim=1) + EPS
+        neg_sum = torch.sum(neg_product,dim=-1) + EPS
 
-        # score
+        # score, averaged over the negatives of a window
         pos_score = -F.logsigmoid(pos_sum)
         neg_score = -F.logsigmoid(1 - neg_sum)
+        if neg_score.dim() == 2:
+            neg_score = neg_score.mean(dim=1)
         
         # final score
         loss = torch.mean(pos_score + neg_score)
@@ -1,21 +1,269 @@
+import torch
 import triple_walk_native
+from triple_walk import utils
 
-def walk_triples(triples_indexed, relation_tail_index,target_nodes, walk_length,padding_idx,seed,restart=True):
-    return triple_walk_native.walk_triples(triples_indexed,
-                                          relation_tail_index,
-                                          target_nodes,
-                                          walk_length,
-                                          padding_idx,
-                                          restart,
-                                          seed
-                                        )                            
+def walk(row_ptr, col_idx, target_nodes, walk_length, seed, p=1.0, q=1.0):
+    """Walks of walk_length steps over a CSR graph, one per target node.
 
-def to_windows_cbow(walks, window_size, num_nodes,seed):
-    return triple_walk_native.to_windows_cbow(walks, window_size, num_nodes,seed)
+    Every step picks a uniform neighbor when p == q == 1 and follows the
+    node2vec bias otherwise. Nodes without neighbors repeat themselves.
+    Like walk_triples, the walks only depend on the seed and on the position
+    of the target node, not on the device or the number of threads.
+    """
+    return triple_walk_native.walk(row_ptr, col_idx, target_nodes, p, q, walk_length, seed)
 
-def to_windows_triples_sg(walks, window_size, num_nodes,padding_idx,triples,seed):
-    return triple_walk_native.to_windows_triples(walks, window_size,num_nodes,padding_idx,triples,seed)
+def walk_edge_list(edge_list_indexed, node_edges_idx, target_nodes, walk_length, padding_idx, seed, p=1.0, q=1.0, restart=True):
+    """Walks of walk_length steps over an edge list sorted by head, see utils.build_node_edge_index.
 
-def to_windows_triples_cbow(walks, window_size, num_nodes,padding_idx,triples,seed):
-    return triple_walk_native.to_windows_triples_cbow(walks, window_size,num_nodes,padding_idx,triples,seed)
+    A node without out edges leads to padding_idx, after which the walk
+    restarts from its target node when restart is True and stays at
+    padding_idx otherwise.
+    """
+    return triple_walk_native.walk_edge_list(edge_list_indexed,
+                                             node_edges_idx,
+                                             target_nodes,
+                                             p,
+                                             q,
+                                             walk_length,
+                                             seed,
+                                             padding_idx,
+                                             restart
+                                            )
 
+def _out_tensors(out):
+    # the native functions take the buffers to fill as a list, empty to allocate new outputs
+    return [] if out is None else list(out)
+
+def to_windows(walks, window_size, num_nodes,seed,out=None):
+    return triple_walk_native.to_windows(walks, window_size, num_nodes,seed,_out_tensors(out))
+
+def walk_triples(triples_indexed, relation_tail_index,target_nodes, walk_length,padding_idx,seed,restart=None,p=1.0,q=1.0,relation_bias=1.0,sorted_tails=None,weights=None,alias_table=None,walks_per_node=1,packed=False,out=None):
+    """Triple walks of walk_length triples, walks_per_node per target node.
+
+    The walks_per_node walks of a target node are consecutive rows, the same
+    walks as passing target_nodes.repeat_interleave(walks_per_node) without
+    allocating the repeated target nodes.
+
+    With p, q and relation_bias left at 1 every step picks an outgoing triple
+    uniformly, or in proportion to weights (one per triple, see
+    utils.triple_weights) when they are given. Weighted steps use the alias
+    table of build_alias_table, pass it as alias_table to not build it again
+    on every call.
+
+    Otherwise the walk is second order as in node2vec: returning to the
+    previous entity is weighted by 1/p, moving to an entity the previous one
+    links to by 1 and moving further away by 1/q, and repeating the relation of
+    the previous step is weighted by relation_bias on top. The neighbor test is
+    a binary search over sorted_tails (see utils.build_sorted_tails), which is
+    computed here when it is not passed.
+
+    An entity without outgoing triples ends the walk and the rest of it is
+    padding_idx. With restart, a uniform walk instead continues from its
+    target node, with padding_idx as the relation of the jump, and only ends
+    when the target node itself has no outgoing triples. restart defaults to
+    True for uniform walks, biased and weighted walks can not restart and
+    raise a ValueError with restart=True.
+
+    With packed the walks are returned as (values, offsets) without the
+    padding after their end, see pack_walks. Uniform walks on the cpu are
+    packed as they are generated, without the padded walk tensor.
+
+    out is a walk tensor to fill in place instead of allocating a new one, for
+    example the walks of the previous epoch, and must have the shape, dtype and
+    device of the walks. It can not be used with packed walks, whose size
+    depends on the walks.
+    """
+    if p <= 0 or q <= 0 or relation_bias <= 0:
+        raise ValueError(f"p, q and relation_bias should be positive but got p={p}, q={q} and relation_bias={relation_bias}")
+    if packed and out is not None:
+        raise ValueError("packed walks can not be written to out")
+    out = [] if out is None else [out]
+
+    biased = not (p == 1.0 and q == 1.0 and relation_bias == 1.0)
+    weighted = weights is not None or alias_table is not None
+    if biased and restart:
+        raise ValueError("biased triple walks can not restart, pass restart=False")
+    if weighted and restart:
+        raise ValueError("weighted triple walks can not restart, pass restart=False")
+    if restart is None:
+        restart = True
+
+    if weighted:
+        if biased:
+            raise ValueError("weighted triple walks can not be biased by p, q or relation_bias")
+        if alias_table is None:
+            alias_table = build_alias_table(relation_tail_index,weights)
+        alias_prob, alias_index = alias_table
+        walks = triple_walk_native.walk_triples_weighted(triples_indexed,
+                                                       relation_tail_index,
+                                                       alias_prob,
+                                                       alias_index,
+                                                       target_nodes,
+                                                       walk_length,
+                                                       padding_idx,
+                                                       walks_per_node,
+                                                       seed,
+                                                       out
+                                                      )
+        return pack_walks(walks,padding_idx) if packed else walks
+
+    if biased == False:
+        if packed:
+            return triple_walk_native.walk_triples_packed(triples_indexed,relation_tail_index,target_nodes,walk_length,padding_idx,restart,walks_per_node,seed)
+        return triple_walk_native.walk_triples(triples_indexed,
+                                             relation_tail_index,
+                                             target_nodes,
+                                             walk_length,
+                                             padding_idx,
+                                             restart,
+                                             walks_per_node,
+                                             seed,
+                                             out
+                                            )
+
+    if sorted_tails is None:
+        sorted_tails = utils.build_sorted_tails(triples_indexed)
+
+    walks = triple_walk_native.walk_triples_biased(triples_indexed,
+                                                 relation_tail_index,
+                                                 sorted_tails,
+                                                 target_nodes,
+                                                 walk_length,
+                                                 padding_idx,
+                                                 p,
+                                                 q,
+                                                 relation_bias,
+                                                 walks_per_node,
+                                                 seed,
+                                                 out
+                                                )
+    return pack_walks(walks,padding_idx) if packed else walks
+
+def pack_walks(walks, padding_idx):
+    """Triple walks as (values, offsets), without the padding after their end.
+
+    Walk i is values[offsets[i]:offsets[i+1]], with offsets an int64 tensor of
+    len(walks) + 1 positions. A walk ends before its first padding tail and
+    keeps 2h + 1 values for its h triples.
+    """
+    return triple_walk_native.pack_walks(walks,padding_idx)
+
+def build_alias_table(relation_tail_index, weights):
+    """Alias tables for walk_triples(..., alias_table=...), weighted by one weight per sorted triple.
+
+    Returns (alias_prob, alias_index), aligned with the sorted triples and on
+    the device of relation_tail_index. The tables are built on the cpu in
+    O(num_triples) and can be stored with storage.save_graph.
+    """
+    device = relation_tail_index.device
+    weights = torch.as_tensor(weights).to(device="cpu",dtype=torch.float64).contiguous()
+    alias_prob, alias_index = triple_walk_native.build_alias_table(relation_tail_index.cpu().contiguous(),weights,len(weights))
+    return alias_prob.to(device), alias_index.to(device)
+
+def to_windows_cbow(walks, window_size, num_nodes,seed,out=None):
+    return triple_walk_native.to_windows_cbow(walks, window_size, num_nodes,seed,_out_tensors(out))
+
+def to_windows_triples_sg(walks, window_size, num_nodes,padding_idx,triples,seed,num_negatives=1,out=None):
+    """Skip-gram windows as (target_triples, pos_windows, neg_windows).
+
+    With num_negatives > 1 every window gets that many sets of negatives and
+    neg_windows has the shape (windows, num_negatives, window_size*2, 3), the
+    negatives of num_negatives copies of every window without copying its
+    target and context.
+
+    out is a (target_triples, pos_windows, neg_windows) tuple to fill in place,
+    for example the windows of the previous epoch, so that a training loop
+    allocates its windows once. The tensors must have the shape, dtype and
+    device of the windows and are returned.
+    """
+    return triple_walk_native.to_windows_triples(walks, window_size,num_nodes,padding_idx,triples,num_negatives,seed,_out_tensors(out))
+
+def to_windows_triples_cbow(walks, window_size, num_nodes,padding_idx,triples,seed,num_negatives=1,out=None):
+    """CBOW windows as (pos_triples, neg_triples, windows).
+
+    With num_negatives > 1 neg_triples has the shape (windows, num_negatives, 3)
+    and the positives and windows are not repeated for every negative.
+
+    out is a (pos_triples, neg_triples, windows) tuple to fill in place, see
+    to_windows_triples_sg.
+    """
+    return triple_walk_native.to_windows_triples_cbow(walks, window_size,num_nodes,padding_idx,triples,num_negatives,seed,_out_tensors(out))
+
+def to_windows_triples_sg_index(walks, window_size, triples, seed, num_negatives=1):
+    """Skip-gram windows as an int32 neg_index tensor instead of copied triples.
+
+    neg_index has a row for every window of the walks, so the windows are the
+    offsets torch.arange(len(neg_index), dtype=torch.int32), which the models
+    take in batches (see SkipGramTriple.forward_walks). The context of window i
+    is read from walks and its negatives are triples[neg_index[i]], the same
+    ones to_windows_triples_sg returns for this seed and num_negatives.
+    """
+    return triple_walk_native.to_windows_triples_index(walks, window_size, triples, num_negatives, seed)
+
+def to_windows_triples_cbow_index(walks, window_size, padding_idx, triples, seed, num_negatives=1):
+    """CBOW windows as an int32 neg_index tensor instead of copied triples, see
+    to_windows_triples_sg_index.
+
+    The negatives of window i are triples[neg_index[i]], the same ones
+    to_windows_triples_cbow returns for this seed and num_negatives.
+    """
+    return triple_walk_native.to_windows_triples_cbow_index(walks, window_size, padding_idx, triples, num_negatives, seed)
+
+def to_windows_triples_sg_packed(values, offsets, window_size, padding_idx, triples, seed, num_negatives=1):
+    """to_windows_triples_sg for the packed walks (values, offsets) of walk_triples(..., packed=True).
+
+    Only the triples of every walk get a window, which are the windows
+    to_windows_triples_sg gives the padded walks with the same seed, without
+    the ones of the padding after the end of the walks.
+    """
+    return triple_walk_native.to_windows_triples_packed(values, offsets, window_size, padding_idx, triples, num_negatives, seed)
+
+def to_windows_triples_cbow_packed(values, offsets, window_size, padding_idx, triples, seed, num_negatives=1):
+    """to_windows_triples_cbow for the packed walks (values, offsets), see to_windows_triples_sg_packed."""
+    return triple_walk_native.to_windows_triples_cbow_packed(values, offsets, window_size, padding_idx, triples, num_negatives, seed)
+
+def walk_windows_triples_sg(triples_indexed, relation_tail_index, target_nodes, walk_length, window_size, padding_idx, seed, window_seed=None, restart=True, walks_per_node=1, num_negatives=1):
+    """Walk and build skip-gram windows in one pass without allocating the walk tensor.
+
+    Returns the same (target_triples, pos_windows, neg_windows) as calling
+    walk_triples with seed and walks_per_node followed by to_windows_triples_sg
+    with window_seed, num_negatives and triples_indexed as the triples to sample
+    negatives from.
+    """
+    if window_seed is None:
+        window_seed = seed
+    return triple_walk_native.walk_windows_triples(triples_indexed,
+                                                  relation_tail_index,
+                                                  target_nodes,
+                                                  walk_length,
+                                                  window_size,
+                                                  padding_idx,
+                                                  restart,
+                                                  walks_per_node,
+                                                  num_negatives,
+                                                  seed,
+                                                  window_seed
+                                                )
+
+def walk_windows_triples_cbow(triples_indexed, relation_tail_index, target_nodes, walk_length, window_size, padding_idx, seed, window_seed=None, restart=True, walks_per_node=1, num_negatives=1):
+    """Walk and build cbow windows in one pass without allocating the walk tensor.
+
+    Returns the same (pos_triples, neg_triples, windows) as calling walk_triples
+    with seed and walks_per_node followed by to_windows_triples_cbow with
+    window_seed, num_negatives and triples_indexed as the triples to sample
+    negatives from.
+    """
+    if window_seed is None:
+        window_seed = seed
+    return triple_walk_native.walk_windows_triples_cbow(triples_indexed,
+                                                       relation_tail_index,
+                                                       target_nodes,
+                                                       walk_length,
+                                                       window_size,
+                                                       padding_idx,
+                                                       restart,
+                                                       walks_per_node,
+                                                       num_negatives,
+                                                       seed,
+                                                       window_seed
+                                                    )
@@ -0,0 +1,208 @@
+import json
+import numpy as np
+import torch
+
+# Binary graph file holding everything the walkers need, written once and memory mapped by every process.
+#
+# layout:  MAGIC | header length (uint64) | json header | sections
+#
+# Every section starts at a multiple of ALIGNMENT and is described in the header by
+# its offset, dtype and shape. The sections are the sorted triples, the relation
+# tail index and optionally the entity and relation vocabularies, which are stored
+# as a utf-8 blob with the int64 offset of every name, and the alias table of
+# weighted walks (see rw.build_alias_table).
+MAGIC = b"TRIPLEWALKGRAPH1"
+ALIGNMENT = 64
+VERSION = 1
+
+
+class Vocabulary:
+    """Names stored in a graph file, decoded only when they are accessed."""
+
+    def __init__(self,offsets,data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self,index):
+        if index < 0:
+            index = index + len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"index {index} is out of range for {len(self)} names")
+        return bytes(self.data[self.offsets[index]:self.offsets[index+1]]).decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def tolist(self):
+        return list(self)
+
+
+class TripleGraph:
+    """Sorted triples and relation tail index of a graph file, ready for rw.walk_triples.
+
+    The tensors share their memory with the file (copy on write), so processes that
+    load the same file share a single copy in the page cache.
+    """
+
+    def __init__(self,triples_indexed,relation_tail_index,num_entities,num_relations,entities=None,relations=None,alias_table=None):
+        self.triples_indexed = triples_indexed
+        self.relation_tail_index = relation_tail_index
+        self.num_entities = num_entities
+        self.num_relations = num_relations
+        self.entities = entities
+        self.relations = relations
+        self.alias_table = alias_table
+
+    @property
+    def padding_idx(self):
+        # the first id after all entities and relations
+        return self.num_entities + self.num_relations
+
+    @property
+    def target_nodes(self):
+        return torch.arange(self.num_entities,dtype=self.triples_indexed.dtype)
+
+
+def encode_names(names):
+    encoded = [str(name).encode("utf-8") for name in names]
+    lengths = np.fromiter((len(name) for name in encoded),dtype=np.int64,count=len(encoded))
+    offsets = np.zeros(len(encoded)+1,dtype=np.int64)
+    np.cumsum(lengths,out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded),dtype=np.uint8)
+    return offsets, data
+
+
+def save_graph(path,triples_indexed,relation_tail_index,entities=None,relations=None,num_entities=None,num_relations=None,alias_table=None):
+    """Write sorted triples and their relation tail index to a graph file.
+
+    triples_indexed and relation_tail_index are the outputs of
+    utils.build_relation_tail_index. entities and relations are the optional
+    vocabularies, where entities[i] has id i and relations[j] has id num_entities + j
+    (see utils.to_indexed_triples with return_arrays=True). alias_table is the
+    optional (alias_prob, alias_index) of rw.build_alias_table.
+    """
+
+    triples_np = torch.as_tensor(triples_indexed).numpy()
+    index_np = torch.as_tensor(relation_tail_index).numpy()
+    if triples_np.dtype != index_np.dtype or triples_np.dtype not in (np.int32,np.int64):
+        raise ValueError("triples_indexed and relation_tail_index should both be int32 or int64")
+
+    # the counts come from the vocabularies or from the data
+    if num_entities is None:
+        num_entities = len(entities) if entities is not None else len(index_np)
+    if num_relations is None:
+        num_relations = len(relations) if relations is not None else 0
+        if len(triples_np) > 0:
+            # the inverse relations of utils.add_inverse_triples have ids but no names
+            num_relations = max(num_relations,int(triples_np[:,1].max()) + 1 - num_entities)
+
+    sections = [("triples_indexed",triples_np),("relation_tail_index",index_np)]
+    if entities is not None:
+        offsets, data = encode_names(entities)
+        sections += [("entities_offsets",offsets),("entities_data",data)]
+    if relations is not None:
+        offsets, data = encode_names(relations)
+        sections += [("relations_offsets",offsets),("relations_data",data)]
+    if alias_table is not None:
+        alias_prob, alias_index = alias_table
+        alias_prob_np = torch.as_tensor(alias_prob).cpu().numpy()
+        alias_index_np = torch.as_tensor(alias_index).cpu().numpy()
+        if alias_prob_np.shape != (len(triples_np),) or alias_index_np.shape != (len(triples_np),) or alias_index_np.dtype != triples_np.dtype:
+            raise ValueError("alias_table should have one entry per triple and the index type of the triples")
+        sections += [("alias_prob",alias_prob_np),("alias_index",alias_index_np)]
+
+    data_start, section_headers = create_graph_file(path,
+                                                    dtype=triples_np.dtype,
+                                                    num_triples=len(triples_np),
+                                                    num_entities=num_entities,
+                                                    num_relations=num_relations,
+                                                    sections=[(name,array.dtype,array.shape) for name, array in sections])
+
+    with open(path,"r+b") as f:
+        for name, array in sections:
+            f.seek(data_start + section_headers[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+
+
+def create_graph_file(path,dtype,num_triples,num_entities,num_relations,sections):
+    # write the header of a graph file for sections given as (name, dtype, shape)
+    # and size the file so that the sections can be filled in afterwards
+
+    # section offsets are relative to the end of the header
+    section_headers = {}
+    position = 0
+    for name, section_dtype, shape in sections:
+        section_dtype = np.dtype(section_dtype)
+        position = align(position)
+        section_headers[name] = {"offset":position,"dtype":section_dtype.str,"shape":[int(size) for size in shape]}
+        position = position + (int(np.prod(shape)) * section_dtype.itemsize)
+
+    header = {
+        "version":VERSION,
+        "dtype":np.dtype(dtype).name,
+        "num_triples":int(num_triples),
+        "num_entities":int(num_entities),
+        "num_relations":int(num_relations),
+        "sections":section_headers
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = align(len(MAGIC) + 8 + len(header_bytes))
+
+    with open(path,"wb") as f:
+        f.write(MAGIC)
+        f.write(np.array(len(header_bytes),dtype="<u8").tobytes())
+        f.write(header_bytes)
+        f.truncate(data_start + position)
+
+    return data_start, section_headers
+
+
+def load_graph(path):
+    """Memory map a graph file written by save_graph and return a TripleGraph."""
+
+    with open(path,"rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a triple walk graph file")
+        header_length = int(np.frombuffer(f.read(8),dtype="<u8")[0])
+        header = json.loads(f.read(header_length).decode("utf-8"))
+
+    if header["version"] != VERSION:
+        raise ValueError(f"unsupported graph file version {header['version']}")
+
+    data_start = align(len(MAGIC) + 8 + header_length)
+    sections = {}
+    for name, section in header["sections"].items():
+        shape = tuple(section["shape"])
+        if np.prod(shape) == 0:
+            sections[name] = np.empty(shape,dtype=section["dtype"])
+        else:
+            sections[name] = np.memmap(path,dtype=section["dtype"],mode="c",offset=data_start+section["offset"],shape=shape)
+
+    entities = None
+    if "entities_offsets" in sections:
+        entities = Vocabulary(sections["entities_offsets"],sections["entities_data"])
+
+    relations = None
+    if "relations_offsets" in sections:
+        relations = Vocabulary(sections["relations_offsets"],sections["relations_data"])
+
+    alias_table = None
+    if "alias_prob" in sections:
+        alias_table = (torch.from_numpy(sections["alias_prob"]),torch.from_numpy(sections["alias_index"]))
+
+    return TripleGraph(triples_indexed=torch.from_numpy(sections["triples_indexed"]),
+                       relation_tail_index=torch.from_numpy(sections["relation_tail_index"]),
+                       num_entities=header["num_entities"],
+                       num_relations=header["num_relations"],
+                       entities=entities,
+                       relations=relations,
+                       alias_table=alias_table)
+
+
+def align(position):
+    return ((position + ALIGNMENT - 1) // ALIGNMENT) * ALIGNMENT
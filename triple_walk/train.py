@@ -0,0 +1,132 @@
+import queue
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from triple_walk import rw
+from triple_walk.model import CBOWTriple
+
+
+def train_hogwild(model,
+                  triples_indexed,
+                  relation_tail_index,
+                  target_nodes,
+                  walk_length,
+                  window_size,
+                  num_processes,
+                  epochs=1,
+                  lr=0.025,
+                  batch_size=1024,
+                  chunk_size=1024,
+                  native=False,
+                  threads_per_process=1,
+                  restart=True,
+                  seed=0
+                  ):
+    """Train a SkipGramTriple or CBOWTriple on the cpu with num_processes worker processes.
+
+    The parameters of the model and the graph tensors are moved to shared memory,
+    so every worker updates the same tables without locks (Hogwild) and reads the
+    same graph. Every worker walks a disjoint shard of target_nodes, chunk_size
+    nodes at a time, and trains on the windows of rw.to_windows_triples_*_index in
+    shuffled minibatches of batch_size, with forward_walks and torch.optim.SGD or,
+    with native=True, with model.train_walks.
+
+    Returns the number of windows trained and the seconds the workers took.
+    """
+
+    if num_processes < 1:
+        raise ValueError(f"num_processes should be at least 1 but got {num_processes}")
+
+    # the workers update the parameters of the caller and read the graph without copies
+    model.share_memory()
+    for tensor in (triples_indexed,relation_tail_index,target_nodes):
+        tensor.share_memory_()
+
+    # spawn instead of fork, openmp does not survive a fork after the parent used it
+    context = mp.get_context("spawn")
+    start_event = context.Event()
+    results = context.Queue()
+    shards = torch.tensor_split(target_nodes,num_processes)
+
+    workers = []
+    for rank in range(num_processes):
+        worker = context.Process(target=_train_worker,
+                                 args=(rank,model,triples_indexed,relation_tail_index,shards[rank],walk_length,window_size,
+                                       epochs,lr,batch_size,chunk_size,native,threads_per_process,restart,seed,start_event,results))
+        worker.start()
+        workers.append(worker)
+
+    try:
+        # time from the moment every worker has started up
+        _collect(results,workers,num_processes)
+        start_event.set()
+        start = time.perf_counter()
+        num_windows = sum(_collect(results,workers,num_processes))
+        seconds = time.perf_counter() - start
+    finally:
+        for worker in workers:
+            worker.join()
+
+    return num_windows, seconds
+
+
+def _collect(results,workers,count):
+    # count values from the workers, failing instead of waiting forever when one of them died
+    values = []
+    while len(values) < count:
+        try:
+            values.append(results.get(timeout=1))
+        except queue.Empty:
+            for worker in workers:
+                if worker.exitcode is not None and worker.exitcode != 0:
+                    for other in workers:
+                        other.terminate()
+                    raise RuntimeError(f"a training process exited with code {worker.exitcode}")
+    return values
+
+
+def _train_worker(rank,model,triples_indexed,relation_tail_index,target_nodes,walk_length,window_size,
+                  epochs,lr,batch_size,chunk_size,native,threads_per_process,restart,seed,start_event,results):
+
+    torch.set_num_threads(threads_per_process)
+    cbow = isinstance(model,CBOWTriple)
+    optimizer = None if native else torch.optim.SGD(model.parameters(),lr=lr)
+    generator = torch.Generator().manual_seed(_worker_seed(seed,rank,-1,-1))
+
+    # ready, wait for the other workers
+    results.put(0)
+    start_event.wait()
+
+    num_windows = 0
+    for epoch in range(epochs):
+        for chunk_start in range(0,len(target_nodes),chunk_size):
+            chunk = target_nodes[chunk_start:chunk_start+chunk_size]
+            chunk_seed = _worker_seed(seed,rank,epoch,chunk_start)
+
+            walks = rw.walk_triples(triples_indexed,relation_tail_index,chunk,walk_length,model.padding_index,seed=chunk_seed,restart=restart)
+            if cbow:
+                neg_index = rw.to_windows_triples_cbow_index(walks,window_size,model.padding_index,triples_indexed,chunk_seed)
+            else:
+                neg_index = rw.to_windows_triples_sg_index(walks,window_size,triples_indexed,chunk_seed)
+            window_offsets = torch.randperm(len(neg_index),generator=generator,dtype=torch.int32)
+
+            for batch in torch.split(window_offsets,batch_size):
+                if native:
+                    model.train_walks(walks,batch,neg_index,triples_indexed,window_size,lr)
+                else:
+                    optimizer.zero_grad()
+                    model.forward_walks(walks,batch,neg_index,triples_indexed,window_size).backward()
+                    optimizer.step()
+
+            num_windows += len(window_offsets)
+
+    results.put(num_windows)
+
+
+def _worker_seed(seed,rank,epoch,chunk_start):
+    # the kernels key their streams by the walk index inside the call, so every
+    # chunk of every worker needs its own seed
+    entropy = [seed,rank+1,epoch+1,chunk_start+1]
+    state = np.random.SeedSequence(entropy).generate_state(1)[0]
+    return int(state & 0x7FFFFFFF)
@@ -3,52 +3,39 @@ import networkx as nx
 import pandas as pd
 import numpy as np
 
+def index_dtype_of(tensor):
+    # int32 indices are kept as they are, anything else becomes int64
+    if tensor.dtype == torch.int32:
+        return torch.int32
+    return torch.int64
+
 def to_csr(graph):
-    csr = nx.to_scipy_sparse_matrix(graph,format='csr')    
+    # to_scipy_sparse_matrix was removed in networkx 3
+    to_sparse = getattr(nx,"to_scipy_sparse_array",None) or nx.to_scipy_sparse_matrix
+    csr = to_sparse(graph,format='csr')
     row_ptr = torch.Tensor(csr.indptr).to(int).contiguous()
     col_idx = torch.Tensor(csr.indices).to(int).contiguous()
     return row_ptr, col_idx
 
 def nodes_tensor(graph):
-    nodes = list(graph.nodes())
-    nodes_index = []
-    for node in nodes:
-        nodes_index.append(nodes.index(node))
-
-    nodes_t = torch.LongTensor(nodes_index).contiguous()
-    return nodes_t
+    # every node is indexed by its position in graph.nodes()
+    return torch.arange(graph.number_of_nodes(),dtype=torch.int64).contiguous()
 
 
 def to_edge_list_indexed(graph):
-    edges = list(graph.edges())
     nodes = sorted(list(graph.nodes()))
-    node_index_mapping = {}
     is_directed = nx.is_directed(graph)
 
-    edge_list_len = len(edges)
-
-    edge_list_indexed = torch.zeros((edge_list_len,2)).to(int).contiguous()
+    # nodes are indexed by their position in the sorted list of nodes
+    node_index = pd.Index(nodes,tupleize_cols=False)
+    node_index_mapping = dict(zip(nodes,range(len(nodes))))
 
-    for index, edge in enumerate(edges):
-        head = edge[0]
-        tail = edge[1]
-
-        head_index = -1
-        if head in node_index_mapping:
-            head_index = node_index_mapping[head]
-        else:
-            head_index = nodes.index(head)
-            node_index_mapping[head] = head_index
-
-        tail_index = -1
-        if tail in node_index_mapping:
-            tail_index = node_index_mapping[tail]
-        else:
-            tail_index = nodes.index(tail)
-            node_index_mapping[tail] = tail_index
-
-        edge_list_indexed[index][0] = head_index
-        edge_list_indexed[index][1] = tail_index
+    # map the heads and tails of all edges at once
+    edges = list(graph.edges())
+    heads = pd.Index([edge[0] for edge in edges],tupleize_cols=False,dtype=object)
+    tails = pd.Index([edge[1] for edge in edges],tupleize_cols=False,dtype=object)
+    edge_list_np = np.stack((node_index.get_indexer(heads),node_index.get_indexer(tails)),axis=1).astype(np.int64)
+    edge_list_indexed = torch.from_numpy(edge_list_np).contiguous()
 
     if is_directed == False:
         edge_list_reversed = torch.fliplr(edge_list_indexed)
@@ -56,113 +43,118 @@ def to_edge_list_indexed(graph):
 
     return edge_list_indexed, node_index_mapping
 
-def build_node_edge_index(edge_list_indexed, nodes_tensor):
-
-    # sort edge list
-    edge_list_indexed_pd = pd.DataFrame(data=edge_list_indexed.numpy(),columns=["head","tail"])
-    edge_list_indexed_np = edge_list_indexed_pd.sort_values(by="head",ascending=True).to_numpy()
-    edge_list_indexed = torch.from_numpy(edge_list_indexed_np).contiguous()
-
-    nodes_unique = torch.unique(nodes_tensor)
-    nodes_sorted,_ = torch.sort(nodes_unique)
-
-    num_nodes = len(nodes_sorted)
-    num_edges = len(edge_list_indexed)
-    node_edge_index = torch.full((num_nodes,2),-1).to(int).contiguous()
-
-    #print(edge_list_indexed)
-
-    current_node = edge_list_indexed[0][0]
-    for edge_index in range(num_edges):
-        edge = edge_list_indexed[edge_index]
-        head = edge[0]
-
-        if head != current_node:
-            node_edge_index[current_node][1] = edge_index - 1
-            node_edge_index[head] = edge_index
-            current_node = head
-        else:
-            if edge_index == 0:
-                node_edge_index[head][0] = 0
-            else:
-                node_edge_index[head][1] = edge_index
-    
-    return node_edge_index, edge_list_indexed
-
-def build_relation_tail_index(triples_indexed_tensor,all_entities_tensor):
-
-    # sort edge list
-    triples_indexed_pd = pd.DataFrame(data=triples_indexed_tensor.numpy(),columns=["head","relation","tail"])
-    triples_indexed_pd = triples_indexed_pd.sort_values(by="head",ascending=True)    
-    triples_indexed_tensor = torch.from_numpy(triples_indexed_pd.to_numpy()).to(int).contiguous()
-
-    # sorted entities    
-    nodes_sorted,_ = torch.sort(all_entities_tensor)
-
-    num_nodes = len(nodes_sorted)
-    num_edges = len(triples_indexed_tensor)
-    node_edge_index = torch.full((num_nodes,2),-1).to(int).contiguous()
-
-    current_node = triples_indexed_tensor[0][0]
-    for edge_index in range(num_edges):
-        edge = triples_indexed_tensor[edge_index]
-        head = edge[0]
-
-        if head != current_node:
-            node_edge_index[current_node][1] = edge_index - 1
-            node_edge_index[head] = edge_index
-            current_node = head
-        else:
-            if edge_index == 0:
-                node_edge_index[head][0] = 0
-            else:
-                node_edge_index[head][1] = edge_index
-    
-    return node_edge_index, triples_indexed_tensor
-            
-
-def to_indexed_triples(triples_named_pd):
-
-    # get all entities
-    entities = []
-    entities.extend(triples_named_pd["head"].unique().tolist())
-    entities.extend(triples_named_pd["tail"].unique().tolist())
-
-     # merge and get unique
-    entities = list(set(entities))
-
-    # create a mapping of entities
-    entity_map = {}
-    for index,entity in enumerate(entities):
-        entity_map[entity] = index
-
-    # get relationships
-    relationships = triples_named_pd["relation"].unique().tolist()
-
-    # create a mapping of relationships
-    relation_map = {}
-    num_entities = len(entity_map)
-    for index, relation in enumerate(relationships):
-        relation_map[relation] = num_entities+index
-
-    # create a new array to hold indexed triples
-    triples_indexed = np.zeros(shape=triples_named_pd.shape).astype(int)
+def build_head_index(rows, num_nodes, return_order=False):
+    # stable sort of the rows by their head (first column) and the [first, last]
+    # row of every head in the sorted rows, -1 for heads without rows. With
+    # return_order the sort order is returned too, rows_sorted == rows[order]
+    heads = rows[:,0]
+    if len(heads) > 0 and int(heads.max()) >= num_nodes:
+        raise ValueError(f"head {int(heads.max())} is out of range for {num_nodes} nodes")
 
-    # to numpy
-    triples_named_np = triples_named_pd.to_numpy()
+    order = torch.sort(heads,stable=True).indices
+    rows_sorted = rows[order].contiguous()
 
-    for index in range(len(triples_named_np)):
-        triple = triples_named_np[index]
+    counts = torch.bincount(heads,minlength=num_nodes)
+    ends = torch.cumsum(counts,dim=0)
+    head_index = torch.stack((ends - counts,ends - 1),dim=1)
+    head_index[counts == 0] = -1
 
-        head_index = entity_map[triple[0]]
-        rel_index = relation_map[triple[1]]
-        tail_index = entity_map[triple[2]]
+    if return_order:
+        return head_index.to(rows.dtype).contiguous(), rows_sorted, order
+    return head_index.to(rows.dtype).contiguous(), rows_sorted
 
-        triples_indexed[index][0] = head_index
-        triples_indexed[index][1] = rel_index
-        triples_indexed[index][2] = tail_index
+def build_node_edge_index(edge_list_indexed, nodes_tensor):
+    edge_list_indexed = edge_list_indexed.to(index_dtype_of(edge_list_indexed))
+    num_nodes = len(torch.unique(nodes_tensor))
+    return build_head_index(edge_list_indexed,num_nodes)
+
+def build_relation_tail_index(triples_indexed_tensor,all_entities_tensor,add_inverse=False,num_relations=None,return_order=False):
+    # with add_inverse the reverse of every triple is added to the sorted triples first,
+    # see add_inverse_triples, and the padding index moves to num_entities + 2 * num_relations.
+    # With return_order the position of every sorted triple in the given triples is returned
+    # too, to align per triple values such as confidence[order] with the sorted triples.
+    # Inverse triples point past the given triples, order % len(triples) is their triple
+    triples_indexed_tensor = triples_indexed_tensor.to(index_dtype_of(triples_indexed_tensor))
+    num_nodes = len(all_entities_tensor)
+    if add_inverse:
+        triples_indexed_tensor = add_inverse_triples(triples_indexed_tensor,num_nodes,num_relations)
+    return build_head_index(triples_indexed_tensor,num_nodes,return_order)
+
+def add_inverse_triples(triples_indexed_tensor,num_entities,num_relations=None):
+    # the triples followed by their reverses (t, r + num_relations, h), so that walks can leave
+    # the entities that are only tails. The inverse relations get their own ids after the
+    # relations, see inverse_relation_ids, and num_relations is taken from the largest
+    # relation id when it is not given
+    relations = triples_indexed_tensor[:,1]
+    if num_relations is None:
+        num_relations = int(relations.max()) - num_entities + 1 if len(relations) > 0 else 0
+    elif len(relations) > 0 and int(relations.max()) >= num_entities + num_relations:
+        raise ValueError(f"relation {int(relations.max())} is out of range for {num_relations} relations")
+
+    inverse = torch.stack((triples_indexed_tensor[:,2],relations + num_relations,triples_indexed_tensor[:,0]),dim=1)
+    return torch.cat((triples_indexed_tensor,inverse),dim=0)
+
+def inverse_relation_ids(relation_ids,num_entities,num_relations):
+    # the inverse of relations added by add_inverse_triples and the relation of inverses,
+    # relation r is num_entities + i and its inverse num_entities + num_relations + i
+    relation_ids = torch.as_tensor(relation_ids)
+    is_inverse = relation_ids >= num_entities + num_relations
+    return torch.where(is_inverse,relation_ids - num_relations,relation_ids + num_relations)
+
+
+def build_sorted_tails(triples_indexed_tensor):
+    # tails of the triples sorted within the rows of every head, for triples
+    # grouped by head as returned by build_relation_tail_index
+    heads = triples_indexed_tensor[:,0]
+    tails = triples_indexed_tensor[:,2]
+    order = torch.sort(tails,stable=True).indices
+    order = order[torch.sort(heads[order],stable=True).indices]
+    return tails[order].contiguous()
+
+def triple_weights(triples_indexed_tensor,num_entities,confidence=None,relation_weights=None,frequency_exponent=0.0):
+    # float64 weight of every triple for rw.build_alias_table: the product of the triple
+    # confidence, the weight of its relation (relation_weights[r - num_entities]) and
+    # count(r) ** -frequency_exponent, which down-weights frequent relations. confidence
+    # follows the given triples, for the sorted triples pass confidence[order] with the
+    # order of build_relation_tail_index(..., return_order=True)
+    relations = triples_indexed_tensor[:,1].long() - num_entities
+    weights = torch.ones(len(triples_indexed_tensor),dtype=torch.float64)
+
+    if confidence is not None:
+        weights = weights * torch.as_tensor(confidence,dtype=torch.float64)
+    if relation_weights is not None:
+        weights = weights * torch.as_tensor(relation_weights,dtype=torch.float64)[relations]
+    if frequency_exponent != 0.0 and len(relations) > 0:
+        counts = torch.bincount(relations).to(torch.float64)
+        weights = weights * counts[relations].pow(-frequency_exponent)
+
+    if bool((weights < 0).any()):
+        raise ValueError("triple weights should not be negative")
+    return weights
+
+def to_indexed_triples(triples_named_pd,return_arrays=False,dtype=np.int64):
+
+    # entities are numbered in the order they first appear as heads and then as tails
+    num_triples = len(triples_named_pd)
+    entity_codes, entities = pd.factorize(pd.concat((triples_named_pd["head"],triples_named_pd["tail"]),ignore_index=True))
+    num_entities = len(entities)
+
+    # relationships are numbered after the entities in the order they first appear
+    relation_codes, relationships = pd.factorize(triples_named_pd["relation"])
 
-    return triples_indexed,entity_map,relation_map
+    # create a new array to hold indexed triples
+    triples_indexed = np.empty(shape=(num_triples,3),dtype=dtype)
+    triples_indexed[:,0] = entity_codes[:num_triples]
+    triples_indexed[:,1] = relation_codes + num_entities
+    triples_indexed[:,2] = entity_codes[num_triples:]
 
+    # the vocabularies as arrays, the id of entities[i] is i and of relationships[j] is num_entities + j
+    entities = np.asarray(entities)
+    relationships = np.asarray(relationships)
+    if return_arrays == True:
+        return triples_indexed,entities,relationships
 
+    entity_map = dict(zip(entities.tolist(),range(num_entities)))
+    relation_map = dict(zip(relationships.tolist(),range(num_entities,num_entities+len(relationships))))
 
+    return triples_indexed,entity_map,relation_map